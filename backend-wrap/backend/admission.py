@@ -0,0 +1,188 @@
+"""
+# admission.py
+Admission control for upscale jobs.
+A job's cost is estimated from the image header and the planned networks before it
+is accepted: output size, peak memory and runtime (planned MACs divided by a
+throughput that is calibrated on the jobs this server has finished). Jobs over the
+configured limits are rejected up front instead of failing deep inside inference.
+"""
+
+import threading
+from typing import Callable, Optional
+
+from .planner import ExecutionPlan
+from .scheduler import QueueFullError
+from .tiling import tile_bytes_per_pixel
+
+
+class JobTooLargeError(Exception):
+    """Raised when a job's estimated cost exceeds an admission limit"""
+
+    def __init__(self, reason: str, estimate: "CostEstimate"):
+        super().__init__(reason)
+        self.reason = reason
+        self.estimate = estimate
+
+
+class CostModel:
+    """
+    Inference throughput of this machine in MACs per second.
+    Starts from a configured guess and follows finished jobs with an exponential moving average;
+    the first measurement is weighted by first_weight so a single outlier cannot replace the guess.
+    Observations should time the forward passes only, without model loading or warmup.
+    """
+
+    def __init__(self, macs_per_second: float, smoothing: float = 0.2, first_weight: float = 0.5):
+        self.macs_per_second = macs_per_second
+        self.smoothing = smoothing
+        self.first_weight = first_weight
+        self.samples = 0
+        self._lock = threading.Lock()
+
+    def observe(self, macs: float, seconds: float):
+        if macs <= 0 or seconds <= 0:
+            return
+        with self._lock:
+            rate = macs / seconds
+            # the first real measurement moves further from the configured guess than later ones
+            weight = self.first_weight if self.samples == 0 else self.smoothing
+            self.macs_per_second = (1 - weight) * self.macs_per_second + weight * rate
+            self.samples += 1
+
+    def seconds(self, macs: float) -> float:
+        return macs / self.macs_per_second if self.macs_per_second else 0.0
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"gmacs_per_second": round(self.macs_per_second / 1e9, 2), "samples": self.samples}
+
+
+def job_macs(plan: ExecutionPlan, channels: int, alpha_strategy: str) -> float:
+    """MACs of a planned job; the network alpha strategy runs every step a second time for RGBA"""
+    if channels == 4 and alpha_strategy == 'network':
+        return 2 * plan.cost
+    return plan.cost
+
+
+class CostEstimate:
+    def __init__(self, plan: ExecutionPlan, image_shape, channels: int, macs: float,
+                 peak_bytes: int, seconds: float):
+        self.plan = plan
+        self.height, self.width = int(image_shape[0]), int(image_shape[1])
+        self.channels = channels
+        self.macs = macs
+        self.peak_bytes = peak_bytes
+        self.seconds = seconds
+
+    @property
+    def output_shape(self):
+        factor = self.plan.factor
+        return self.height * factor, self.width * factor
+
+    @property
+    def output_pixels(self) -> int:
+        height, width = self.output_shape
+        return height * width
+
+    def describe(self) -> dict:
+        height, width = self.output_shape
+        return {
+            "input": [self.width, self.height],
+            "output": [width, height],
+            "output_pixels": self.output_pixels,
+            "memory_mb": round(self.peak_bytes / 2**20, 1),
+            "seconds": round(self.seconds, 1),
+            "gmacs": round(self.macs / 1e9, 1),
+            "plan": self.plan.steps,
+        }
+
+
+def estimate_cost(plan: ExecutionPlan, image_shape, channels: int, alpha_strategy: str, cost_model: CostModel,
+                  tile_size_fn: Optional[Callable] = None, memmap_threshold: int = 0) -> CostEstimate:
+    """
+    Estimate a planned job on an image of image_shape (height, width).
+    - tile_size_fn(shape, scale): tile edge used for a step, None when it runs in one pass
+    - memmap_threshold: results larger than this are memory-mapped and do not count as RAM
+    Peak memory is the largest step: its input and output arrays plus the network's activations.
+    """
+    height, width = int(image_shape[0]), int(image_shape[1])
+    peak = 0
+    for scale in plan.steps:
+        factor = int(scale)
+        in_bytes = height * width * channels
+        out_bytes = in_bytes * factor ** 2
+        tile_size = tile_size_fn((height, width), scale) if tile_size_fn else None
+        if tile_size:
+            activations = tile_bytes_per_pixel(scale) * tile_size ** 2
+            if memmap_threshold and out_bytes > memmap_threshold:
+                out_bytes = 0
+        else:
+            activations = tile_bytes_per_pixel(scale) * height * width
+            # the PIL result and the array handed to the next step
+            out_bytes *= 2
+        peak = max(peak, in_bytes + out_bytes + activations)
+        height, width = height * factor, width * factor
+
+    macs = job_macs(plan, channels, alpha_strategy)
+    return CostEstimate(plan, image_shape, channels, macs, peak, cost_model.seconds(macs))
+
+
+class AdmissionController:
+    """
+    Accept, queue or reject jobs against limits (0 disables a limit):
+    - max_output_pixels: result size
+    - max_memory_bytes: estimated peak memory of the job
+    - max_seconds: estimated inference time of the job
+    - max_wait_seconds: expected time in the queue before the job starts
+    """
+
+    def __init__(self, cost_model: CostModel, max_output_pixels=0, max_memory_bytes=0, max_seconds=0,
+                 max_wait_seconds=0):
+        self.cost_model = cost_model
+        self.max_output_pixels = max_output_pixels
+        self.max_memory_bytes = max_memory_bytes
+        self.max_seconds = max_seconds
+        self.max_wait_seconds = max_wait_seconds
+        self.stats = {"accepted": 0, "queued": 0, "rejected": 0}
+        self._lock = threading.Lock()
+
+    def check_limits(self, estimate: CostEstimate):
+        """Raise JobTooLargeError if the job can never be admitted"""
+        reason = None
+        if self.max_output_pixels and estimate.output_pixels > self.max_output_pixels:
+            reason = f"Output of {estimate.output_pixels} pixels exceeds the limit of {self.max_output_pixels}"
+        elif self.max_memory_bytes and estimate.peak_bytes > self.max_memory_bytes:
+            reason = (f"Estimated memory of {estimate.peak_bytes / 2**20:.0f} MB exceeds the limit of "
+                      f"{self.max_memory_bytes / 2**20:.0f} MB")
+        elif self.max_seconds and estimate.seconds > self.max_seconds:
+            reason = f"Estimated runtime of {estimate.seconds:.0f}s exceeds the limit of {self.max_seconds:.0f}s"
+        if reason is not None:
+            self._count("rejected")
+            raise JobTooLargeError(reason, estimate)
+
+    def check_wait(self, expected_wait: float) -> str:
+        """
+        Decide on an admissible job given the scheduler's expected wait for a new submission.
+        Returns "accepted" (starts right away) or "queued"; raises QueueFullError when the wait is too long.
+        """
+        if self.max_wait_seconds and expected_wait > self.max_wait_seconds:
+            self._count("rejected")
+            raise QueueFullError(max(1, int(expected_wait - self.max_wait_seconds)))
+        decision = "accepted" if expected_wait <= 0 else "queued"
+        self._count(decision)
+        return decision
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                **self.stats,
+                **self.cost_model.snapshot(),
+                "max_output_pixels": self.max_output_pixels,
+                "max_memory_mb": self.max_memory_bytes / 2**20,
+                "max_seconds": self.max_seconds,
+                "max_wait_seconds": self.max_wait_seconds,
+            }
@@ -0,0 +1,75 @@
+"""
+# alpha.py
+Alpha channel upscaling strategies for RGBA images.
+- network: run the alpha through RealESRGAN as a 3-channel image (highest quality, full second pass)
+- guided: classical resize refined by a guided filter using the upscaled RGB as edge guide
+- resize: classical resize using the requested resample mode (fastest)
+Uniform alpha (e.g. fully opaque PNGs) is always filled directly without any upscaling.
+"""
+
+import numpy as np
+from PIL import Image
+
+ALPHA_STRATEGIES = ('network', 'guided', 'resize')
+
+# Map torch interpolate modes onto their closest PIL resampling filter
+_PIL_RESAMPLE = {
+    'nearest': Image.NEAREST,
+    'nearest-exact': Image.NEAREST,
+    'linear': Image.BILINEAR,
+    'bilinear': Image.BILINEAR,
+    'trilinear': Image.BILINEAR,
+    'bicubic': Image.BICUBIC,
+    'area': Image.BOX,
+}
+
+
+def uniform_value(alpha):
+    """Return the constant value if every alpha pixel is equal, otherwise None"""
+    if alpha.size == 0:
+        return None
+    low, high = alpha.min(), alpha.max()
+    return int(low) if low == high else None
+
+
+def resize_alpha(alpha, size, resample_mode='bicubic'):
+    """Resize a 2D uint8 alpha array to size=(width, height)"""
+    resample = _PIL_RESAMPLE.get(resample_mode, Image.BICUBIC)
+    return np.asarray(Image.fromarray(alpha, 'L').resize(size, resample=resample))
+
+
+def _box_mean(x, r):
+    """Mean over a (2r+1)x(2r+1) window with edge clamping, via running sums"""
+    k = 2 * r + 1
+    padded = np.pad(x, r, mode='edge')
+    rows = np.cumsum(padded, axis=0, dtype=np.float64)
+    rows = np.concatenate([np.zeros((1, rows.shape[1])), rows], axis=0)
+    rows = rows[k:] - rows[:-k]
+    cols = np.cumsum(rows, axis=1)
+    cols = np.concatenate([np.zeros((cols.shape[0], 1)), cols], axis=1)
+    return ((cols[:, k:] - cols[:, :-k]) / (k * k)).astype(np.float32)
+
+
+def guided_upscale_alpha(alpha, guide_rgb, resample_mode='bicubic', radius=None, eps=1e-3):
+    """
+    Edge-aware alpha upscaling.
+    The alpha is resized classically, then a guided filter (He et al.) aligns its
+    edges with the luminance of the already upscaled RGB image.
+    """
+    out_h, out_w = guide_rgb.shape[:2]
+    if radius is None:
+        radius = max(1, round(out_w / max(1, alpha.shape[1])))
+
+    p = resize_alpha(alpha, (out_w, out_h), resample_mode).astype(np.float32) / 255.0
+    guide = guide_rgb[:, :, :3].astype(np.float32)
+    guide = (guide[:, :, 0] * 0.299 + guide[:, :, 1] * 0.587 + guide[:, :, 2] * 0.114) / 255.0
+
+    mean_i = _box_mean(guide, radius)
+    mean_p = _box_mean(p, radius)
+    cov_ip = _box_mean(guide * p, radius) - mean_i * mean_p
+    var_i = _box_mean(guide * guide, radius) - mean_i * mean_i
+
+    a = cov_ip / (var_i + eps)
+    b = mean_p - a * mean_i
+    q = _box_mean(a, radius) * guide + _box_mean(b, radius)
+    return np.clip(q * 255.0 + 0.5, 0, 255).astype(np.uint8)
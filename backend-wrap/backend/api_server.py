@@ -7,40 +7,88 @@ import asyncio
 import json
 import logging
 import os
+import shutil
+import time
 import uuid
-from io import BytesIO
-from typing import Dict, Union, List
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Union, List
 from contextlib import asynccontextmanager
 
 import uvicorn
 import numpy as np
 from PIL import Image
 from fastapi import (
-    FastAPI, HTTPException, WebSocket, WebSocketDisconnect, BackgroundTasks,
+    FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect,
     File, Form, UploadFile,
     )
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 from starlette.concurrency import run_in_threadpool
 
 
 from .config import (
     API_TITLE, API_VERSION, HOST, PORT, LOG_LEVEL,
-    CORS_ORIGINS, CORS_ALLOW_CREDENTIALS, OUTPUT_DIR
+    CORS_ORIGINS, CORS_ALLOW_CREDENTIALS, OUTPUT_DIR,
+    MODEL_CACHE_MAX_MB, MODEL_CACHE_MAX_MODELS, MODEL_IDLE_TTL,
+    INFERENCE_WORKERS, JOB_QUEUE_MAX, INFERENCE_MODE, INFERENCE_PROCESSES,
+    ALPHA_STRATEGY, TILE_MODE, TILE_SIZE, TILE_OVERLAP, TILE_MEMORY_MB, RESULT_MEMMAP_MB,
+    RESULT_CACHE_MAX_MB, BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS, BATCH_MAX_PIXELS,
+    MAX_INPUT_PIXELS, BATCH_MAX_ITEMS, BATCH_MAX_TOTAL_PIXELS, BATCH_MAX_MEMBER_MB, BATCH_MAX_TOTAL_MB,
+    INFERENCE_GMACS_PER_SECOND, MAX_OUTPUT_PIXELS, MAX_JOB_MEMORY_MB,
+    MAX_JOB_SECONDS, MAX_QUEUE_WAIT_SECONDS, JOB_RETENTION_SECONDS, OUTPUT_MAX_MB, RETENTION_SWEEP_SECONDS,
+    PROGRESS_MAX_RATE, LONG_POLL_MAX_SECONDS, SSE_KEEPALIVE_SECONDS,
+    PRELOAD_SCALES, WARMUP_IMAGE_SIZE, WARMUP_WAIT_SECONDS, CPU_MODES,
+    DEFAULT_PRECISION, QUANT_CALIBRATION_DIR, INFERENCE_BACKEND, ONNX_INTRA_OP_THREADS, ONNX_INTER_OP_THREADS,
+    CPU_PROFILE, CPU_CORES, CPU_PIN_WORKERS
+)
+from .model_cache import ModelCache, ModelHandle
+from .scheduler import JobScheduler, QueueFullError, CancellationToken, JobCancelledError
+from .admission import AdmissionController, CostEstimate, CostModel, JobTooLargeError, estimate_cost, job_macs
+from .batching import MicroBatcher
+from .process_pool import ProcessPoolBackend, ProcessModelHandle
+from .alpha import ALPHA_STRATEGIES
+from .quantize import PRECISIONS
+from .cpu_resources import CpuResourceManager
+from .image_array import to_array, to_image
+from .tiling import auto_tile_size, should_tile, tiles_per_pass, tiled_predict, allocate_output
+from .image_writer import StreamingPNGWriter
+from .planner import plan_scales, total_factor
+from .progress_hub import ProgressHub
+from .warmup import ModelWarmup
+from .retention import JobStore, RetentionManager, FINISHED_STATUSES
+from .result_cache import ResultCache, weights_version, link_or_copy
+from .util_file import (
+    spool_upload, probe_image, generate_filename, open_image, ImageTooLargeError, BatchTooLargeError,
+    FileTooLargeError, is_archive, iter_archive_members, copy_limited, unique_name, stream_tar
 )
-from .upscale import ModelManager
-from .util_file import process_byte_input, generate_filename
 
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Where finished images are written
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), OUTPUT_DIR)
+
+SCALE_FACTORS = ["2", "4", "8"]
+RESAMPLE_MODES = ['nearest', 'linear', 'bilinear', 'bicubic', 'area', 'nearest-exact']
+# the onnx backend runs the exported fp32 networks only
+BACKEND_PRECISIONS = PRECISIONS if INFERENCE_BACKEND == "torch" else ("fp32",)
+
 @asynccontextmanager
 async def lifespan(app):
     # startup
     logger.info(f"lifespan startup: pid={os.getpid()} ppid={os.getppid()}")
     # initialize any resources here if needed
+    await state.progress.start()
+    state.models.start_reaper()
+    state.retention.start_reaper()
+    if state.process_pool is not None:
+        state.process_pool.start()
+    state.scheduler.start()
+    # load and run the preloaded scales in the background, jobs are held until it finishes
+    await state.warmup.start()
     try:
         logger.info(f"startup event: pid={os.getpid()} ppid={os.getppid()}")
         yield 
@@ -48,6 +96,14 @@ async def lifespan(app):
         # shutdown
         logger.info(f"lifespan shutdown: pid={os.getpid()} ppid={os.getppid()}")
         # cleanup resources here if needed
+        await state.warmup.stop()
+        state.scheduler.stop()
+        if state.process_pool is not None:
+            state.process_pool.stop()
+        state.retention.stop_reaper()
+        state.models.stop_reaper()
+        state.models.clear()
+        await state.progress.stop()
 
 app = FastAPI(title=API_TITLE, version=API_VERSION, lifespan=lifespan)
 
@@ -63,68 +119,173 @@ app.add_middleware(
 # Global state management
 class UpscalerState:
     def __init__(self):
-        self.models: Dict[str, ModelManager] = {}
-        self.active_jobs: Dict[str, dict] = {}
-        self.websocket_connections: Dict[str, WebSocket] = {}
-        
-    def get_model(self, scale: str, resample_mode: str) -> ModelManager:
-        """Get or create a model for the given scale"""
-        model_key = f"{scale}_{resample_mode or 'bicubic'}"
-        if model_key not in self.models:
-            self.models[model_key] = ModelManager()
-            self.models[model_key].initialize_model(
-                scale=scale,
-                use_attention=False,
-                resample_mode=resample_mode
+        # each inference worker (scheduler thread, or worker process) gets its share of the cores
+        process_mode = INFERENCE_MODE == "process"
+        self.cpu = CpuResourceManager(CPU_PROFILE, INFERENCE_PROCESSES if process_mode else INFERENCE_WORKERS,
+                                      cores=CPU_CORES, pin=CPU_PIN_WORKERS,
+                                      torch_threads=INFERENCE_BACKEND == "torch")
+        backend_options = {}
+        if INFERENCE_BACKEND == "onnx":
+            # a worker process has a session of its own, in thread mode the workers share one session
+            threads = self.cpu.threads_per_worker if process_mode else len(self.cpu.cores)
+            backend_options = {"intra_op_threads": ONNX_INTRA_OP_THREADS or threads,
+                               "inter_op_threads": ONNX_INTER_OP_THREADS}
+        # one network per scale/device, shared across resample modes
+        cache_options = {"max_bytes": MODEL_CACHE_MAX_MB * 2**20, "max_models": MODEL_CACHE_MAX_MODELS,
+                         "idle_ttl": MODEL_IDLE_TTL}
+        self.models = ModelCache(
+            **cache_options,
+            use_attention=False,
+            batcher=MicroBatcher(BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS, BATCH_MAX_PIXELS),
+            cpu_modes=CPU_MODES,
+            calibration_dir=QUANT_CALIBRATION_DIR,
+            backend=INFERENCE_BACKEND,
+            backend_options=backend_options
+        )
+        # optional out-of-process inference, each worker process holds its own models
+        self.process_pool = None
+        if process_mode:
+            self.process_pool = ProcessPoolBackend(
+                processes=self.cpu.workers, use_attention=False, cpu_modes=CPU_MODES,
+                calibration_dir=QUANT_CALIBRATION_DIR, backend=INFERENCE_BACKEND, backend_options=backend_options,
+                cpu=self.cpu, cache_options=cache_options
             )
-        return self.models[model_key]
+            # scheduler threads only wait on the worker processes, they need no cores of their own
+            self.scheduler = JobScheduler(workers=max(INFERENCE_WORKERS, self.cpu.workers), max_queue=JOB_QUEUE_MAX)
+        else:
+            self.scheduler = JobScheduler(workers=self.cpu.workers, max_queue=JOB_QUEUE_MAX,
+                                          initializer=self.cpu.configure_worker)
+        self.results = ResultCache(os.path.join(RESULTS_DIR, "cache"), RESULT_CACHE_MAX_MB * 2**20)
+        # job cost estimates, calibrated on finished jobs
+        self.costs = CostModel(INFERENCE_GMACS_PER_SECOND * 1e9)
+        self.admission = AdmissionController(
+            self.costs,
+            max_output_pixels=MAX_OUTPUT_PIXELS,
+            max_memory_bytes=MAX_JOB_MEMORY_MB * 2**20,
+            max_seconds=MAX_JOB_SECONDS,
+            max_wait_seconds=MAX_QUEUE_WAIT_SECONDS
+        )
+        # finished jobs are compacted, and expired or evicted by the retention reaper
+        self.active_jobs = JobStore()
+        self.retention = RetentionManager(
+            self.active_jobs,
+            RESULTS_DIR,
+            discard=lambda job_id: discard_job(job_id),
+            ttl=JOB_RETENTION_SECONDS,
+            max_bytes=OUTPUT_MAX_MB * 2**20,
+            interval=RETENTION_SWEEP_SECONDS
+        )
+        # progress pushed to WebSocket subscribers from the server loop
+        self.progress = ProgressHub(max_rate=PROGRESS_MAX_RATE)
+        # networks loaded and run once at startup
+        self.warmup = ModelWarmup(
+            [s for s in PRELOAD_SCALES if s in SCALE_FACTORS],
+            warm=lambda scale: warm_model(scale)
+        )
+        self.started_at = time.time()
+        
+    def get_model(self, scale: str, resample_mode: str, alpha_strategy: str = None,
+                  precision: str = DEFAULT_PRECISION) -> Union[ModelHandle, ProcessModelHandle]:
+        """Get a handle on the shared model for the given scale, resample mode and precision"""
+        if self.process_pool is not None:
+            return self.process_pool.get_model(scale, resample_mode, alpha_strategy, precision)
+        return self.models.get(scale, resample_mode, alpha_strategy, precision)
+
+    def model_loads(self) -> int:
+        """Networks loaded so far, by this process or by the worker processes"""
+        if self.process_pool is not None:
+            return self.process_pool.loads
+        return self.models.stats["loads"]
+
+def warm_model(scale: str):
+    """Load the network for scale and run one forward pass on a small blank image"""
+    image = np.zeros((WARMUP_IMAGE_SIZE, WARMUP_IMAGE_SIZE, 3), dtype=np.uint8)
+    if state.process_pool is not None:
+        # every worker process holds its own networks
+        state.process_pool.warmup(scale, 'bicubic', image, ALPHA_STRATEGY, normalise_precision(DEFAULT_PRECISION))
+    else:
+        state.get_model(scale, 'bicubic', ALPHA_STRATEGY, normalise_precision(DEFAULT_PRECISION)).predict(image)
 
 state = UpscalerState()
 
 logger.info(f"api_server module loaded: pid={os.getpid()} ppid={os.getppid()}")
 
-# WebSocket connection manager
+# WebSocket progress: every connection subscribes to the progress hub of its job
 @app.websocket("/ws/{job_id}")
 async def websocket_endpoint(websocket: WebSocket, job_id: str):
     await websocket.accept()
-    state.websocket_connections[job_id] = websocket
     logger.info(f"WebSocket connected for job {job_id}")
-    
-    # keep connection alive and cleanup memory on disconnect
-    try:
+
+    async def forward(subscription):
+        # the latest state is replayed first, then pushed as the job progresses
         while True:
-            # Keep connection alive
-            await asyncio.sleep(1)
-    except WebSocketDisconnect:
-        logger.info(f"WebSocket disconnected for job {job_id}")
-        if job_id in state.websocket_connections:
-            del state.websocket_connections[job_id]
-
-async def send_progress_update(job_id: str, progress: float, message: str):
-    """Send progress update via WebSocket"""
-    if job_id in state.websocket_connections:
+            message = await subscription.get()
+            if message is None:
+                # job removed
+                await websocket.close()
+                return
+            await websocket.send_json(message)
+
+    async with state.progress.subscribe(job_id) as subscription:
+        sender = asyncio.create_task(forward(subscription))
         try:
-            progress_data = {
-                "progress": progress,
-                "message": message
-            }
-            logger.info(f"📤 Sending progress update for job {job_id}: {progress_data}")
-            await state.websocket_connections[job_id].send_json(progress_data)
-        except Exception as e:
-            logger.error(f"Error sending WebSocket message: {e}")
+            # the client never has to send anything, reading only notices the disconnect
+            while True:
+                event = await websocket.receive()
+                if event["type"] == "websocket.disconnect":
+                    break
+        except (WebSocketDisconnect, RuntimeError):
+            pass
+        finally:
+            sender.cancel()
+    logger.info(f"WebSocket disconnected for job {job_id}")
+
+def publish_progress(job_id: str, progress: float, message: str, final: bool = False):
+    """Push a progress update to the job's subscribers; safe to call from worker threads"""
+    job = state.active_jobs.get(job_id) or {}
+    state.progress.publish(job_id, {
+        "progress": progress,
+        "message": message,
+        "status": job.get("status"),
+    }, final=final)
+
+def update_job(job_id: str, fields: dict) -> Union[dict, None]:
+    """
+    Update a job's state from a worker; returns the job, or None once it was discarded
+    (DELETE, expiry) so a finishing worker never brings a removed job back
+    """
+    return state.active_jobs.update_job(job_id, **fields)
 
+def publish_job(job_id: str):
+    """Publish a job's current state after a status change (final once it finished)"""
+    job = state.active_jobs.get(job_id)
+    if job is not None:
+        publish_progress(job_id, job.get("progress", 0.0), job.get("message", ""),
+                         final=job.get("status") in FINISHED_STATUSES)
 
 
 @app.get("/")
 async def root():
     return {"message": "Image Upscaler API is running"}
 
+@app.get("/health/live")
+async def liveness():
+    """Liveness: the server process is up and its event loop answers"""
+    return {"status": "alive", "uptime": round(time.time() - state.started_at, 1)}
+
+@app.get("/health/ready")
+async def readiness():
+    """Readiness: 200 once model warmup has finished, 503 while it is running or if a scale failed"""
+    warmup = state.warmup.snapshot()
+    body = {"status": "ready" if warmup["status"] == "ready" else "not ready", "warmup": warmup}
+    return JSONResponse(body, status_code=200 if warmup["status"] == "ready" else 503)
+
 @app.get("/models")
 async def get_available_models():
     """Get list of available upscaling models"""
     return {
-        "factors": ["2", "4", "8"],
-        "resample_modes": ['nearest', 'linear', 'bilinear', 'bicubic', 'area', 'nearest-exact'],
+        "factors": SCALE_FACTORS,
+        "resample_modes": RESAMPLE_MODES,
         "resample_desc": {
             "nearest": "Nearest Neighbor - Fast and sharp lines",
             "linear": "Linear - Good for 1D, not recommended for images",
@@ -132,50 +293,316 @@ async def get_available_models():
             "bicubic": "Bicubic - High quality, smooth (recommended)",
             "area": "Area - Good for downsampling",
             'nearest-exact': 'Nearest Neighbor Exact - Strictly better nearest neighbor'
-        }
+        },
+        "alpha_strategies": list(ALPHA_STRATEGIES),
+        "alpha_desc": {
+            "network": "Network - Full model pass on the alpha channel, best quality (slowest)",
+            "guided": "Guided - Edge-aware resize guided by the upscaled colours",
+            "resize": "Resize - Classical resize with the selected resample mode (fastest)"
+        },
+        "default_alpha_strategy": ALPHA_STRATEGY,
+        "backend": INFERENCE_BACKEND,
+        "precisions": list(BACKEND_PRECISIONS),
+        "precision_desc": {
+            "fp32": "FP32 - Original weights (best quality)",
+            "int8": "INT8 - Quantized weights on the CPU (faster on CPU-only servers, slightly lower quality)"
+        },
+        "default_precision": normalise_precision(DEFAULT_PRECISION)
     }
 
-#TODO: Automatically Reject job if image too large 
+@app.get("/results/cache")
+async def get_result_cache_stats():
+    """Result cache counters (hits, misses, collapsed in-flight duplicates, evictions)"""
+    return state.results.snapshot()
+
+@app.get("/models/cache")
+async def get_model_cache_stats():
+    """Model cache counters (hits, misses, load time, evictions) and resident models"""
+    stats = state.models.snapshot()
+    if state.models.batcher is not None:
+        stats["batching"] = state.models.batcher.snapshot()
+    return stats
+
 @app.post("/upscale", status_code=202)
 async def upscale_image(
-    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     scales: str = Form(default="2"),  # JSON string like "[\"2\", \"4\"]"
     resample_mode: str = Form(default="bicubic"),
     show_progress: bool = Form(default=True),
     job_id: str = Form(None),
+    priority: int = Form(default=0),  # higher runs first
+    alpha_strategy: str = Form(default=ALPHA_STRATEGY),
+    keep_chain: bool = Form(default=False),  # run scales exactly as listed and keep intermediates
+    max_output_pixels: int = Form(default=0),  # cap on the result size, lets large JPEGs decode at reduced size
+    precision: str = Form(default=DEFAULT_PRECISION),  # "fp32" or "int8" weights
     
 ):
     """
     Upscale an image with the specified parameters
+    Jobs are queued on the inference scheduler; a full queue answers 503 with Retry-After
+    Right after startup jobs wait for model warmup (503 if it outlasts WARMUP_WAIT_SECONDS)
+    Images over MAX_INPUT_PIXELS are rejected with 413 from their header, before decoding
     """
+    scale_list = parse_scales(scales)
+    # only the supported scales are run, so only they size the draft decode and the estimate
+    valid_scales = supported_scales(scale_list)
+    max_decode_pixels = 0
+    if max_output_pixels > 0 and valid_scales:
+        max_decode_pixels = max_output_pixels // total_factor(valid_scales) ** 2
     
     try:
         # Validate file type
         if not file.content_type.startswith('image/'):
             raise HTTPException(status_code=400, detail="File must be an image")
-        # Read the uploaded file
-        img_file = await process_byte_input(file)
+        # Read the image header of the uploaded file
+        fp = await spool_upload(file)
+        image_shape = await run_in_threadpool(probe_image, fp, MAX_INPUT_PIXELS, max_decode_pixels)
+    except ImageTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error reading uploaded file: {e}")
+        raise HTTPException(status_code=400, detail="Invalid file upload")
+
+    # Estimate the job from the header and reject it before decoding if it is over a limit
+    resample_mode, alpha_strategy = normalise_options(resample_mode, alpha_strategy)
+    precision = normalise_precision(precision)
+    estimate, admission = None, None
+    if valid_scales:
+        estimate = estimate_job(image_shape, valid_scales, alpha_strategy, keep_chain)
+        try:
+            state.admission.check_limits(estimate)
+        except JobTooLargeError as e:
+            raise admission_error(e)
+
+    try:
+        img_file = await run_in_threadpool(open_image, fp, MAX_INPUT_PIXELS, max_decode_pixels)
     except Exception as e:
         logger.error(f"Error reading uploaded file: {e}")
         raise HTTPException(status_code=400, detail="Invalid file upload")
     
     if job_id == None:
         job_id = str(uuid.uuid4())
+
+    # Serve repeats from the result cache and collapse identical in-flight jobs,
+    # only jobs that still need inference wait for the queue and the warmup
+    response, cache_key = await run_in_threadpool(
+        reuse_result, job_id, img_file, file.filename, scale_list, resample_mode, alpha_strategy, keep_chain,
+        precision=precision
+    )
+    if response is not None:
+        return response
+    try:
+        if estimate is not None:
+            try:
+                admission = state.admission.check_wait(state.scheduler.expected_wait())
+            except QueueFullError as e:
+                raise admission_error(e)
+        await wait_for_warmup()
+    except HTTPException as e:
+        # identical jobs that joined this one in the meantime cannot wait on it
+        complete_followers(cache_key, error=e.detail)
+        raise
+    
+    state.active_jobs[job_id] = {
+        "status": "queued",
+        "progress": 0.0,
+        "message": "Waiting for a free worker…",
+        "priority": priority,
+        "cache_key": cache_key,
+        "estimate": estimate.describe() if estimate else None,
+        "precision": precision,
+        "cancel_token": CancellationToken()
+    }
+    try:
+        state.scheduler.submit(
+            job_id,
+            upscale_job,  # a sync function that wraps your loop & ModelManager calls
+            job_id, 
+            img_file,
+            file.filename,
+            scales, 
+            resample_mode, 
+            show_progress,
+            alpha_strategy,
+            keep_chain,
+            cache_key,
+            RESULTS_DIR,
+            state.active_jobs[job_id]["cancel_token"],
+            precision,
+            priority=priority
+        )
+    except QueueFullError as e:
+        del state.active_jobs[job_id]
+        complete_followers(cache_key, error="Server busy, job queue is full")
+        raise HTTPException(
+            status_code=503,
+            detail="Server busy, job queue is full",
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    publish_job(job_id)
     
     # send initial 'accepted' response
-    background_tasks.add_task(
-        run_in_threadpool,
-        upscale_job,  # a sync function that wraps your loop & ModelManager calls
-        job_id, 
-        img_file,
-        file.filename,
-        scales, 
-        resample_mode, 
-        show_progress
+    return {
+        "job_id": job_id,
+        "status": "accepted",
+        "admission": admission,
+        "queue_position": state.scheduler.position(job_id),
+        "estimate": estimate.describe() if estimate else None,
+    }
+
+def estimate_job(image_shape, scale_list: List[str], alpha_strategy: str, keep_chain: bool) -> CostEstimate:
+    """Cost of upscaling an image of image_shape (height, width, channels) with the planned networks"""
+    plan = plan_scales(scale_list, SCALE_FACTORS, image_shape[:2], keep_chain)
+    return estimate_cost(
+        plan, image_shape[:2], image_shape[2], alpha_strategy, state.costs,
+        tile_size_fn=tile_size_for, memmap_threshold=RESULT_MEMMAP_MB * 2**20
     )
-    
-    return {"job_id": job_id, "status": "accepted"}
+
+def admission_error(e: Exception) -> HTTPException:
+    """HTTP answer for a job refused by admission control"""
+    if isinstance(e, JobTooLargeError):
+        return HTTPException(status_code=413, detail={"message": e.reason, "estimate": e.estimate.describe()})
+    return HTTPException(
+        status_code=503,
+        detail="Server busy, expected wait is too long",
+        headers={"Retry-After": str(e.retry_after)}
+    )
+
+async def wait_for_warmup():
+    """Hold a new job until model warmup has finished, 503 with Retry-After if it takes too long"""
+    if not await state.warmup.wait(WARMUP_WAIT_SECONDS):
+        raise HTTPException(
+            status_code=503,
+            detail="Server is warming up",
+            headers={"Retry-After": str(max(1, int(WARMUP_WAIT_SECONDS)))}
+        )
+
+def parse_scales(scales: Union[str, List[str]]) -> List[str]:
+    """Scale list from a JSON string like '["2", "4"]', a bare factor or a list"""
+    if isinstance(scales, str):
+        try:
+            scale_list = json.loads(scales)
+            if not isinstance(scale_list, list):
+                scale_list = [scale_list]
+        except json.JSONDecodeError:
+            scale_list = [scales]
+    else:
+        scale_list = scales
+    return [str(s) for s in scale_list]
+
+def supported_scales(scales: Union[str, List[str]]) -> List[str]:
+    """The scales of parse_scales that are in SCALE_FACTORS, in order"""
+    return [s for s in parse_scales(scales) if s in SCALE_FACTORS]
+
+def normalise_precision(precision: str) -> str:
+    if precision not in PRECISIONS:
+        logging.warning(f"Invalid precision '{precision}', falling back to '{DEFAULT_PRECISION}'")
+        precision = DEFAULT_PRECISION
+    if precision not in BACKEND_PRECISIONS:
+        logging.warning(f"Precision '{precision}' is not available on the {INFERENCE_BACKEND} backend, using fp32")
+        return "fp32"
+    return precision
+
+def normalise_options(resample_mode: str, alpha_strategy: str):
+    """Fall back to defaults for unknown resample modes and alpha strategies"""
+    if resample_mode not in RESAMPLE_MODES:
+        logging.warning(f"Invalid resample_mode '{resample_mode}', falling back to 'bicubic'")
+        resample_mode = "bicubic"
+    if alpha_strategy not in ALPHA_STRATEGIES:
+        logging.warning(f"Invalid alpha_strategy '{alpha_strategy}', falling back to '{ALPHA_STRATEGY}'")
+        alpha_strategy = ALPHA_STRATEGY
+    return resample_mode, alpha_strategy
+
+def reuse_result(
+    job_id: str,
+    img_file: Image,
+    filename: str,
+    scale_list: List[str],
+    resample_mode: str,
+    alpha_strategy: str,
+    keep_chain: bool,
+    output_dir: str = RESULTS_DIR,
+    extra: dict = None,
+    precision: str = DEFAULT_PRECISION
+):
+    """
+    Complete job_id from the result cache, or attach it to an identical job already in flight.
+    Returns (response, cache_key); response is None when the job still has to run.
+    Hashes the decoded image, so it is called from a worker or the thread pool.
+    """
+    if not (state.results.enabled and not keep_chain and scale_list and all(s in SCALE_FACTORS for s in scale_list)):
+        return None, None
+
+    cache_key = ResultCache.make_key(
+        img_file, scale_list, resample_mode, alpha_strategy,
+        os.path.splitext(filename)[1], weights_version(SCALE_FACTORS, precision, INFERENCE_BACKEND)
+    )
+    output_filename = generate_filename(filename, scale_list, resample_mode)
+    out_path = os.path.join(output_dir, output_filename)
+    if state.results.link_cached(cache_key, out_path):
+        state.active_jobs[job_id] = {
+            "status": "completed",
+            "progress": 1.0,
+            "message": "Image upscaled successfully! (cached)",
+            "output_file": out_path,
+            "filename": output_filename,
+            "precision": precision,
+            **(extra or {})
+        }
+        publish_job(job_id)
+        return {"job_id": job_id, "status": "completed", "cached": True}, cache_key
+
+    leader = state.results.join_inflight(
+        cache_key, job_id, {"output_file": out_path, "filename": output_filename}
+    )
+    if leader is not None:
+        state.active_jobs[job_id] = {
+            "status": "queued",
+            "progress": 0.0,
+            "message": "Waiting on an identical job…",
+            "deduplicated_with": leader,
+            "precision": precision,
+            **(extra or {})
+        }
+        publish_job(job_id)
+        return {"job_id": job_id, "status": "accepted", "deduplicated_with": leader}, cache_key
+    return None, cache_key
+
+def complete_followers(cache_key: str, out_path: str = None, error: str = None):
+    """Finish jobs that were collapsed onto an identical in-flight job"""
+    if cache_key is None:
+        return
+    for follower_id, info in state.results.finish_inflight(cache_key):
+        if state.active_jobs.get(follower_id, {}).get("status") in (None, "cancelled"):
+            continue
+        if error is not None:
+            update_job(follower_id, {"status": "error", "message": error})
+        else:
+            try:
+                link_or_copy(out_path, info["output_file"])
+                update_job(follower_id, {
+                    "status": "completed",
+                    "progress": 1.0,
+                    "message": "Image upscaled successfully!",
+                    **info
+                })
+            except OSError as e:
+                update_job(follower_id, {"status": "error", "message": str(e)})
+        publish_job(follower_id)
+
+def tile_size_for(image_shape, scale) -> Union[int, None]:
+    """Tile edge to use for this input and scale, or None to run it in one pass"""
+    if TILE_MODE == "off":
+        return None
+    # sized for one tile per forward pass, tile_batch_size fits batches into the same budget
+    tile_size = TILE_SIZE or auto_tile_size(TILE_MEMORY_MB * 2**20, scale, TILE_OVERLAP)
+    if TILE_MODE == "always" or should_tile(image_shape, tile_size):
+        return tile_size
+    return None
+
+def tile_batch_size(tile_size, scale) -> int:
+    """Tiles run per forward pass: up to BATCH_MAX_SIZE, as long as they fit in TILE_MEMORY_MB"""
+    return tiles_per_pass(TILE_MEMORY_MB * 2**20, tile_size, scale, TILE_OVERLAP, BATCH_MAX_SIZE)
 
 def upscale_job(
     job_id: str,
@@ -183,7 +610,13 @@ def upscale_job(
     original_filename: str,
     scales: Union[str, List[str]],
     resample_mode: str,
-    show_progress: bool
+    show_progress: bool,
+    alpha_strategy: str = ALPHA_STRATEGY,
+    keep_chain: bool = False,
+    cache_key: str = None,
+    output_dir: str = RESULTS_DIR,
+    cancel_token: CancellationToken = None,
+    precision: str = DEFAULT_PRECISION
 ):
     """
     Synchronous helper to run in a thread pool.
@@ -192,123 +625,650 @@ def upscale_job(
     - original_filename: e.g. "photo.jpg"
     - scales: JSON string or list of scale factors
     - resample_mode: interpolation mode
-    - show_progress: whether to push updates
+    - show_progress: whether to push per-scale and per-tile progress (status changes are always published)
+    - alpha_strategy: how the alpha channel of RGBA images is upscaled
+    - keep_chain: run the scales exactly as listed and save each intermediate result,
+      otherwise the planner picks the cheapest networks reaching the same total factor
+    - cache_key: result cache key; the result is cached and identical waiting jobs completed
+    - output_dir: where results are written (batch items get a directory per batch)
+    - cancel_token: checked between scales and tiles, a cancelled job stops and removes its partial files
+    - precision: "fp32" weights or their "int8" quantized variant
     """
+    should_stop = cancel_token.raise_if_cancelled if cancel_token is not None else None
+    out_path, intermediates = None, []
     try:
-        # 1) Parse + validate scales
-        if isinstance(scales, str):
-            try:
-                scale_list = json.loads(scales)
-                if not isinstance(scale_list, list):
-                    scale_list = [str(scale_list)]
-            except json.JSONDecodeError:
-                scale_list = [scales]
-        else:
-            scale_list = [str(s) for s in scales]
-
-        retrieved_model_info = asyncio.run(get_available_models())
+        if should_stop is not None:
+            should_stop()
 
-        valid_factors = retrieved_model_info["factors"]
-        scale_list = [s for s in scale_list if str(s) in valid_factors]
+        # 1) Parse + validate scales
+        scale_list = supported_scales(scales)
         if not scale_list:
-            raise ValueError(f"No valid scales provided. Must be {valid_factors}")
+            raise ValueError(f"No valid scales provided. Must be {SCALE_FACTORS}")
 
-        # 2) Validate resample mode
-        valid_modes = retrieved_model_info["resample_modes"]
-        if resample_mode not in valid_modes:
-            logging.warning(f"Invalid resample_mode '{resample_mode}', falling back to 'bicubic'")
-            resample_mode = "bicubic"
+        # 2) Validate resample mode and alpha strategy
+        resample_mode, alpha_strategy = normalise_options(resample_mode, alpha_strategy)
 
         # 3) Read image from bytes
         uploaded_img = img_file
 
-        # 4) Initialize job state
-        state.active_jobs[job_id] = {
+        # 4) Plan the networks to run and initialize job state
+        if isinstance(uploaded_img, Image.Image):
+            image_shape = (uploaded_img.height, uploaded_img.width)
+        else:
+            image_shape = uploaded_img.shape[:2]
+        plan = plan_scales(scale_list, SCALE_FACTORS, image_shape, keep_chain)
+        logger.info(f"[upscale_job:{job_id}] plan {plan}")
+        update_job(job_id, {
             "status": "processing",
             "progress": 0.0,
             "message": "Starting upscale…",
             "scales": scale_list,
-            "resample_mode": resample_mode
-        }
+            "resample_mode": resample_mode,
+            "precision": precision,
+            "plan": plan.describe()
+        })
 
         # Send initial progress
-        if show_progress:
-            asyncio.run(send_progress_update(job_id, 0.0, "Starting upscale…"))
+        publish_progress(job_id, 0.0, "Starting upscale…")
+
+        output_filename = generate_filename(original_filename, scale_list, resample_mode)
+        out_path = os.path.join(output_dir, output_filename)
 
-        # 5) Loop over scales
-        current_img = uploaded_img
-        if isinstance(current_img, Image.Image):
-            current_img = np.array(current_img)
-        total = len(scale_list)
+        # 5) Loop over scales; every step takes and returns a uint8 array (see image_array.py)
+        current_img = to_array(uploaded_img)
+        total = len(plan.steps)
+
+        def report_progress(progress: float, message: str):
+            # raising here also stops RealESRGAN's patch loop when the job is cancelled
+            if should_stop is not None:
+                should_stop()
+            # update state and push to subscribers (throttled by the hub)
+            if update_job(job_id, {"progress": progress, "message": message}) is not None:
+                publish_progress(job_id, progress, message)
 
         async def progress_callback(progress: float, message: str):
-            # update state and push via WebSocket
-            state.active_jobs[job_id]["progress"] = progress
-            state.active_jobs[job_id]["message"] = message
-            await send_progress_update(job_id, progress, message)
+            report_progress(progress, message)
 
-        for idx, scale in enumerate(scale_list):
-            model = state.get_model(scale, resample_mode)
+        def tile_progress(done: int, count: int):
             if show_progress:
+                report_progress(done / count, f"Upscaled tile {done}/{count}")
+
+        # final tiled PNG results are encoded strip by strip while tiles finish
+        stream_output = output_filename.lower().endswith('.png')
+        writer = None
+
+        def write_final_rows(out, row_start, row_end):
+            nonlocal writer
+            if writer is None:
+                channels = out.shape[2] if out.ndim == 3 else 1
+                writer = StreamingPNGWriter(out_path, out.shape[1], out.shape[0], channels)
+            writer.write_rows(out[row_start:row_end])
+
+        channels = current_img.shape[2] if current_img.ndim == 3 else 1
+        # only the forward passes are timed; a job that loaded a network is not a throughput sample
+        inference_seconds = 0.0
+        loads_before = state.model_loads()
+        for idx, scale in enumerate(plan.steps):
+            if should_stop is not None:
+                should_stop()
+            model = state.get_model(scale, resample_mode, alpha_strategy, precision)
+            tile_size = tile_size_for(np.shape(current_img), scale)
+            is_last = idx == total - 1
+            step_started = time.perf_counter()
+            if tile_size:
+                # large input: bounded memory tiles written into a preallocated/memory-mapped result
+                streaming = is_last and stream_output
+                try:
+                    result = tiled_predict(
+                        model.predict, current_img, scale, tile_size, TILE_OVERLAP,
+                        allocate=lambda shape: allocate_output(
+                            shape, RESULT_MEMMAP_MB * 2**20, RESULTS_DIR
+                        ),
+                        progress_callback=tile_progress,
+                        should_stop=should_stop,
+                        on_rows_ready=write_final_rows if streaming else None,
+                        predict_batch_fn=getattr(model, 'predict_batch', None),
+                        batch_size=tile_batch_size(tile_size, scale)
+                    )
+                finally:
+                    if writer is not None:
+                        writer.close()
+                if streaming:
+                    # already on disk, drop the (memory-mapped) buffer
+                    result = None
+            elif is_last and isinstance(model, ProcessModelHandle):
+                # let the worker process encode the final image, keeping PNG work off the API process
+                model.predict_to_file(current_img, out_path)
+                result = None
+            elif show_progress:
                 result = asyncio.run(model.predict_with_progress(current_img, progress_callback=progress_callback))
             else:
                 result = model.predict(current_img)
+            inference_seconds += time.perf_counter() - step_started
 
-            # Predict functions return PIL images
-            # prepare for next iteration and preserves RGBA return format if final iteration
-            if isinstance(result, Image.Image) and idx < total - 1:
-                current_img = np.array(result)
-            else:
-                current_img = result
+            # None once the final result is already on disk
+            current_img = result
+
+            if keep_chain and not is_last:
+                step_filename = generate_filename(original_filename, plan.steps[:idx + 1], resample_mode)
+                to_image(current_img).save(os.path.join(output_dir, step_filename))
+                intermediates.append(step_filename)
 
             # send 'this scale done' update
-            if show_progress:
-                asyncio.run(send_progress_update(job_id, 1.0, f"Completed scale x{scale}"))
+            if show_progress and job_id in state.active_jobs:
+                publish_progress(job_id, 1.0, f"Completed scale x{scale}")
 
-        # 6) Save final result
-        output_filename = generate_filename(original_filename, scale_list, resample_mode)
-        current_dir = os.path.dirname(__file__)
-        out_path = os.path.join(current_dir, OUTPUT_DIR, output_filename)
+        # calibrate the admission cost model on the measured inference time
+        if state.model_loads() == loads_before:
+            state.costs.observe(job_macs(plan, channels, alpha_strategy), inference_seconds)
 
-        # If PIL.Image:
-        if isinstance(current_img, Image.Image):
-            current_img.save(out_path)
-        else:
-            # assume numpy array
-            Image.fromarray(current_img).save(out_path)
+        # 6) Save final result (already written when streamed or encoded by a worker process)
+        if current_img is not None:
+            to_image(current_img).save(out_path)
 
-        # 7) Mark job complete
-        state.active_jobs[job_id].update({
+        # 7) Mark job complete (a discarded job only still ran for identical waiting jobs)
+        job = update_job(job_id, {
             "status": "completed",
             "progress": 1.0,
             "message": "Image upscaled successfully!",
             "output_file": out_path,
-            "filename": output_filename
+            "filename": output_filename,
+            "intermediate_files": [os.path.join(output_dir, f) for f in intermediates]
         })
-        if show_progress:
-            asyncio.run(send_progress_update(job_id, 1.0, "Image upscaled successfully!"))
+        state.results.store(cache_key, out_path)
+        complete_followers(cache_key, out_path)
+        if job is not None:
+            publish_progress(job_id, 1.0, "Image upscaled successfully!", final=True)
+
+    except JobCancelledError:
+        logger.info(f"[upscale_job:{job_id}] cancelled")
+        # the streaming writer already dropped an incomplete result, remove the rest
+        for path in [out_path] + [os.path.join(output_dir, f) for f in intermediates]:
+            if path and os.path.exists(path):
+                os.unlink(path)
+        job = update_job(job_id, {"status": "cancelled", "message": "Job cancelled"})
+        complete_followers(cache_key, error="Identical job was cancelled")
+        if job is not None:
+            publish_progress(job_id, job.get("progress", 0.0), "Job cancelled", final=True)
 
     except Exception as e:
         logger.error(f"[upscale_job:{job_id}] error: {e}")
-        state.active_jobs[job_id] = {"status": "error", "message": str(e)}
+        job = update_job(job_id, {"status": "error", "message": str(e)})
+        complete_followers(cache_key, error=str(e))
+        if job is not None:
+            publish_progress(job_id, job.get("progress", 0.0), str(e), final=True)
+
+
+def read_batch_uploads(files: List[UploadFile], input_dir: str) -> List[tuple]:
+    """
+    (name, path, (height, width, channels)) for every uploaded image and every image inside
+    uploaded tar/zip archives. Only headers are read: the encoded images are saved to
+    input_dir and decoded by the batch job, one item at a time.
+    Archive members are checked against the byte limits from their recorded size before they
+    are extracted, and every copy stops once it goes past them.
+    Raises BatchTooLargeError past BATCH_MAX_ITEMS images, BATCH_MAX_TOTAL_PIXELS pixels or
+    BATCH_MAX_TOTAL_MB, FileTooLargeError for an uploaded image larger than BATCH_MAX_MEMBER_MB.
+    """
+    items, total_pixels, total_bytes = [], 0, 0
+    member_limit, total_limit = BATCH_MAX_MEMBER_MB * 2**20, BATCH_MAX_TOTAL_MB * 2**20
+
+    def add(name, fp, size=None):
+        nonlocal total_pixels, total_bytes
+        if BATCH_MAX_ITEMS and len(items) >= BATCH_MAX_ITEMS:
+            raise BatchTooLargeError(f"Batch has more than {BATCH_MAX_ITEMS} images")
+        if member_limit and size is not None and size > member_limit:
+            raise FileTooLargeError(f"{size} bytes, the limit is {member_limit} bytes")
+        remaining = total_limit - total_bytes
+        if total_limit and (remaining <= 0 or (size is not None and size > remaining)):
+            raise BatchTooLargeError(f"Batch is larger than {BATCH_MAX_TOTAL_MB} MB")
+        # recorded sizes can lie, so the copy itself stops at the tighter limit too
+        batch_bound = bool(total_limit) and (not member_limit or remaining < member_limit)
+        path = os.path.join(input_dir, str(len(items)))
+        try:
+            with open(path, 'wb') as out:
+                copied = copy_limited(fp, out, remaining if batch_bound else member_limit)
+        except FileTooLargeError:
+            os.unlink(path)
+            if batch_bound:
+                raise BatchTooLargeError(f"Batch is larger than {BATCH_MAX_TOTAL_MB} MB")
+            raise
+        total_bytes += copied
+        try:
+            with open(path, 'rb') as f:
+                shape = probe_image(f, MAX_INPUT_PIXELS)
+        except Exception:
+            os.unlink(path)
+            total_bytes -= copied
+            raise
+        total_pixels += shape[0] * shape[1]
+        if BATCH_MAX_TOTAL_PIXELS and total_pixels > BATCH_MAX_TOTAL_PIXELS:
+            raise BatchTooLargeError(f"Batch has more than {BATCH_MAX_TOTAL_PIXELS} pixels in total")
+        items.append((name, path, shape))
+
+    for upload in files:
+        if is_archive(upload.file):
+            for name, member, size in iter_archive_members(upload.file):
+                try:
+                    add(name, member, size)
+                except BatchTooLargeError:
+                    raise
+                except Exception as err:
+                    # members that are too large or not readable images are skipped
+                    logger.warning(f"Unable to read {name} from archive, skipping ({err})")
+        elif upload.content_type and upload.content_type.startswith('image/'):
+            add(upload.filename, upload.file)
+        else:
+            raise ValueError(f"{upload.filename} is neither an image nor a tar/zip archive")
+    return items
+
+@app.post("/upscale/batch", status_code=202)
+async def upscale_batch(
+    files: List[UploadFile] = File(...),  # images and/or tar/zip archives of images
+    scales: str = Form(default="2"),
+    resample_mode: str = Form(default="bicubic"),
+    show_progress: bool = Form(default=True),
+    job_id: str = Form(None),
+    priority: int = Form(default=0),
+    alpha_strategy: str = Form(default=ALPHA_STRATEGY),
+    keep_chain: bool = Form(default=False),
+    precision: str = Form(default=DEFAULT_PRECISION),
+):
+    """
+    Upscale many images as one parent job with a child job per image
+    The batch takes a single scheduler slot and runs its items through the shared models,
+    progress is aggregated on /batch/{job_id} and the results are streamed as a tar archive
+    """
+    # results of one batch share a directory, names only have to be unique within it;
+    # the encoded uploads wait in it until their item runs
+    batch_dir = os.path.join(RESULTS_DIR, f"batch-{uuid.uuid4().hex}")
+    input_dir = os.path.join(batch_dir, ".inputs")
+    os.makedirs(input_dir, exist_ok=True)
+    try:
+        try:
+            items = await run_in_threadpool(read_batch_uploads, files, input_dir)
+        except (ImageTooLargeError, BatchTooLargeError, FileTooLargeError) as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        except Exception as e:
+            logger.error(f"Error reading uploaded batch: {e}")
+            raise HTTPException(status_code=400, detail="Invalid file upload")
+        if not items:
+            raise HTTPException(status_code=400, detail="No images found in upload")
+
+        # every item has to be admissible on its own, the batch as a whole waits for one worker
+        scale_list = parse_scales(scales)
+        resample_mode, alpha_strategy = normalise_options(resample_mode, alpha_strategy)
+        precision = normalise_precision(precision)
+        valid_scales = supported_scales(scale_list)
+        estimates = []
+        if valid_scales:
+            try:
+                for name, _, shape in items:
+                    estimate = estimate_job(shape, valid_scales, alpha_strategy, keep_chain)
+                    state.admission.check_limits(estimate)
+                    estimates.append(estimate)
+                admission = state.admission.check_wait(state.scheduler.expected_wait())
+            except JobTooLargeError as e:
+                e.reason = f"{name}: {e.reason}"
+                raise admission_error(e)
+            except QueueFullError as e:
+                raise admission_error(e)
+        else:
+            admission = None
+        await wait_for_warmup()
+    except HTTPException:
+        shutil.rmtree(batch_dir, ignore_errors=True)
+        raise
+
+    if job_id == None:
+        job_id = str(uuid.uuid4())
+    children, pending, used_names = [], [], set()
+    batch_token = CancellationToken()
+    for index, (name, path, _) in enumerate(items):
+        child_id = f"{job_id}-{index}"
+        filename = unique_name(os.path.basename(name), used_names)
+        # name in the downloaded archive, keeping the folder structure of uploaded archives
+        archive_name = os.path.join(
+            os.path.dirname(name), generate_filename(os.path.basename(name), scale_list, resample_mode)
+        )
+        extra = {"parent": job_id, "member": name, "archive_name": archive_name}
+        children.append(child_id)
+        # the result cache is checked once the item is decoded in batch_job
+        state.active_jobs[child_id] = {
+            "status": "queued",
+            "progress": 0.0,
+            "message": "Waiting for a free worker…",
+            "cancel_token": CancellationToken(parent=batch_token),
+            **extra
+        }
+        pending.append((child_id, path, filename, extra, state.active_jobs[child_id]["cancel_token"]))
+        publish_job(child_id)
+
+    state.active_jobs[job_id] = {
+        "type": "batch",
+        "status": "queued",
+        "progress": 0.0,
+        "message": "Waiting for a free worker…",
+        "priority": priority,
+        "children": children,
+        "output_dir": batch_dir,
+        "cancel_token": batch_token
+    }
+    try:
+        state.scheduler.submit(
+            job_id,
+            batch_job,
+            job_id,
+            pending,
+            scales,
+            resample_mode,
+            show_progress,
+            alpha_strategy,
+            keep_chain,
+            precision,
+            priority=priority
+        )
+    except QueueFullError as e:
+        discard_job(job_id)
+        raise HTTPException(
+            status_code=503,
+            detail="Server busy, job queue is full",
+            headers={"Retry-After": str(e.retry_after)}
+        )
+
+    refresh_batch(job_id)
+    publish_job(job_id)
+    return {
+        "job_id": job_id,
+        "status": "accepted",
+        "items": len(children),
+        "admission": admission,
+        "queue_position": state.scheduler.position(job_id),
+        "estimate": batch_estimate(estimates),
+    }
+
+def batch_estimate(estimates: List[CostEstimate]) -> Union[dict, None]:
+    """Totals of the per-item estimates of a batch; up to BATCH_MAX_SIZE items run at once"""
+    if not estimates:
+        return None
+    concurrent = min(len(estimates), max(1, BATCH_MAX_SIZE))
+    return {
+        "items": len(estimates),
+        "output_pixels": sum(e.output_pixels for e in estimates),
+        "memory_mb": round(max(e.peak_bytes for e in estimates) * concurrent / 2**20, 1),
+        "seconds": round(sum(e.seconds for e in estimates), 1),
+        "gmacs": round(sum(e.macs for e in estimates) / 1e9, 1),
+    }
+
+def batch_job(
+    batch_id: str,
+    items: List[tuple],
+    scales: Union[str, List[str]],
+    resample_mode: str,
+    show_progress: bool,
+    alpha_strategy: str = ALPHA_STRATEGY,
+    keep_chain: bool = False,
+    precision: str = DEFAULT_PRECISION
+):
+    """
+    Synchronous helper run by the scheduler for a batch.
+    - items: (child_id, input path, filename, extra job fields, cancel_token) of the children
+    Up to BATCH_MAX_SIZE children run at once so same-shaped items share forward passes.
+    Each item is decoded only when it runs, then served from the result cache, attached to an
+    identical job in flight or upscaled. The batch publishes its aggregate state whenever an item finishes.
+    """
+    batch = update_job(batch_id, {"status": "processing"})
+    if batch is None:
+        return
+    output_dir = batch["output_dir"]
+    publish_job(batch_id)
+    scale_list = parse_scales(scales)
+
+    def run_item(item):
+        child_id, path, filename, extra, cancel_token = item
+        try:
+            if cancel_token.cancelled:
+                # items that have not started are dropped without decoding them
+                update_job(child_id, {"status": "cancelled", "message": "Job cancelled"})
+                publish_job(child_id)
+                return
+            try:
+                image = open_image(path, MAX_INPUT_PIXELS)
+            except Exception as e:
+                update_job(child_id, {"status": "error", "message": f"Unable to read image: {e}"})
+                publish_job(child_id)
+                return
+            if child_id not in state.active_jobs:
+                return
+            response, cache_key = reuse_result(
+                child_id, image, filename, scale_list, resample_mode, alpha_strategy, keep_chain,
+                output_dir=output_dir, extra={**extra, "cancel_token": cancel_token}, precision=precision
+            )
+            if response is None:
+                update_job(child_id, {"cache_key": cache_key})
+                upscale_job(
+                    child_id, image, filename, scales, resample_mode, False,
+                    alpha_strategy, keep_chain, cache_key, output_dir, cancel_token, precision
+                )
+        finally:
+            if os.path.exists(path):
+                os.unlink(path)
+            refresh_batch(batch_id)
+            publish_job(batch_id)
+
+    # item threads run on the cores of the worker running the batch
+    with ThreadPoolExecutor(max(1, BATCH_MAX_SIZE), thread_name_prefix=f"batch-{batch_id}",
+                            initializer=state.cpu.configure_helper, initargs=(state.cpu.current(),)) as pool:
+        for _ in pool.map(run_item, items):
+            pass
+    refresh_batch(batch_id)
+
+def refresh_batch(batch_id: str) -> Union[dict, None]:
+    """Recompute the aggregate status, progress and counts of a batch from its children"""
+    batch = state.active_jobs.get(batch_id)
+    if batch is None or batch.get("type") != "batch":
+        return batch
+    counts = Counter()
+    progress = 0.0
+    for child_id in batch["children"]:
+        child = state.active_jobs.get(child_id, {"status": "removed"})
+        counts[child["status"]] += 1
+        progress += 1.0 if child["status"] not in ("queued", "processing") else child.get("progress", 0.0)
+    total = len(batch["children"])
+    finished = total - counts["queued"] - counts["processing"]
+    if batch["status"] in FINISHED_STATUSES:
+        status = batch["status"]
+    elif finished == total:
+        if batch["cancel_token"].cancelled:
+            status = "cancelled"
+        else:
+            status = "completed" if counts["completed"] else "error"
+    else:
+        status = batch["status"]
+
+    message = f"{counts['completed']}/{total} images upscaled"
+    if counts["error"]:
+        message += f", {counts['error']} failed"
+    if counts["cancelled"]:
+        message += f", {counts['cancelled']} cancelled"
+    return update_job(batch_id, {
+        "status": status,
+        "progress": progress / total if total else 1.0,
+        "message": message,
+        "counts": dict(counts)
+    })
+
+@app.get("/batch/{job_id}")
+async def get_batch_status(job_id: str):
+    """Aggregate status of a batch job and the status of each item"""
+    batch = refresh_batch(job_id)
+    if batch is None or batch.get("type") != "batch":
+        raise HTTPException(status_code=404, detail="Batch not found")
+
+    items = []
+    for child_id in batch["children"]:
+        child = state.active_jobs.get(child_id, {})
+        items.append({
+            "job_id": child_id,
+            "name": child.get("member"),
+            "status": child.get("status", "removed"),
+            "progress": child.get("progress", 0.0),
+            "filename": child.get("filename", ""),
+            "message": child.get("message", ""),
+        })
+    return {
+        "job_id": job_id,
+        "status": batch["status"],
+        "progress": batch["progress"],
+        "message": batch["message"],
+        "counts": batch["counts"],
+        "items": items,
+        "queue_position": state.scheduler.position(job_id),
+        "estimated_start": state.scheduler.estimated_start(job_id),
+    }
+
+@app.get("/batch/{job_id}/download")
+async def download_batch(job_id: str, partial: bool = False):
+    """
+    Stream the finished items of a batch as a tar archive
+    partial=true downloads the items completed so far while the batch is still running
+    """
+    batch = refresh_batch(job_id)
+    if batch is None or batch.get("type") != "batch":
+        raise HTTPException(status_code=404, detail="Batch not found")
+    if batch["status"] not in ("completed", "error", "cancelled") and not partial:
+        raise HTTPException(status_code=400, detail="Batch not completed")
+
+    entries = []
+    for child_id in batch["children"]:
+        child = state.active_jobs.get(child_id, {})
+        if child.get("status") == "completed" and child.get("output_file"):
+            entries.append((child.get("archive_name", child["filename"]), child["output_file"]))
+    if not entries:
+        raise HTTPException(status_code=404, detail="No completed items to download")
+
+    return StreamingResponse(
+        stream_tar(entries),
+        media_type="application/x-tar",
+        headers={"Content-Disposition": f'attachment; filename="{job_id}.tar"'}
+    )
 
 
-# TODO: Add option to cancel a job
 @app.get("/job/{job_id}")
-async def get_job_status(job_id: str):
-    """Get the status of an upscaling job"""
+async def get_job_status(job_id: str, version: int = None, timeout: float = LONG_POLL_MAX_SECONDS):
+    """
+    Get the status of an upscaling job
+    Long-poll: passing the version of a previous response holds the request (up to timeout
+    seconds) until the job's state changes, so clients do not have to poll repeatedly
+    """
     if job_id not in state.active_jobs:
         raise HTTPException(status_code=404, detail="Job not found")
-    
-    job = state.active_jobs[job_id]
+    if version is not None:
+        timeout = min(max(timeout, 0.0), LONG_POLL_MAX_SECONDS)
+        await state.progress.wait_for_change(job_id, version, timeout)
+        if job_id not in state.active_jobs:
+            raise HTTPException(status_code=404, detail="Job not found")
+
+    # read before the state, a change in between only makes the next poll return at once
+    current_version = state.progress.version(job_id)
+    job = refresh_batch(job_id)
     return {
         "job_id": job_id,
         "status": job["status"],
+        "version": current_version,
         "progress": job.get("progress", 0.0),
         "message": job.get("message", ""),
         "filename": job.get("filename", ""),
+        "plan": job.get("plan"),
+        "estimate": job.get("estimate"),
+        "precision": job.get("precision"),
+        "intermediate_files": [os.path.basename(f) for f in job.get("intermediate_files", [])],
+        "queue_position": state.scheduler.position(job_id),
+        "estimated_start": state.scheduler.estimated_start(job_id),
     }
 
+@app.post("/job/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    """
+    Cancel a queued or running job (or batch)
+    Queued jobs leave the queue at once; running jobs stop at the next scale, tile or
+    batch item, free their worker and remove partial files. Finished results are kept.
+    """
+    if job_id not in state.active_jobs:
+        raise HTTPException(status_code=404, detail="Job not found")
+    job = state.active_jobs[job_id]
+    if job["status"] in ("completed", "error", "cancelled"):
+        raise HTTPException(status_code=409, detail=f"Job already {job['status']}")
+
+    if "deduplicated_with" in job:
+        # only waiting on an identical job, which keeps running for its own client
+        job = update_job(job_id, {"status": "cancelled", "message": "Job cancelled"})
+    elif state.scheduler.remove(job_id):
+        release_queued(job)
+        for child_id in [job_id] + job.get("children", []):
+            child = state.active_jobs.get(child_id, {})
+            if child.get("status") in ("queued", "processing"):
+                update_job(child_id, {"status": "cancelled", "message": "Job cancelled"})
+                if child_id != job_id:
+                    publish_job(child_id)
+        if job.get("output_dir"):
+            shutil.rmtree(job["output_dir"], ignore_errors=True)
+    else:
+        # running job or an item of a running batch
+        job["cancel_token"].cancel()
+        update_job(job_id, {"message": "Cancelling…"})
+
+    refresh_batch(job_id)
+    publish_job(job_id)
+    return {"job_id": job_id, "status": job["status"]}
+
+@app.get("/jobs/events")
+async def job_events(request: Request, job_ids: str = None):
+    """
+    Server-Sent Events stream of the progress of many jobs over one connection
+    job_ids: comma separated job ids, a batch id also follows its items; all jobs when omitted
+    Each job's latest state is sent first, then every (throttled) update as a "progress" event
+    carrying job_id and version; a "removed" event follows when a job is deleted
+    """
+    followed = None
+    if job_ids:
+        followed = set()
+        for job_id in filter(None, (j.strip() for j in job_ids.split(","))):
+            followed.add(job_id)
+            followed.update(state.active_jobs.get(job_id, {}).get("children", []))
+
+    async def stream():
+        async with state.progress.subscribe_many(followed) as subscription:
+            yield "retry: 3000\n\n"
+            while not await request.is_disconnected():
+                item = await subscription.next(SSE_KEEPALIVE_SECONDS)
+                if item is None:
+                    yield ": keep-alive\n\n"
+                    continue
+                job_id, message = item
+                if message is None:
+                    yield f"event: removed\ndata: {json.dumps({'job_id': job_id})}\n\n"
+                else:
+                    yield f"id: {job_id}:{message['version']}\nevent: progress\ndata: {json.dumps(message)}\n\n"
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/jobs/stats")
+async def get_job_retention_stats():
+    """Retained jobs, bytes held on disk and what the retention reaper removed"""
+    return await run_in_threadpool(state.retention.snapshot)
+
+@app.get("/queue")
+async def get_queue_stats():
+    """Scheduler load: workers, running and waiting jobs, admission decisions and CPU shares"""
+    stats = state.scheduler.snapshot()
+    stats["admission"] = state.admission.snapshot()
+    stats["cpu"] = state.cpu.snapshot()
+    return stats
+
 @app.get("/download/{job_id}")
 async def download_result(job_id: str):
     """Download the upscaled image result"""
@@ -337,31 +1297,50 @@ async def download_result(job_id: str):
         media_type=mime_type
     )
 
+def release_queued(job: dict):
+    """Close the in-flight groups a job (or its batch items) led before it was taken off the queue"""
+    leaders = [job] + [state.active_jobs.get(child_id, {}) for child_id in job.get("children", [])]
+    for leader in leaders:
+        if leader.get("cache_key") and "deduplicated_with" not in leader and leader.get("status") == "queued":
+            state.results.finish_inflight(leader["cache_key"])
+
+def discard_job(job_id: str):
+    """Drop a job (and the items of a batch) from the queue and state, removing its files"""
+    job = state.active_jobs.pop(job_id, None)
+    if job is None:
+        return
+    # a job that identical requests are waiting on still has to run for them
+    owners = [job_id] + job.get("children", [])
+    if not any(state.results.has_followers(owner) for owner in owners):
+        if state.scheduler.remove(job_id):
+            release_queued(job)
+        elif job.get("cancel_token") is not None:
+            # stop a running job instead of letting it finish for nobody
+            job["cancel_token"].cancel()
+
+    for child_id in job.get("children", []):
+        discard_job(child_id)
+    
+    # Clean up output file (and intermediate chain results) if they exist
+    for path in [job.get("output_file")] + job.get("intermediate_files", []):
+        if path and os.path.exists(path):
+            try:
+                os.unlink(path)
+            except Exception as e:
+                logger.error(f"Error cleaning up file: {e}")
+    if job.get("output_dir"):
+        shutil.rmtree(job["output_dir"], ignore_errors=True)
+
+    # ends open WebSocket connections of the job
+    state.progress.close(job_id)
+
 @app.delete("/job/{job_id}")
 async def cleanup_job(job_id: str):
     """Clean up job files and data"""
     if job_id not in state.active_jobs:
         raise HTTPException(status_code=404, detail="Job not found")
     
-    job = state.active_jobs[job_id]
-    
-    # Clean up output file if it exists
-    if "output_file" in job and os.path.exists(job["output_file"]):
-        try:
-            os.unlink(job["output_file"])
-        except Exception as e:
-            logger.error(f"Error cleaning up file: {e}")
-    
-    # Remove job from state
-    del state.active_jobs[job_id]
-    
-    # Close WebSocket connection if exists
-    if job_id in state.websocket_connections:
-        try:
-            await state.websocket_connections[job_id].close()
-            del state.websocket_connections[job_id]
-        except Exception as e:
-            logger.error(f"Error closing WebSocket: {e}")
+    discard_job(job_id)
     
     return {"message": "Job cleaned up successfully"}
 
@@ -0,0 +1,373 @@
+"""
+# backends.py
+Inference backends behind ModelManager.
+A backend holds the network of one scale and upscales HxWx3 uint8 RGB arrays into arrays:
+- torch: the RealESRGAN PyTorch wrapper (GPU or CPU, CPU execution modes, int8 weights)
+- onnx: ONNX Runtime on the CPU, running models exported next to the weights in
+  WEIGHTS_DIR with dynamic input shapes. Once exported, serving never imports torch.
+
+    $ python -m backend.backends --scale 2 4 --resample-mode bicubic   # export ONNX models
+"""
+
+import argparse
+import os
+
+import numpy as np
+
+from .cpu_modes import parse_cpu_modes, accelerate_network, execution_context
+from .quantize import PRECISIONS, int8_weights_path, load_int8
+from .tiling import tiled_predict
+from .util_file import import_model
+
+BACKENDS = ("torch", "onnx")
+
+# Patch geometry of RealESRGAN.predict (reflect-padded borders, patches with context),
+# which the ONNX backend reuses. Its output is close but not identical: patches are
+# blended by tiled_predict instead of cropped, and values are rounded instead of truncated.
+PATCH_SIZE = 192
+PATCH_PADDING = 24
+PAD_SIZE = 15
+PATCH_BATCH = 4
+
+
+def input_multiple(scale) -> int:
+    """Height and width the network input must divide by: the x2 RRDBNet pixel-unshuffles its input by 2"""
+    return 2 if int(scale) == 2 else 1
+
+
+def pad_to_multiple(image, multiple):
+    """Edge-pad the bottom and right of an HxWxC array up to a multiple of `multiple`"""
+    extra_h, extra_w = -image.shape[0] % multiple, -image.shape[1] % multiple
+    if not extra_h and not extra_w:
+        return image
+    return np.pad(image, ((0, extra_h), (0, extra_w), (0, 0)), mode='edge')
+
+
+def select_device():
+    """Pick the best available torch device (mps > cuda > cpu)"""
+    import torch
+    if torch.backends.mps.is_available():
+        return torch.device("mps")
+    return torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+
+
+def backend_device(backend: str) -> str:
+    """Device a backend runs on, without importing torch for the ONNX backend"""
+    return "cpu" if backend == "onnx" else str(select_device())
+
+
+class InferenceBackend:
+    """
+    Interface of a loaded network. ModelManager owns the locking, resample mode
+    bookkeeping and RGBA handling; a backend only upscales RGB arrays.
+    """
+
+    name = None
+
+    def __init__(self):
+        self.device = None
+        self.active_cpu_modes = ()
+
+    def load(self, weights_path: str, scale: str, resample_mode: str, use_attention: bool = False):
+        raise NotImplementedError
+
+    def set_resample_mode(self, resample_mode: str):
+        raise NotImplementedError
+
+    def predict(self, lr_image) -> np.ndarray:
+        raise NotImplementedError
+
+    async def predict_with_progress(self, lr_image, progress_callback=None) -> np.ndarray:
+        """Backends without per-patch progress only report start and end"""
+        if progress_callback:
+            await progress_callback(0.1, "Starting prediction...")
+        result = self.predict(lr_image)
+        if progress_callback:
+            await progress_callback(1.0, "Prediction complete!")
+        return result
+
+    def predict_batch(self, images):
+        """Same-shaped arrays -> list of uint8 arrays; one forward pass where the backend can"""
+        return [self.predict(image) for image in images]
+
+    def memory_bytes(self) -> int:
+        raise NotImplementedError
+
+    def unload(self):
+        pass
+
+
+class TorchBackend(InferenceBackend):
+    """
+    The RealESRGAN PyTorch wrapper.
+    - cpu_modes: CPU execution modes, see cpu_modes.py
+    - precision: "fp32", or "int8" (CPU only) built with calibration_dir images, see quantize.py
+    """
+
+    name = "torch"
+
+    def __init__(self, cpu_modes=(), precision="fp32", calibration_dir=None):
+        super().__init__()
+        if precision not in PRECISIONS:
+            raise ValueError(f"Unknown precision '{precision}'. Must be one of {PRECISIONS}")
+        self.cpu_modes = parse_cpu_modes(cpu_modes)
+        self.precision = precision
+        self.calibration_dir = calibration_dir
+        self.model = None
+        self.scale = None
+        self.weights_path = None
+
+    @property
+    def network(self):
+        return getattr(self.model, 'model', None)
+
+    def load(self, weights_path, scale, resample_mode, use_attention=False):
+        import_model()
+        from RealESRGAN import RealESRGAN # type: ignore
+
+        self.device = select_device()
+        if self.precision == "int8" and self.device.type != 'cpu':
+            # quantized kernels only exist for the CPU
+            import torch
+            self.device = torch.device('cpu')
+        print('Device:', self.device)
+
+        self.model = RealESRGAN(self.device, scale=int(scale), use_attention=use_attention, resample_mode=resample_mode)
+        self.model.load_weights(weights_path)
+        self.scale = int(scale)
+        self.weights_path = weights_path
+
+        network = self.network
+        cpu_modes = self.cpu_modes
+        if self.precision == "int8":
+            if network is None:
+                raise RuntimeError("int8 precision needs access to the wrapped network")
+            print(f"int8 weights: {load_int8(network, weights_path, self.calibration_dir)}")
+            # the quantized body has its own kernels, only the autograd-free context still applies
+            cpu_modes = tuple(m for m in cpu_modes if m == "inference_mode")
+        if self.device.type == 'cpu' and cpu_modes and network is not None:
+            self.active_cpu_modes = accelerate_network(
+                network, cpu_modes, compile_cache_dir=os.path.join(os.path.dirname(weights_path), "compile-cache")
+            )
+            print(f"CPU modes: {', '.join(self.active_cpu_modes) or 'none available'}")
+
+    def set_resample_mode(self, resample_mode):
+        self.model.set_resample_mode(resample_mode)
+
+    def predict(self, lr_image):
+        # the wrapper returns a PIL image, read without a second copy
+        with execution_context(self.active_cpu_modes):
+            return np.asarray(self.model.predict(lr_image=lr_image))
+
+    async def predict_with_progress(self, lr_image, progress_callback=None):
+        with execution_context(self.active_cpu_modes):
+            return np.asarray(await self.model.predict_with_progress(lr_image=lr_image,
+                                                                     progress_callback=progress_callback))
+
+    def predict_batch(self, images, pad=PAD_SIZE):
+        """
+        Each image is reflect-padded like RealESRGAN.predict does, extended to a size the
+        network accepts (even for x2) and cropped afterwards.
+        Falls back to one predict per image when the wrapped network is not reachable.
+        """
+        network = self.network
+        if network is None or len(images) == 1:
+            return super().predict_batch(images)
+
+        import torch
+        pad = min(pad, min(images[0].shape[:2]) - 1)
+        multiple = input_multiple(self.scale)
+        batch = np.stack([pad_to_multiple(np.pad(image, ((pad, pad), (pad, pad), (0, 0)), mode='reflect'), multiple)
+                          for image in images])
+        with torch.no_grad(), execution_context(self.active_cpu_modes):
+            tensor = torch.from_numpy(batch).to(self.device).permute(0, 3, 1, 2).float().div_(255)
+            output = network(tensor).clamp_(0, 1).mul_(255).round_().byte()
+            output = output.permute(0, 2, 3, 1).cpu().numpy()
+        crop = pad * self.scale
+        height, width = images[0].shape[0] * self.scale, images[0].shape[1] * self.scale
+        return [output[i, crop:crop + height, crop:crop + width] for i in range(len(images))]
+
+    def memory_bytes(self):
+        network = self.network
+        if network is not None and hasattr(network, 'parameters'):
+            total = sum(p.numel() * p.element_size() for p in network.parameters())
+            total += sum(b.numel() * b.element_size() for b in network.buffers())
+            if self.precision == "int8":
+                # packed int8 weights are not module parameters
+                cached = int8_weights_path(self.weights_path)
+                total += os.path.getsize(cached) if os.path.exists(cached) else 0
+            return total
+        return os.path.getsize(self.weights_path) if os.path.exists(self.weights_path) else 0
+
+    def unload(self):
+        device = self.device
+        self.model = None
+        self.active_cpu_modes = ()
+
+        import gc
+        gc.collect()
+        try:
+            import torch
+            if device is not None and device.type == 'cuda':
+                torch.cuda.empty_cache()
+            elif device is not None and device.type == 'mps':
+                torch.mps.empty_cache()
+        except Exception as err:
+            print(f'Unable to release device cache: {err}')
+
+
+def onnx_model_path(weights_path: str, resample_mode: str) -> str:
+    """Exported model of a weights file; the resample mode is part of the exported graph"""
+    root, _ = os.path.splitext(weights_path)
+    return f"{root}_{resample_mode}.onnx"
+
+
+def export_onnx(weights_path: str, scale, resample_mode: str, use_attention=False, opset=17) -> str:
+    """Export the fp32 network of a weights file to ONNX with dynamic batch, height and width"""
+    import torch
+
+    backend = TorchBackend()
+    backend.load(weights_path, scale, resample_mode, use_attention)
+    network = backend.network
+    if network is None:
+        raise RuntimeError("ONNX export needs access to the wrapped network")
+    network.to('cpu').eval()
+
+    path = onnx_model_path(weights_path, resample_mode)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    dynamic = {0: "batch", 2: "height", 3: "width"}
+    with torch.no_grad():
+        torch.onnx.export(
+            network, torch.rand(1, 3, 64, 64), tmp_path, opset_version=opset,
+            input_names=["input"], output_names=["output"],
+            dynamic_axes={"input": dynamic, "output": dynamic}
+        )
+    # atomic, concurrent workers never load half a model
+    os.replace(tmp_path, path)
+    backend.unload()
+    print(f"Exported x{scale} ({resample_mode}) to {path}")
+    return path
+
+
+class OnnxBackend(InferenceBackend):
+    """
+    ONNX Runtime CPU execution provider.
+    - intra_op_threads: threads inside one operator (0 = ONNX Runtime default, all cores)
+    - inter_op_threads: operators run in parallel (0/1 = sequential execution)
+    One session is kept per resample mode used; a missing or outdated export is created
+    on first use, which is the only time torch is imported.
+    """
+
+    name = "onnx"
+
+    def __init__(self, intra_op_threads=0, inter_op_threads=0):
+        super().__init__()
+        self.intra_op_threads = intra_op_threads
+        self.inter_op_threads = inter_op_threads
+        self.device = "cpu"
+        self.scale = None
+        self.weights_path = None
+        self.use_attention = False
+        self.sessions = {}
+        self.session = None
+
+    def _options(self):
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if self.intra_op_threads:
+            options.intra_op_num_threads = self.intra_op_threads
+        if self.inter_op_threads > 1:
+            options.execution_mode = ort.ExecutionMode.ORT_PARALLEL
+            options.inter_op_num_threads = self.inter_op_threads
+        return options
+
+    def _session(self, resample_mode):
+        session = self.sessions.get(resample_mode)
+        if session is not None:
+            return session
+        import onnxruntime as ort
+
+        path = onnx_model_path(self.weights_path, resample_mode)
+        stale = os.path.exists(self.weights_path) and os.path.exists(path) \
+            and os.path.getmtime(path) < os.path.getmtime(self.weights_path)
+        if not os.path.exists(path) or stale:
+            export_onnx(self.weights_path, self.scale, resample_mode, self.use_attention)
+        session = ort.InferenceSession(path, sess_options=self._options(), providers=["CPUExecutionProvider"])
+        self.sessions[resample_mode] = session
+        return session
+
+    def load(self, weights_path, scale, resample_mode, use_attention=False):
+        self.weights_path = weights_path
+        self.scale = int(scale)
+        self.use_attention = use_attention
+        self.session = self._session(resample_mode)
+        print(f"ONNX Runtime session for x{scale} ({resample_mode}), "
+              f"threads intra={self.intra_op_threads or 'default'} inter={self.inter_op_threads or 1}")
+
+    def set_resample_mode(self, resample_mode):
+        self.session = self._session(resample_mode)
+
+    def _run(self, batch):
+        """NHWC uint8 batch -> NHWC uint8 upscaled batch"""
+        tensor = np.ascontiguousarray(batch.transpose(0, 3, 1, 2), dtype=np.float32)
+        tensor *= 1 / 255
+        output = self.session.run(None, {self.session.get_inputs()[0].name: tensor})[0]
+        np.clip(output, 0, 1, out=output)
+        return np.rint(output * 255).astype(np.uint8).transpose(0, 2, 3, 1)
+
+    def _run_tiles(self, tiles):
+        """Same-shaped tiles -> upscaled tiles; edge tiles are padded to a size the graph accepts"""
+        height, width = tiles[0].shape[0] * self.scale, tiles[0].shape[1] * self.scale
+        multiple = input_multiple(self.scale)
+        output = self._run(np.stack([pad_to_multiple(tile, multiple) for tile in tiles]))
+        return list(output[:, :height, :width])
+
+    def predict(self, lr_image):
+        image = np.asarray(lr_image)
+        pad = min(PAD_SIZE, min(image.shape[:2]) - 1)
+        padded = np.pad(image, ((pad, pad), (pad, pad), (0, 0)), mode='reflect')
+        result = tiled_predict(
+            lambda tile: self._run_tiles([tile])[0], padded, self.scale, PATCH_SIZE, PATCH_PADDING,
+            predict_batch_fn=self._run_tiles, batch_size=PATCH_BATCH
+        )
+        crop = pad * self.scale
+        height, width = image.shape[0] * self.scale, image.shape[1] * self.scale
+        return np.ascontiguousarray(result[crop:crop + height, crop:crop + width])
+
+    def memory_bytes(self):
+        paths = [onnx_model_path(self.weights_path, mode) for mode in self.sessions]
+        return sum(os.path.getsize(p) for p in paths if os.path.exists(p))
+
+    def unload(self):
+        self.sessions = {}
+        self.session = None
+
+
+def create_backend(name: str, cpu_modes=(), precision="fp32", calibration_dir=None,
+                   intra_op_threads=0, inter_op_threads=0) -> InferenceBackend:
+    if name == "torch":
+        return TorchBackend(cpu_modes, precision, calibration_dir)
+    if name == "onnx":
+        if precision != "fp32":
+            raise ValueError(f"The onnx backend only runs fp32 weights, not {precision}")
+        return OnnxBackend(intra_op_threads, inter_op_threads)
+    raise ValueError(f"Unknown inference backend '{name}'. Must be one of {BACKENDS}")
+
+
+def main():
+    from .upscale import WEIGHTS_DIR
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", nargs="+", default=["2", "4", "8"], choices=["2", "4", "8"])
+    parser.add_argument("--resample-mode", nargs="+", default=["bicubic"])
+    args = parser.parse_args()
+
+    os.makedirs(WEIGHTS_DIR, mode=0o755, exist_ok=True)
+    for scale in args.scale:
+        for mode in args.resample_mode:
+            export_onnx(os.path.join(WEIGHTS_DIR, f"RealESRGAN_x{scale}.pth"), scale, mode)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+# batching.py
+Micro-batching of same-shaped inference requests.
+Concurrent callers (scheduler workers running different jobs, tar members, tiles)
+that need the same network on inputs of the same shape are packed into one
+forward pass. The first caller of a group waits at most max_wait_ms for others
+to join, then runs the whole batch and hands every caller its own result.
+"""
+
+import threading
+from typing import Callable, Dict, Hashable, List
+
+
+class _Group:
+    def __init__(self):
+        self.images: List = []
+        self.results = None
+        self.error = None
+        self.full = threading.Event()
+        self.done = threading.Event()
+
+
+class MicroBatcher:
+    """
+    - max_batch: maximum images per forward pass (1 disables batching)
+    - max_wait_ms: how long the first caller waits for others before running
+    - max_pixels: inputs larger than this always run alone (they already saturate the CPU)
+    """
+
+    def __init__(self, max_batch=4, max_wait_ms=10, max_pixels=512 * 512):
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait_ms / 1000
+        self.max_pixels = max_pixels
+        self._groups: Dict[Hashable, _Group] = {}
+        self._lock = threading.Lock()
+        self.stats = {"batches": 0, "images": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_batch > 1
+
+    def accepts(self, image) -> bool:
+        return self.enabled and image.shape[0] * image.shape[1] <= self.max_pixels
+
+    def run(self, key: Hashable, image, runner: Callable[[List], List]):
+        """
+        Run `image` through runner(images) -> results, batched with other callers
+        that use the same key (model + settings) and input shape.
+        """
+        group_key = (key, image.shape)
+        with self._lock:
+            group = self._groups.get(group_key)
+            leader = group is None
+            if leader:
+                group = self._groups[group_key] = _Group()
+            index = len(group.images)
+            group.images.append(image)
+            if len(group.images) >= self.max_batch:
+                # closed for new members, the leader runs it now
+                del self._groups[group_key]
+                group.full.set()
+
+        if leader:
+            group.full.wait(self.max_wait)
+            with self._lock:
+                if self._groups.get(group_key) is group:
+                    del self._groups[group_key]
+            try:
+                group.results = runner(group.images)
+            except Exception as e:
+                group.error = e
+            finally:
+                with self._lock:
+                    self.stats["batches"] += 1
+                    self.stats["images"] += len(group.images)
+                group.done.set()
+        else:
+            group.done.wait()
+
+        if group.error is not None:
+            raise group.error
+        return group.results[index]
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            batches = self.stats["batches"]
+            return {
+                **self.stats,
+                "avg_batch_size": self.stats["images"] / batches if batches else 0.0,
+                "max_batch": self.max_batch,
+                "max_wait_ms": self.max_wait * 1000,
+            }
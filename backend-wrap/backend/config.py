@@ -40,4 +40,122 @@ CORS_ALLOW_CREDENTIALS = os.getenv("CORS_ALLOW_CREDENTIALS", "True").lower() ==
 # File storage settings
 out_dir = os.path.join("results", "images")
 OUTPUT_DIR = os.getenv("OUTPUT_DIR", out_dir)
-Path(os.path.join(current_dir, OUTPUT_DIR)).mkdir(parents=True, exist_ok=True)
\ No newline at end of file
+Path(os.path.join(current_dir, OUTPUT_DIR)).mkdir(parents=True, exist_ok=True)
+
+# Model cache settings (in process mode every inference process applies them to its own models)
+# Memory budget for resident model weights, least recently used models are evicted past it
+MODEL_CACHE_MAX_MB = int(os.getenv("MODEL_CACHE_MAX_MB", "2048"))
+# Maximum number of resident models (0 = only bounded by memory budget)
+MODEL_CACHE_MAX_MODELS = int(os.getenv("MODEL_CACHE_MAX_MODELS", "3"))
+# Unload models unused for this many seconds (0 = never)
+MODEL_IDLE_TTL = int(os.getenv("MODEL_IDLE_TTL", "600"))
+
+# Job scheduler settings
+# Number of jobs allowed to run inference at the same time
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "1"))
+# Maximum number of waiting jobs before /upscale answers 503 with Retry-After
+JOB_QUEUE_MAX = int(os.getenv("JOB_QUEUE_MAX", "32"))
+
+# CPU resources of the inference workers: "latency" runs one job at a time on every core,
+# "throughput" splits the cores evenly among the INFERENCE_WORKERS (or INFERENCE_PROCESSES)
+CPU_PROFILE = os.getenv("CPU_PROFILE", "throughput").lower()
+# Number of cores given to inference (0 = every core the server may run on)
+CPU_CORES = int(os.getenv("CPU_CORES", "0"))
+# Pin each inference worker to its own cores (Linux only)
+CPU_PIN_WORKERS = os.getenv("CPU_PIN_WORKERS", "False").lower() == "true"
+
+# Inference backend: "torch" (RealESRGAN on PyTorch, GPU if available) or "onnx" (ONNX Runtime on the CPU,
+# models are exported to WEIGHTS_DIR on first use; once exported, serving does not import torch)
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "torch").lower()
+# ONNX Runtime threads inside one operator (0 = the cores CPU_PROFILE gives inference)
+# and across operators (0 = operators run one after another)
+ONNX_INTRA_OP_THREADS = int(os.getenv("ONNX_INTRA_OP_THREADS", "0"))
+ONNX_INTER_OP_THREADS = int(os.getenv("ONNX_INTER_OP_THREADS", "0"))
+
+# CPU execution modes for networks running without a GPU, comma separated (empty = plain fp32 eager)
+# channels_last, bf16 (only used on CPUs with native bfloat16), inference_mode, compile
+CPU_MODES = os.getenv("CPU_MODES", "channels_last,inference_mode")
+
+# Weights precision used when a request does not choose one: "fp32" or "int8" (quantized, CPU only, torch backend)
+DEFAULT_PRECISION = os.getenv("DEFAULT_PRECISION", "fp32").lower()
+# Sample images the int8 weights are calibrated on when they are first built (empty = synthetic images)
+QUANT_CALIBRATION_DIR = os.getenv("QUANT_CALIBRATION_DIR", "")
+
+# Model warmup: networks for these scales are loaded and run once at startup (empty disables)
+PRELOAD_SCALES = [s.strip() for s in os.getenv("PRELOAD_SCALES", "2,4").split(",") if s.strip()]
+# Edge of the blank image used for the warmup forward pass
+WARMUP_IMAGE_SIZE = int(os.getenv("WARMUP_IMAGE_SIZE", "64"))
+# New jobs wait for warmup to finish, answering 503 with Retry-After if it takes longer than this
+WARMUP_WAIT_SECONDS = float(os.getenv("WARMUP_WAIT_SECONDS", "30"))
+
+# Inference mode: "thread" runs models inside the API process,
+# "process" runs them in a pool of INFERENCE_PROCESSES worker processes
+INFERENCE_MODE = os.getenv("INFERENCE_MODE", "thread").lower()
+INFERENCE_PROCESSES = int(os.getenv("INFERENCE_PROCESSES", "2"))
+
+# Alpha channel strategy for RGBA images: "network" (full model pass, best quality),
+# "guided" (edge-aware resize guided by the upscaled RGB) or "resize" (fastest)
+ALPHA_STRATEGY = os.getenv("ALPHA_STRATEGY", "network").lower()
+
+# Tiled inference settings for large images
+# "auto" tiles images that do not fit in one tile, "always" tiles everything, "off" never tiles
+TILE_MODE = os.getenv("TILE_MODE", "auto").lower()
+# Tile edge in input pixels (0 = derive from TILE_MEMORY_MB)
+TILE_SIZE = int(os.getenv("TILE_SIZE", "0"))
+# Context pixels around each tile, blended across seams
+TILE_OVERLAP = int(os.getenv("TILE_OVERLAP", "16"))
+# Memory budget of one forward pass: sizes the tiles, then bounds how many tiles are batched together
+TILE_MEMORY_MB = int(os.getenv("TILE_MEMORY_MB", "2048"))
+# Tiled results larger than this are written to a memory-mapped temp file instead of RAM
+RESULT_MEMMAP_MB = int(os.getenv("RESULT_MEMMAP_MB", "512"))
+
+# Result cache: identical uploads with identical settings reuse a finished result
+# Disk budget for cached results under OUTPUT_DIR/cache (0 disables the cache)
+RESULT_CACHE_MAX_MB = int(os.getenv("RESULT_CACHE_MAX_MB", "1024"))
+
+# Micro-batching: same-sized inputs from concurrent jobs, tiles and tar members share a forward pass
+# Maximum images per forward pass (1 disables batching)
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "4"))
+# How long the first request of a batch waits for others to join
+BATCH_MAX_WAIT_MS = int(os.getenv("BATCH_MAX_WAIT_MS", "10"))
+# Inputs with more pixels than this always run alone
+BATCH_MAX_PIXELS = int(os.getenv("BATCH_MAX_PIXELS", str(512 * 512)))
+
+# Uploads larger than this many pixels are rejected from the image header, before decoding (0 = no limit)
+MAX_INPUT_PIXELS = int(os.getenv("MAX_INPUT_PIXELS", str(50_000_000)))
+# Batch uploads (/upscale/batch) are checked from the image headers before anything is decoded:
+# maximum number of images, archive members included (0 = no limit)
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "256"))
+# Maximum total pixels of all images of a batch (0 = no limit)
+BATCH_MAX_TOTAL_PIXELS = int(os.getenv("BATCH_MAX_TOTAL_PIXELS", str(500_000_000)))
+# Maximum encoded size of one image of a batch, archive members are checked before they are extracted (0 = no limit)
+BATCH_MAX_MEMBER_MB = int(os.getenv("BATCH_MAX_MEMBER_MB", "256"))
+# Maximum encoded size of all images of a batch, as extracted to disk (0 = no limit)
+BATCH_MAX_TOTAL_MB = int(os.getenv("BATCH_MAX_TOTAL_MB", "4096"))
+
+# Admission control: jobs are estimated from the image header and scale list before they are accepted
+# Starting inference throughput in GMACs/s, recalibrated from finished jobs
+INFERENCE_GMACS_PER_SECOND = float(os.getenv("INFERENCE_GMACS_PER_SECOND", "100"))
+# Reject jobs whose result has more pixels than this (0 = no limit)
+MAX_OUTPUT_PIXELS = int(os.getenv("MAX_OUTPUT_PIXELS", str(16384 * 16384)))
+# Reject jobs whose estimated peak memory exceeds this (0 = no limit)
+MAX_JOB_MEMORY_MB = int(os.getenv("MAX_JOB_MEMORY_MB", "8192"))
+# Reject jobs whose estimated inference time exceeds this (0 = no limit)
+MAX_JOB_SECONDS = int(os.getenv("MAX_JOB_SECONDS", "3600"))
+# Answer 503 when a new job would wait longer than this before starting (0 = no limit)
+MAX_QUEUE_WAIT_SECONDS = int(os.getenv("MAX_QUEUE_WAIT_SECONDS", "0"))
+
+# Retention of finished jobs and their result files (otherwise only removed by DELETE /job)
+# Jobs not accessed for this long are deleted with their files (0 = keep until evicted)
+JOB_RETENTION_SECONDS = int(os.getenv("JOB_RETENTION_SECONDS", "3600"))
+# Disk quota for results of finished jobs, least recently used jobs are deleted first (0 = unlimited)
+OUTPUT_MAX_MB = int(os.getenv("OUTPUT_MAX_MB", "4096"))
+# Seconds between retention sweeps
+RETENTION_SWEEP_SECONDS = int(os.getenv("RETENTION_SWEEP_SECONDS", "60"))
+
+# Progress updates pushed per job and second; updates in between are coalesced (0 = unthrottled)
+PROGRESS_MAX_RATE = float(os.getenv("PROGRESS_MAX_RATE", "5"))
+# Longest a long-poll status request (GET /job/{id}?version=) waits for a change
+LONG_POLL_MAX_SECONDS = float(os.getenv("LONG_POLL_MAX_SECONDS", "60"))
+# Idle Server-Sent Events streams (GET /jobs/events) send a keep-alive comment this often
+SSE_KEEPALIVE_SECONDS = float(os.getenv("SSE_KEEPALIVE_SECONDS", "15"))
@@ -0,0 +1,107 @@
+"""
+# cpu_modes.py
+CPU execution modes for the upscaling networks.
+Without a GPU the network runs in plain fp32 eager mode; these modes speed it up:
+- channels_last: NHWC memory format, which the oneDNN convolution kernels prefer
+- bf16: bfloat16 autocast, only on CPUs with native bf16 (AVX512-BF16 or AMX)
+- inference_mode: no autograd bookkeeping at all during prediction
+- compile: torch.compile the network once per loaded model, kernels are cached on disk
+Modes are applied to the loaded network in place, so the wrapping RealESRGAN
+object and everything calling it work unchanged.
+"""
+
+import logging
+import os
+from contextlib import nullcontext
+from typing import Iterable, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+CPU_MODES = ("channels_last", "bf16", "inference_mode", "compile")
+
+
+def parse_cpu_modes(modes: Union[str, Iterable[str], None]) -> Tuple[str, ...]:
+    """Comma separated string or iterable of modes -> validated tuple in canonical order"""
+    if not modes:
+        return ()
+    if isinstance(modes, str):
+        modes = modes.split(",")
+    requested = {m.strip().lower() for m in modes if m and m.strip()}
+    unknown = requested - set(CPU_MODES)
+    if unknown:
+        raise ValueError(f"Unknown CPU mode(s) {sorted(unknown)}. Must be in {CPU_MODES}")
+    return tuple(m for m in CPU_MODES if m in requested)
+
+
+def bf16_supported() -> bool:
+    """Whether this CPU runs bfloat16 natively; emulated bf16 is slower than fp32"""
+    import torch
+    checks = ("_is_avx512_bf16_supported", "_is_amx_tile_supported")
+    return any(getattr(torch.cpu, name, lambda: False)() for name in checks)
+
+
+def _enable_compile_cache(cache_dir: str):
+    """Keep compiled kernels on disk so a restart does not recompile from scratch"""
+    os.environ.setdefault("TORCHINDUCTOR_CACHE_DIR", cache_dir)
+    try:
+        import torch._inductor.config as inductor_config
+        inductor_config.fx_graph_cache = True
+    except (ImportError, AttributeError):
+        pass
+
+
+def accelerate_network(network, modes: Tuple[str, ...], compile_cache_dir: str = None) -> Tuple[str, ...]:
+    """
+    Apply the CPU modes to a loaded torch network in place.
+    inference_mode is not applied here, callers enter execution_context() around predictions.
+    Returns the modes that are actually active (bf16 is dropped on CPUs without native support).
+    """
+    import torch
+
+    network.eval()
+    active = []
+    channels_last = "channels_last" in modes
+    if channels_last:
+        network.to(memory_format=torch.channels_last)
+        active.append("channels_last")
+
+    use_bf16 = "bf16" in modes and bf16_supported()
+    if use_bf16:
+        active.append("bf16")
+    elif "bf16" in modes:
+        logger.warning("bf16 CPU mode requested but this CPU has no native bfloat16 support, staying on fp32")
+
+    if "inference_mode" in modes:
+        active.append("inference_mode")
+
+    forward = network.forward
+    if "compile" in modes:
+        if compile_cache_dir:
+            _enable_compile_cache(compile_cache_dir)
+        # compiled once per loaded network; the model cache keeps it for every later request
+        forward = torch.compile(forward)
+        active.append("compile")
+
+    if channels_last or use_bf16 or forward is not network.forward:
+        def accelerated_forward(x, *args, **kwargs):
+            if channels_last:
+                x = x.contiguous(memory_format=torch.channels_last)
+            if use_bf16:
+                with torch.autocast("cpu", dtype=torch.bfloat16):
+                    out = forward(x, *args, **kwargs)
+                out = out.float()
+            else:
+                out = forward(x, *args, **kwargs)
+            # callers post-process the output as a plain NCHW fp32 tensor
+            return out.contiguous()
+
+        network.forward = accelerated_forward
+    return tuple(active)
+
+
+def execution_context(modes: Tuple[str, ...]):
+    """Context to run predictions in for the active modes"""
+    if "inference_mode" in modes:
+        import torch
+        return torch.inference_mode()
+    return nullcontext()
@@ -0,0 +1,155 @@
+"""
+# cpu_resources.py
+Splits the CPU cores among the inference workers.
+Every torch forward pass runs on its own intra-op threads, so concurrent jobs with
+default thread counts each try to use every core and oversubscribe the machine.
+Each inference worker (scheduler thread or worker process) gets a share of the cores,
+its thread count is set to that share, and it can be pinned to it. Worker processes set
+the thread count environment before torch loads; the environment is process-wide, so
+scheduler threads sharing the API process only set torch's per-thread count.
+- latency: one job at a time on every core
+- throughput: one job per worker, each on cores / workers cores
+"""
+
+import logging
+import os
+import sys
+import threading
+from typing import List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+CPU_PROFILES = ("latency", "throughput")
+# read by OpenMP, MKL and OpenBLAS when their thread pools start, before torch is imported
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS")
+
+
+def available_cores() -> List[int]:
+    """Cores this process may run on"""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def split_cores(cores: Sequence[int], workers: int) -> List[List[int]]:
+    """
+    Contiguous, near-equal shares of cores, one per worker.
+    With more workers than cores each worker gets one core, shared round-robin.
+    """
+    cores = list(cores)
+    if workers >= len(cores):
+        return [[cores[i % len(cores)]] for i in range(workers)]
+    base, extra = divmod(len(cores), workers)
+    shares, start = [], 0
+    for i in range(workers):
+        size = base + (1 if i < extra else 0)
+        shares.append(cores[start:start + size])
+        start += size
+    return shares
+
+
+class CpuAssignment:
+    """Cores and thread count of one inference worker; picklable so worker processes can apply it"""
+
+    def __init__(self, index: int, cores: Sequence[int], pin: bool = False):
+        self.index = index
+        self.cores = tuple(cores)
+        self.threads = len(self.cores)
+        self.pin = pin
+
+    def apply(self):
+        """
+        Configure a worker process, before it loads torch: thread count environment,
+        torch threads (if torch is already loaded, otherwise the environment applies when
+        it is) and core affinity.
+        """
+        for var in THREAD_ENV_VARS:
+            os.environ[var] = str(self.threads)
+        torch = sys.modules.get("torch")
+        if torch is not None:
+            torch.set_num_threads(self.threads)
+        self._pin()
+
+    def apply_to_thread(self, torch_threads: bool = True):
+        """
+        Configure the calling thread of a process shared with other workers: torch's thread
+        count, which is per thread (torch is imported for it unless torch_threads is off),
+        and core affinity. The environment is left alone as it applies to the whole process.
+        """
+        if torch_threads:
+            try:
+                import torch
+            except ImportError:
+                torch = None
+            if torch is not None:
+                torch.set_num_threads(self.threads)
+        self._pin()
+
+    def _pin(self):
+        if self.pin:
+            if hasattr(os, "sched_setaffinity"):
+                # pid 0 is the calling thread; threads it starts later (OpenMP pools) inherit the mask
+                os.sched_setaffinity(0, self.cores)
+            else:
+                logger.warning("Pinning inference workers to cores is not supported on this platform")
+
+    def to_dict(self) -> dict:
+        return {"index": self.index, "cores": list(self.cores), "threads": self.threads}
+
+
+class CpuResourceManager:
+    """
+    - profile: "latency" or "throughput", see CPU_PROFILES
+    - workers: inference workers requested; the latency profile always uses one
+    - cores: number of cores to use (0 = every core this process may run on)
+    - pin: pin each worker to its own cores (Linux only)
+    - torch_threads: set torch's thread count on worker threads (off when they never run torch)
+    """
+
+    def __init__(self, profile: str = "throughput", workers: int = 1, cores: int = 0, pin: bool = False,
+                 torch_threads: bool = True):
+        if profile not in CPU_PROFILES:
+            raise ValueError(f"Unknown CPU profile '{profile}'. Must be one of {CPU_PROFILES}")
+        self.profile = profile
+        self.cores = available_cores()
+        if cores:
+            self.cores = self.cores[:cores]
+        self.pin = pin
+        self.workers = 1 if profile == "latency" else max(1, workers)
+        if profile == "latency" and workers > 1:
+            logger.info(f"latency CPU profile runs one inference job at a time, not {workers}")
+        self.assignments = [CpuAssignment(i, share, pin) for i, share in enumerate(split_cores(self.cores, self.workers))]
+        self.torch_threads = torch_threads
+        # assignment of each configured worker thread
+        self._local = threading.local()
+
+    @property
+    def threads_per_worker(self) -> int:
+        return min(a.threads for a in self.assignments)
+
+    def assignment(self, index: int) -> CpuAssignment:
+        return self.assignments[index % len(self.assignments)]
+
+    def configure_worker(self, index: int):
+        """Apply worker index's share of the cores to the calling thread (thread mode)"""
+        assignment = self.assignment(index)
+        assignment.apply_to_thread(self.torch_threads)
+        self._local.assignment = assignment
+
+    def current(self) -> Optional[CpuAssignment]:
+        """Assignment of the calling worker thread, None outside configured workers"""
+        return getattr(self._local, "assignment", None)
+
+    def configure_helper(self, assignment: Optional[CpuAssignment]):
+        """Give a helper thread started by a worker (e.g. batch items) the worker's share"""
+        if assignment is not None:
+            assignment.apply_to_thread(self.torch_threads)
+            self._local.assignment = assignment
+
+    def snapshot(self) -> dict:
+        return {
+            "profile": self.profile,
+            "cores": len(self.cores),
+            "pinned": self.pin,
+            "workers": [a.to_dict() for a in self.assignments],
+        }
@@ -0,0 +1,55 @@
+"""
+# image_array.py
+Internal image representation of the upscaling pipeline.
+Images travel between decoding, the networks, tiling, alpha handling and encoding as
+C-contiguous HxWxC uint8 arrays; the channel count says what the pixels are
+(CHANNEL_MODES). PIL images only appear at the edges: uploads come in through
+to_array and results leave through to_image, each with at most one copy.
+"""
+
+import numpy as np
+from PIL import Image
+
+CHANNEL_MODES = {3: "RGB", 4: "RGBA"}
+
+
+def mode_of(array) -> str:
+    """PIL mode of an image array, from its channel count"""
+    channels = array.shape[2] if array.ndim == 3 else 1
+    if channels not in CHANNEL_MODES:
+        raise ValueError(f"Unsupported image array with {channels} channel(s), must be one of {list(CHANNEL_MODES)}")
+    return CHANNEL_MODES[channels]
+
+
+def to_array(image, mode: str = None) -> np.ndarray:
+    """
+    PIL image or array -> contiguous HxWx3 (RGB) or HxWx4 (RGBA) uint8 array, in `mode` if given.
+    Arrays that already qualify are returned as is; grayscale arrays (HxW, HxWx1, or HxWx2
+    with alpha) become RGB or RGBA. PIL images keep RGBA (anything else becomes RGB) and
+    are read without an intermediate copy, so the array may be read-only.
+    """
+    if isinstance(image, Image.Image):
+        target = mode or ("RGBA" if image.mode == "RGBA" else "RGB")
+        if image.mode != target:
+            image = image.convert(target)
+        return np.asarray(image)
+    array = np.asarray(image)
+    if array.dtype != np.uint8:
+        array = array.astype(np.uint8)
+    if array.ndim == 2:
+        array = array[:, :, None]
+    if array.shape[2] in (1, 2):
+        # grayscale (with alpha): the gray plane goes to all three colour channels
+        gray = np.repeat(array[:, :, :1], 3, axis=2)
+        array = gray if array.shape[2] == 1 else np.concatenate([gray, array[:, :, 1:]], axis=2)
+    if mode is not None and mode_of(array) != mode:
+        return to_array(Image.fromarray(array, mode_of(array)), mode)
+    return np.ascontiguousarray(array)
+
+
+def to_image(image) -> Image.Image:
+    """Image array -> PIL image for encoding (RGBA shares the array's memory)"""
+    if isinstance(image, Image.Image):
+        return image
+    array = np.ascontiguousarray(image)
+    return Image.fromarray(array, mode_of(array))
@@ -0,0 +1,106 @@
+"""
+# image_writer.py
+Streaming PNG encoder for very large results.
+Rows are filtered and deflated strip by strip as they become final, so encoding
+never needs the whole image (or an encoded copy of it) in memory at once.
+"""
+
+import os
+import struct
+import zlib
+
+import numpy as np
+
+# PNG colour types by channel count
+_COLOR_TYPES = {1: 0, 2: 4, 3: 2, 4: 6}
+_PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+# PNG "Up" filter: each byte minus the byte above it
+_FILTER_UP = 2
+
+
+class StreamingPNGWriter:
+    """
+    Write an 8-bit PNG incrementally.
+        with StreamingPNGWriter(path, width, height, channels) as writer:
+            writer.write_rows(strip)   # uint8 array (rows, width[, channels])
+    The file is removed if the writer is closed before every row was written.
+    """
+
+    def __init__(self, path, width, height, channels=3, compress_level=6, idat_size=1 << 20):
+        if channels not in _COLOR_TYPES:
+            raise ValueError(f"Unsupported channel count {channels}")
+        self.path = path
+        self.width = width
+        self.height = height
+        self.channels = channels
+        self.idat_size = idat_size
+        self.rows_written = 0
+        self._compressor = zlib.compressobj(compress_level)
+        self._pending = bytearray()
+        self._prev_row = np.zeros((1, width * channels), dtype=np.uint8)
+        self._file = open(path, 'wb')
+        self._file.write(_PNG_SIGNATURE)
+        self._chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, _COLOR_TYPES[channels], 0, 0, 0))
+
+    def _chunk(self, kind, data):
+        self._file.write(struct.pack('>I', len(data)))
+        self._file.write(kind)
+        self._file.write(data)
+        self._file.write(struct.pack('>I', zlib.crc32(data, zlib.crc32(kind)) & 0xffffffff))
+
+    def _flush_idat(self, final=False):
+        while len(self._pending) >= self.idat_size or (final and self._pending):
+            data = bytes(self._pending[:self.idat_size])
+            del self._pending[:self.idat_size]
+            self._chunk(b'IDAT', data)
+
+    def write_rows(self, rows):
+        """Append a strip of rows (top to bottom)"""
+        rows = np.asarray(rows, dtype=np.uint8)
+        count = rows.shape[0]
+        if self.rows_written + count > self.height:
+            raise ValueError("More rows written than the image height")
+        flat = rows.reshape(count, self.width * self.channels)
+
+        filtered = np.empty((count, flat.shape[1] + 1), dtype=np.uint8)
+        filtered[:, 0] = _FILTER_UP
+        # uint8 arithmetic wraps modulo 256 as the PNG spec requires
+        np.subtract(flat, np.concatenate([self._prev_row, flat[:-1]]), out=filtered[:, 1:])
+        self._prev_row = flat[-1:].copy()
+
+        self._pending += self._compressor.compress(filtered.tobytes())
+        self.rows_written += count
+        self._flush_idat()
+
+    def close(self):
+        if self._file is None:
+            return
+        complete = self.rows_written == self.height
+        try:
+            if complete:
+                self._pending += self._compressor.flush()
+                self._flush_idat(final=True)
+                self._chunk(b'IEND', b'')
+        finally:
+            self._file.close()
+            self._file = None
+            if not complete:
+                os.unlink(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            # never leave a truncated image behind
+            self.rows_written = -1
+        self.close()
+
+
+def save_array_streaming(array, path, strip_rows=256):
+    """Encode an (optionally memory-mapped) uint8 array to PNG one strip at a time"""
+    height, width = array.shape[:2]
+    channels = array.shape[2] if array.ndim == 3 else 1
+    with StreamingPNGWriter(path, width, height, channels) as writer:
+        for start in range(0, height, strip_rows):
+            writer.write_rows(array[start:start + strip_rows])
@@ -0,0 +1,301 @@
+"""
+# model_cache.py
+Weights-level cache for loaded RealESRGAN networks.
+One network is loaded per (scale, device, precision). Requests get a lightweight
+ModelHandle carrying their own resample mode, so switching modes never reloads weights.
+The cache is bounded by a memory budget and model count (LRU eviction) and
+unloads models that sit idle longer than a TTL.
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Tuple
+
+import numpy as np
+
+from .batching import MicroBatcher
+from .cpu_modes import parse_cpu_modes
+from .image_array import to_array
+from .backends import BACKENDS, backend_device
+from .upscale import ModelManager
+
+logger = logging.getLogger(__name__)
+
+
+class ModelHandle:
+    """
+    Per-request view of a cached network.
+    Only stores the scale, resample mode, alpha strategy and precision; the weights belong to the
+    cache and are leased for the duration of each prediction so they cannot be evicted mid-run.
+    """
+
+    def __init__(self, cache: "ModelCache", scale: str, resample_mode: str, alpha_strategy: str = None,
+                 precision: str = "fp32"):
+        self.cache = cache
+        self.scale = str(scale)
+        self.resample_mode = resample_mode or 'bicubic'
+        self.alpha_strategy = alpha_strategy
+        self.precision = precision
+
+    def predict(self, image_input):
+        batcher = self.cache.batcher
+        if (batcher is not None and isinstance(image_input, np.ndarray) and image_input.ndim == 3
+                and image_input.shape[2] == 3 and batcher.accepts(image_input)):
+            # small RGB inputs are packed with other callers' same-shaped inputs
+            result = batcher.run((self.scale, self.resample_mode, self.precision), image_input, self.predict_batch)
+            return to_array(result)
+        with self.cache.lease(self.scale, self.resample_mode, self.precision) as manager:
+            with manager.using_resample_mode(self.resample_mode) as model:
+                return model.predict(image_input, alpha_strategy=self.alpha_strategy)
+
+    def predict_batch(self, images):
+        """Upscale same-shaped arrays in one forward pass, returns a list of arrays"""
+        if images[0].ndim != 3 or images[0].shape[2] != 3:
+            # RGBA needs the per-image alpha path
+            with self.cache.lease(self.scale, self.resample_mode, self.precision) as manager:
+                with manager.using_resample_mode(self.resample_mode) as model:
+                    return [model.predict(i, alpha_strategy=self.alpha_strategy) for i in images]
+        with self.cache.lease(self.scale, self.resample_mode, self.precision) as manager:
+            with manager.using_resample_mode(self.resample_mode) as model:
+                return model.predict_batch(images)
+
+    async def predict_with_progress(self, image_input, progress_callback=None):
+        with self.cache.lease(self.scale, self.resample_mode, self.precision) as manager:
+            with manager.using_resample_mode(self.resample_mode) as model:
+                return await model.predict_with_progress(
+                    image_input, progress_callback=progress_callback, alpha_strategy=self.alpha_strategy
+                )
+
+
+class _CacheEntry:
+    def __init__(self, manager: ModelManager, size: int):
+        self.manager = manager
+        self.size = size
+        self.leases = 0
+        self.last_used = time.monotonic()
+
+
+class ModelCache:
+    """
+    LRU cache of ModelManagers keyed on (scale, device, precision).
+    - max_bytes: memory budget for resident weights (0 = unbounded)
+    - max_models: maximum number of resident networks (0 = unbounded)
+    - idle_ttl: seconds of inactivity before a model is unloaded (0 = never)
+    - batcher: optional MicroBatcher packing concurrent small inputs into one forward pass
+    - cpu_modes: CPU execution modes applied to networks loaded on the CPU (see cpu_modes.py)
+    - calibration_dir: sample images for building int8 weights (see quantize.py)
+    - backend: inference backend of the loaded networks, backend_options are passed to it (see backends.py)
+    Models that are currently leased are never evicted, so the budget can be
+    exceeded temporarily while every resident model is busy.
+    """
+
+    def __init__(self, max_bytes=0, max_models=0, idle_ttl=0, use_attention=False, batcher: MicroBatcher = None,
+                 cpu_modes=(), calibration_dir=None, backend="torch", backend_options=None):
+        self.max_bytes = max_bytes
+        self.max_models = max_models
+        self.idle_ttl = idle_ttl
+        self.use_attention = use_attention
+        # validated up front so a bad setting fails at startup rather than on the first job
+        self.cpu_modes = parse_cpu_modes(cpu_modes)
+        self.calibration_dir = calibration_dir
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown inference backend '{backend}'. Must be one of {BACKENDS}")
+        self.backend = backend
+        self.backend_options = backend_options or {}
+        self.batcher = batcher if batcher is not None and batcher.enabled else None
+        self._entries: "OrderedDict[Tuple[str, str, str], _CacheEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        # serialises weight loading so two requests never load the same scale twice
+        self._load_lock = threading.Lock()
+        self._device = None
+        self._reaper = None
+        self._stop = threading.Event()
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "loads": 0,
+            "load_time_total": 0.0,
+            "evictions": 0,
+            "expirations": 0,
+        }
+
+    def _device_key(self) -> str:
+        if self._device is None:
+            self._device = backend_device(self.backend)
+        return self._device
+
+    def get(self, scale: str, resample_mode: str = 'bicubic', alpha_strategy: str = None,
+            precision: str = "fp32") -> ModelHandle:
+        """Get a handle on the network for this scale and precision, loading it on first use"""
+        with self.lease(scale, resample_mode, precision):
+            pass
+        return ModelHandle(self, scale, resample_mode, alpha_strategy, precision)
+
+    @contextmanager
+    def lease(self, scale: str, resample_mode: str = 'bicubic', precision: str = "fp32"):
+        """Borrow the ModelManager for a scale and precision, protecting it from eviction"""
+        # int8 weights always run on the CPU
+        device = "cpu" if precision == "int8" else self._device_key()
+        key = (str(scale), device, precision)
+        entry = self._acquire(key, resample_mode)
+        try:
+            yield entry.manager
+        finally:
+            with self._lock:
+                entry.leases -= 1
+                entry.last_used = time.monotonic()
+            self._enforce_budget()
+
+    def _acquire(self, key, resample_mode) -> _CacheEntry:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self.stats["hits"] += 1
+                self._entries.move_to_end(key)
+                entry.leases += 1
+                return entry
+            self.stats["misses"] += 1
+
+        with self._load_lock:
+            # another thread may have loaded it while we waited
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self._entries.move_to_end(key)
+                    entry.leases += 1
+                    return entry
+
+            start = time.perf_counter()
+            manager = ModelManager(cpu_modes=self.cpu_modes, precision=key[2], calibration_dir=self.calibration_dir,
+                                   backend=self.backend, backend_options=self.backend_options)
+            manager.initialize_model(
+                scale=key[0],
+                use_attention=self.use_attention,
+                resample_mode=resample_mode or 'bicubic'
+            )
+            elapsed = time.perf_counter() - start
+            entry = _CacheEntry(manager, manager.memory_bytes())
+            entry.leases = 1
+
+            with self._lock:
+                self._entries[key] = entry
+                self.stats["loads"] += 1
+                self.stats["load_time_total"] += elapsed
+            logger.info(f"Loaded {key[2]} weights for x{key[0]} on {key[1]} in {elapsed:.2f}s "
+                        f"({entry.size / 2**20:.1f} MB)")
+
+        self._enforce_budget()
+        return entry
+
+    def resident_bytes(self) -> int:
+        with self._lock:
+            return sum(e.size for e in self._entries.values())
+
+    def _over_budget(self) -> bool:
+        total = sum(e.size for e in self._entries.values())
+        too_big = self.max_bytes and total > self.max_bytes
+        too_many = self.max_models and len(self._entries) > self.max_models
+        return bool(too_big or too_many)
+
+    def _enforce_budget(self):
+        """Evict least recently used idle models until back within budget"""
+        victims = []
+        with self._lock:
+            for key in list(self._entries):
+                if not self._over_budget():
+                    break
+                entry = self._entries[key]
+                if entry.leases > 0:
+                    continue
+                del self._entries[key]
+                self.stats["evictions"] += 1
+                victims.append((key, entry))
+
+        for key, entry in victims:
+            logger.info(f"Evicting x{key[0]} model on {key[1]} (cache over budget)")
+            entry.manager.unload()
+
+    def expire_idle(self):
+        """Unload models not used within idle_ttl seconds"""
+        if not self.idle_ttl:
+            return
+        now = time.monotonic()
+        victims = []
+        with self._lock:
+            for key, entry in list(self._entries.items()):
+                if entry.leases == 0 and now - entry.last_used > self.idle_ttl:
+                    del self._entries[key]
+                    self.stats["expirations"] += 1
+                    victims.append((key, entry))
+
+        for key, entry in victims:
+            logger.info(f"Unloading idle x{key[0]} model on {key[1]}")
+            entry.manager.unload()
+
+    def clear(self):
+        """Unload every idle model"""
+        with self._lock:
+            victims = [(k, e) for k, e in self._entries.items() if e.leases == 0]
+            for key, _ in victims:
+                del self._entries[key]
+        for _, entry in victims:
+            entry.manager.unload()
+
+    def start_reaper(self):
+        """Start the background thread that unloads idle models"""
+        if not self.idle_ttl or self._reaper is not None:
+            return
+        self._stop.clear()
+        interval = max(1.0, self.idle_ttl / 4)
+
+        def run():
+            while not self._stop.wait(interval):
+                try:
+                    self.expire_idle()
+                except Exception as e:
+                    logger.error(f"Model cache reaper error: {e}")
+
+        self._reaper = threading.Thread(target=run, name="model-cache-reaper", daemon=True)
+        self._reaper.start()
+
+    def stop_reaper(self):
+        self._stop.set()
+        if self._reaper is not None:
+            self._reaper.join(timeout=5)
+            self._reaper = None
+
+    def snapshot(self) -> dict:
+        """Counters and resident models, for sizing the budget from real traffic"""
+        with self._lock:
+            loads = self.stats["loads"]
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {
+                **self.stats,
+                "hit_rate": self.stats["hits"] / lookups if lookups else 0.0,
+                "avg_load_time": self.stats["load_time_total"] / loads if loads else 0.0,
+                "resident_bytes": sum(e.size for e in self._entries.values()),
+                "max_bytes": self.max_bytes,
+                "max_models": self.max_models,
+                "idle_ttl": self.idle_ttl,
+                "resident": [
+                    {
+                        "scale": key[0],
+                        "device": key[1],
+                        "precision": key[2],
+                        "bytes": entry.size,
+                        "in_use": entry.leases,
+                        "cpu_modes": list(entry.manager.active_cpu_modes),
+                        "idle_seconds": round(time.monotonic() - entry.last_used, 1),
+                    }
+                    for key, entry in self._entries.items()
+                ],
+            }
+
+    def __contains__(self, scale) -> bool:
+        return any(key[0] == str(scale) for key in self._entries)
+
+    def __len__(self) -> int:
+        return len(self._entries)
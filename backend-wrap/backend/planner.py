@@ -0,0 +1,115 @@
+"""
+# planner.py
+Execution planning for chained scale lists.
+A request like ["2", "4"] only asks for a total x8 upscale; running the x2 network
+and then the x4 network on a 4x larger image costs far more than the x8 weights
+once. The planner enumerates the orderings of available networks that reach the
+requested total factor and picks the cheapest under a MAC-count cost model.
+"""
+
+from itertools import product
+from typing import List, Sequence
+
+# RRDBNet structure used by RealESRGAN (23 RRDB blocks of 3 dense blocks, nf=64, gc=32)
+_NUM_BLOCKS = 23
+_NF = 64
+_GC = 32
+
+
+def _conv_macs(in_ch, out_ch, kernel=3):
+    return kernel * kernel * in_ch * out_ch
+
+
+def _dense_block_macs():
+    # five convs reading the growing concatenation of features
+    macs = sum(_conv_macs(_NF + i * _GC, _GC) for i in range(4))
+    return macs + _conv_macs(_NF + 4 * _GC, _NF)
+
+
+def network_macs_per_pixel(factor) -> float:
+    """
+    Multiply-accumulates per input pixel for one forward pass of the x`factor` network.
+    x2 weights pixel-unshuffle the input first, so their body runs at a quarter of the pixels;
+    every network upsamples the body features x2 per stage and finishes at full output size.
+    """
+    factor = int(factor)
+    if factor == 2:
+        body_pixels, in_ch, stages = 0.25, 12, 2
+    else:
+        body_pixels, in_ch, stages = 1.0, 3, {4: 2, 8: 3}.get(factor, 2)
+
+    body = _conv_macs(in_ch, _NF) + _NUM_BLOCKS * 3 * _dense_block_macs() + 2 * _conv_macs(_NF, _NF)
+    macs = body * body_pixels
+    # upsample convs at each doubled resolution, then conv_hr and conv_last at output size
+    for stage in range(1, stages + 1):
+        macs += _conv_macs(_NF, _NF) * body_pixels * 4 ** stage
+    out_pixels = body_pixels * 4 ** stages
+    macs += (_conv_macs(_NF, _NF) + _conv_macs(_NF, 3)) * out_pixels
+    return macs
+
+
+def plan_cost(plan: Sequence[str], pixels: int) -> float:
+    """Total MACs to run the networks in `plan` one after another on an image of `pixels`"""
+    total = 0.0
+    for factor in plan:
+        total += network_macs_per_pixel(factor) * pixels
+        pixels *= int(factor) ** 2
+    return total
+
+
+def total_factor(scale_list: Sequence[str]) -> int:
+    factor = 1
+    for scale in scale_list:
+        factor *= int(scale)
+    return factor
+
+
+class ExecutionPlan:
+    def __init__(self, steps: List[str], requested: List[str], pixels: int):
+        self.steps = steps
+        self.requested = requested
+        self.cost = plan_cost(steps, pixels)
+        self.requested_cost = plan_cost(requested, pixels)
+
+    @property
+    def factor(self) -> int:
+        return total_factor(self.steps)
+
+    def describe(self) -> dict:
+        return {
+            "steps": self.steps,
+            "requested": self.requested,
+            "factor": self.factor,
+            "gmacs": round(self.cost / 1e9, 1),
+            "requested_gmacs": round(self.requested_cost / 1e9, 1),
+        }
+
+    def __repr__(self):
+        saving = self.requested_cost / self.cost if self.cost else 1.0
+        chain = ' -> '.join(f"x{s}" for s in self.steps)
+        return f"<ExecutionPlan {chain} ({self.cost / 1e9:.1f} GMACs, {saving:.1f}x cheaper than requested)>"
+
+
+def plan_scales(scale_list: Sequence[str], available: Sequence[str], image_shape, keep_chain=False,
+                max_steps=4) -> ExecutionPlan:
+    """
+    Cheapest sequence of available networks reaching the requested total factor.
+    keep_chain=True returns the requested list unchanged (for callers that want the
+    intermediate results of an explicit chain).
+    """
+    requested = [str(s) for s in scale_list]
+    pixels = int(image_shape[0]) * int(image_shape[1])
+    if keep_chain:
+        return ExecutionPlan(requested, requested, pixels)
+
+    target = total_factor(requested)
+    best = requested
+    best_cost = plan_cost(requested, pixels)
+    for length in range(1, max_steps + 1):
+        for steps in product(available, repeat=length):
+            if total_factor(steps) != target:
+                continue
+            cost = plan_cost(steps, pixels)
+            if cost < best_cost:
+                best, best_cost = list(steps), cost
+    return ExecutionPlan([str(s) for s in best], requested, pixels)
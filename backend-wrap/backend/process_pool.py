@@ -0,0 +1,318 @@
+"""
+# process_pool.py
+Optional inference backend that runs predictions in worker processes.
+Each worker holds its own ModelCache (one network per scale and precision, bounded like the
+API's), so pre/post-processing, the RGBA split/merge and PNG encoding never compete with the
+API for the GIL.
+Images are passed through shared memory instead of being pickled, and a worker
+that dies is restarted without taking the API down.
+"""
+
+import logging
+import multiprocessing as mp
+import queue
+import threading
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from .image_array import to_image
+
+logger = logging.getLogger(__name__)
+
+
+class WorkerCrashedError(RuntimeError):
+    """The worker process died while handling a request"""
+
+
+def _attach_shared_memory(name):
+    """Attach to an existing block without letting this process' tracker unlink it"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # python < 3.13 has no track flag, unregister manually
+        from multiprocessing import resource_tracker
+        shm = shared_memory.SharedMemory(name=name)
+        try:
+            resource_tracker.unregister(shm._name, "shared_memory")
+        except Exception:
+            pass
+        return shm
+
+
+def _worker_main(conn, use_attention, cpu_modes=(), calibration_dir=None, backend="torch", backend_options=None,
+                 cpu_assignment=None, cache_options=None):
+    """Worker loop: receive a request, run it on the local model, reply"""
+    # before the model (and torch with it) is loaded, so the thread pools start at the right size
+    if cpu_assignment is not None:
+        cpu_assignment.apply()
+    from .model_cache import ModelCache
+
+    # every process holds its own networks, so each one is kept within the cache limits
+    models = ModelCache(use_attention=use_attention, cpu_modes=cpu_modes, calibration_dir=calibration_dir,
+                        backend=backend, backend_options=backend_options, **(cache_options or {}))
+    models.start_reaper()
+    while True:
+        try:
+            request = conn.recv()
+        except EOFError:
+            return
+        if request is None:
+            return
+
+        in_shm = out_shm = None
+        try:
+            in_shm = _attach_shared_memory(request["in_name"])
+            image = np.ndarray(request["in_shape"], dtype=np.uint8, buffer=in_shm.buf)
+
+            resample_mode = request["resample_mode"]
+            loads = models.stats["loads"]
+            with models.lease(request["scale"], resample_mode, request.get("precision", "fp32")) as manager:
+                with manager.using_resample_mode(resample_mode) as model:
+                    result = model.predict(image, alpha_strategy=request.get("alpha_strategy"))
+
+            out_path = request.get("out_path")
+            if out_path:
+                to_image(result).save(out_path)
+                conn.send({"ok": True, "loaded": models.stats["loads"] != loads})
+                continue
+
+            if result.shape != tuple(request["out_shape"]):
+                raise ValueError(f"Unexpected output shape {result.shape}, expected {request['out_shape']}")
+            out_shm = _attach_shared_memory(request["out_name"])
+            np.ndarray(result.shape, dtype=np.uint8, buffer=out_shm.buf)[...] = result
+            conn.send({"ok": True, "loaded": models.stats["loads"] != loads})
+        except Exception as e:
+            conn.send({"ok": False, "error": f"{type(e).__name__}: {e}"})
+        finally:
+            for shm in (in_shm, out_shm):
+                if shm is not None:
+                    shm.close()
+
+
+class _Worker:
+    def __init__(self, ctx, index, use_attention, cpu_modes=(), calibration_dir=None, backend="torch",
+                 backend_options=None, cpu_assignment=None, cache_options=None):
+        self.ctx = ctx
+        self.index = index
+        self.use_attention = use_attention
+        self.cpu_modes = cpu_modes
+        self.calibration_dir = calibration_dir
+        self.backend = backend
+        self.backend_options = backend_options
+        # cores of this worker, kept across restarts
+        self.cpu_assignment = cpu_assignment
+        self.cache_options = cache_options
+        self.process = None
+        self.conn = None
+        self.start()
+
+    def start(self):
+        parent_conn, child_conn = self.ctx.Pipe()
+        self.process = self.ctx.Process(
+            target=_worker_main,
+            args=(child_conn, self.use_attention, self.cpu_modes, self.calibration_dir, self.backend,
+                  self.backend_options, self.cpu_assignment, self.cache_options),
+            name=f"inference-process-{self.index}",
+            daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        self.conn = parent_conn
+
+    def restart(self):
+        logger.warning(f"Restarting inference process {self.index} "
+                       f"(exit code {self.process.exitcode})")
+        self.kill()
+        self.start()
+
+    def kill(self):
+        try:
+            self.conn.close()
+        except Exception:
+            pass
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join(timeout=5)
+
+    def call(self, request, poll_interval=0.5):
+        """Send a request and wait for the reply, watching for a crashed process"""
+        if not self.process.is_alive():
+            self.restart()
+        self.conn.send(request)
+        while True:
+            try:
+                if self.conn.poll(poll_interval):
+                    return self.conn.recv()
+            except (EOFError, OSError):
+                pass
+            else:
+                if self.process.is_alive():
+                    continue
+            self.restart()
+            raise WorkerCrashedError(f"Inference process {self.index} crashed")
+
+
+class ProcessPoolBackend:
+    """
+    Pool of inference processes.
+    predict() blocks the calling thread until a worker is free, so it is meant to
+    be called from the job scheduler's worker threads.
+    - cpu: optional CpuResourceManager giving each process its share of the cores (see cpu_resources.py)
+    - cache_options: max_bytes / max_models / idle_ttl of every worker's ModelCache (see model_cache.py)
+    """
+
+    def __init__(self, processes=2, use_attention=False, cpu_modes=(), calibration_dir=None, backend="torch",
+                 backend_options=None, cpu=None, cache_options=None):
+        self.processes = max(1, processes)
+        self.use_attention = use_attention
+        self.cpu_modes = cpu_modes
+        self.calibration_dir = calibration_dir
+        # inference backend of the workers' models, see backends.py
+        self.backend = backend
+        self.backend_options = backend_options
+        self.cpu = cpu
+        self.cache_options = cache_options
+        self._ctx = mp.get_context("spawn")
+        self._idle: "queue.Queue[_Worker]" = queue.Queue()
+        self._workers = []
+        self._lock = threading.Lock()
+        # networks the workers loaded to serve a request
+        self.loads = 0
+
+    def start(self):
+        with self._lock:
+            if self._workers:
+                return
+            for i in range(self.processes):
+                assignment = self.cpu.assignment(i) if self.cpu is not None else None
+                worker = _Worker(self._ctx, i, self.use_attention, self.cpu_modes, self.calibration_dir,
+                                 self.backend, self.backend_options, assignment, self.cache_options)
+                self._workers.append(worker)
+                self._idle.put(worker)
+        logger.info(f"Started {self.processes} inference process(es)")
+
+    def stop(self):
+        with self._lock:
+            for worker in self._workers:
+                try:
+                    worker.conn.send(None)
+                except Exception:
+                    pass
+            for worker in self._workers:
+                worker.process.join(timeout=5)
+                if worker.process.is_alive():
+                    worker.kill()
+            self._workers = []
+            self._idle = queue.Queue()
+
+    def get_model(self, scale, resample_mode, alpha_strategy=None, precision="fp32"):
+        return ProcessModelHandle(self, scale, resample_mode, alpha_strategy, precision)
+
+    def predict(self, image_input, scale, resample_mode, out_path=None, alpha_strategy=None, worker=None,
+                precision="fp32"):
+        """
+        Upscale an image in a worker process.
+        Returns a uint8 ndarray, or None when out_path is given (the worker saves the file).
+        worker: run on this already reserved worker instead of the next idle one
+        """
+        if not self._workers:
+            self.start()
+        image = np.ascontiguousarray(np.asarray(image_input), dtype=np.uint8)
+        scale_int = int(scale)
+        out_shape = (image.shape[0] * scale_int, image.shape[1] * scale_int) + image.shape[2:]
+
+        in_shm = shared_memory.SharedMemory(create=True, size=image.nbytes)
+        out_shm = None
+        try:
+            np.ndarray(image.shape, dtype=np.uint8, buffer=in_shm.buf)[...] = image
+            request = {
+                "scale": str(scale),
+                "resample_mode": resample_mode,
+                "alpha_strategy": alpha_strategy,
+                "precision": precision,
+                "in_name": in_shm.name,
+                "in_shape": image.shape,
+            }
+            if out_path:
+                request["out_path"] = out_path
+            else:
+                out_shm = shared_memory.SharedMemory(create=True, size=int(np.prod(out_shape)))
+                request["out_name"] = out_shm.name
+                request["out_shape"] = out_shape
+
+            if worker is not None:
+                reply = worker.call(request)
+            else:
+                worker = self._idle.get()
+                try:
+                    reply = worker.call(request)
+                finally:
+                    self._idle.put(worker)
+
+            if reply.get("loaded"):
+                with self._lock:
+                    self.loads += 1
+            if not reply["ok"]:
+                raise RuntimeError(reply["error"])
+            if out_shm is None:
+                return None
+            return np.ndarray(out_shape, dtype=np.uint8, buffer=out_shm.buf).copy()
+        finally:
+            for shm in (in_shm, out_shm):
+                if shm is not None:
+                    shm.close()
+                    shm.unlink()
+
+    def warmup(self, scale, resample_mode, image, alpha_strategy=None, precision="fp32"):
+        """Load the network for scale in every worker process and run one prediction on image"""
+        if not self._workers:
+            self.start()
+        # reserve every worker so each one loads its own copy
+        workers = [self._idle.get() for _ in range(len(self._workers))]
+        try:
+            for worker in workers:
+                self.predict(image, scale, resample_mode, alpha_strategy=alpha_strategy, worker=worker,
+                             precision=precision)
+        finally:
+            for worker in workers:
+                self._idle.put(worker)
+
+    def snapshot(self) -> dict:
+        return {
+            "processes": self.processes,
+            "alive": sum(1 for w in self._workers if w.process.is_alive()),
+            "idle": self._idle.qsize(),
+            "loads": self.loads,
+        }
+
+
+class ProcessModelHandle:
+    """Same interface as model_cache.ModelHandle, backed by the process pool"""
+
+    def __init__(self, pool: ProcessPoolBackend, scale, resample_mode, alpha_strategy=None, precision="fp32"):
+        self.pool = pool
+        self.scale = str(scale)
+        self.resample_mode = resample_mode or 'bicubic'
+        self.alpha_strategy = alpha_strategy
+        self.precision = precision
+
+    def _predict(self, image_input, out_path=None):
+        return self.pool.predict(image_input, self.scale, self.resample_mode,
+                                 out_path=out_path, alpha_strategy=self.alpha_strategy, precision=self.precision)
+
+    def predict(self, image_input):
+        return self._predict(image_input)
+
+    def predict_to_file(self, image_input, out_path):
+        """Upscale and let the worker encode the result straight to out_path"""
+        self._predict(image_input, out_path=out_path)
+
+    async def predict_with_progress(self, image_input, progress_callback=None):
+        # the worker process cannot report per-patch progress, only start and end
+        if progress_callback:
+            await progress_callback(0.1, "Starting prediction...")
+        result = self._predict(image_input)
+        if progress_callback:
+            await progress_callback(1.0, "Prediction complete!")
+        return result
@@ -0,0 +1,257 @@
+"""
+# progress_hub.py
+Push-based progress fan-out on the server's event loop.
+Worker threads publish progress through a thread-safe queue; one dispatcher task on
+the main loop coalesces updates per job, throttles them to a maximum rate and hands
+the latest message to every subscriber of the job. A subscriber that connects late
+gets the job's latest message replayed right away.
+Every message carries a per-job state version, which long-poll requests wait on, and
+one subscription can follow many jobs (or all of them) for multiplexed streams.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# ends a subscription (job removed)
+_CLOSED = object()
+
+
+class Subscription:
+    """
+    Latest-message slots of one subscriber, one slot per job. A slow subscriber only ever
+    sees the newest message of each job, so it can never hold up the hub or other subscribers.
+    - job_ids: jobs to follow, None follows every job
+    """
+
+    def __init__(self, hub: "ProgressHub", job_ids: Optional[Iterable[str]] = None):
+        self.hub = hub
+        self.job_ids = None if job_ids is None else set(job_ids)
+        self._pending: Dict[str, object] = {}
+        self._ready = asyncio.Event()
+
+    def _offer(self, job_id: str, message):
+        # re-insert so jobs are delivered in the order of their latest update
+        self._pending.pop(job_id, None)
+        self._pending[job_id] = message
+        self._ready.set()
+
+    async def next(self, timeout: Optional[float] = None) -> Optional[Tuple[str, Optional[dict]]]:
+        """
+        Wait for the next (job_id, message); message is None once that job was removed.
+        Returns None if nothing arrived within timeout seconds.
+        """
+        if not self._pending:
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+        job_id = next(iter(self._pending))
+        message = self._pending.pop(job_id)
+        if not self._pending:
+            self._ready.clear()
+        return job_id, None if message is _CLOSED else message
+
+    async def get(self) -> Optional[dict]:
+        """Next message of a single-job subscription; None once the job is removed"""
+        return (await self.next())[1]
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.hub.unsubscribe(self)
+
+
+class ProgressHub:
+    """
+    - max_rate: messages per second sent per job; intermediate updates are coalesced
+    Messages marked final (job finished) are sent immediately.
+    """
+
+    def __init__(self, max_rate: float = 5.0):
+        self.interval = 1.0 / max_rate if max_rate > 0 else 0.0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._latest: Dict[str, dict] = {}
+        self._versions: Dict[str, int] = {}
+        self._latest_lock = threading.Lock()
+        self._subscribers: Dict[str, Set[Subscription]] = {}
+        self._wildcard: Set[Subscription] = set()
+        self._last_sent: Dict[str, float] = {}
+        self._sent_versions: Dict[str, int] = {}
+        self._scheduled: Dict[str, asyncio.TimerHandle] = {}
+        self.stats = {"published": 0, "sent": 0, "coalesced": 0}
+
+    async def start(self):
+        """Bind to the running (server) loop and start dispatching"""
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        self._dispatcher = asyncio.create_task(self._dispatch())
+
+    async def stop(self):
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            try:
+                await self._dispatcher
+            except asyncio.CancelledError:
+                pass
+            self._dispatcher = None
+        for handle in self._scheduled.values():
+            handle.cancel()
+        self._scheduled.clear()
+        self._loop = None
+
+    def publish(self, job_id: str, message: dict, final: bool = False) -> int:
+        """
+        Queue a progress message for job_id; safe to call from any thread.
+        Every message gets the job's next state version, which is returned.
+        """
+        with self._latest_lock:
+            version = self._versions.get(job_id, 0) + 1
+            self._versions[job_id] = version
+            self._latest[job_id] = {**message, "job_id": job_id, "version": version}
+            self.stats["published"] += 1
+        # without a server loop (CLI use) the message is only kept for replay
+        self._call_on_loop(self._queue_put, (job_id, final))
+        return version
+
+    def _queue_put(self, item):
+        self._queue.put_nowait(item)
+
+    def _call_on_loop(self, fn, *args):
+        """Run fn(*args) on the server loop: directly when already on it, otherwise thread-safely"""
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            fn(*args)
+        else:
+            loop.call_soon_threadsafe(fn, *args)
+
+    def latest(self, job_id: str) -> Optional[dict]:
+        with self._latest_lock:
+            return self._latest.get(job_id)
+
+    def version(self, job_id: str) -> int:
+        """Number of state changes published for job_id (0 if none)"""
+        with self._latest_lock:
+            return self._versions.get(job_id, 0)
+
+    async def wait_for_change(self, job_id: str, since: int, timeout: float) -> Optional[dict]:
+        """
+        Long-poll: the job's latest message once its version is above `since`.
+        Returns None on timeout or when the job is removed while waiting.
+        """
+        latest = self.latest(job_id)
+        if latest is not None and latest["version"] > since:
+            return latest
+        deadline = time.monotonic() + timeout
+        async with self.subscribe(job_id) as subscription:
+            while True:
+                item = await subscription.next(max(0.0, deadline - time.monotonic()))
+                if item is None or item[1] is None:
+                    return None
+                if item[1]["version"] > since:
+                    return item[1]
+
+    async def _dispatch(self):
+        while True:
+            job_id, final = await self._queue.get()
+            try:
+                self._schedule(job_id, final)
+            except Exception as e:
+                logger.error(f"Progress dispatch error for job {job_id}: {e}")
+
+    def _schedule(self, job_id: str, final: bool):
+        if job_id in self._scheduled:
+            if not final:
+                # a send is already due, it will carry this newer message
+                self.stats["coalesced"] += 1
+                return
+            self._scheduled.pop(job_id).cancel()
+        wait = self._last_sent.get(job_id, 0.0) + self.interval - time.monotonic()
+        if final or wait <= 0:
+            self._send(job_id)
+        else:
+            self._scheduled[job_id] = self._loop.call_later(wait, self._send, job_id)
+
+    def _send(self, job_id: str):
+        self._scheduled.pop(job_id, None)
+        self._last_sent[job_id] = time.monotonic()
+        message = self.latest(job_id)
+        if message is None or message["version"] <= self._sent_versions.get(job_id, 0):
+            # already delivered by an earlier send that picked up the newest message
+            return
+        self._sent_versions[job_id] = message["version"]
+        for subscription in self._subscribers_of(job_id):
+            subscription._offer(job_id, message)
+            self.stats["sent"] += 1
+
+    def _subscribers_of(self, job_id: str):
+        return list(self._subscribers.get(job_id, ())) + list(self._wildcard)
+
+    def subscribe(self, job_id: str) -> Subscription:
+        """Subscribe to one job on the server loop; its latest message (if any) is replayed first"""
+        return self.subscribe_many([job_id])
+
+    def subscribe_many(self, job_ids: Optional[Iterable[str]] = None) -> Subscription:
+        """Subscribe to several jobs (every job if None); latest messages are replayed first"""
+        subscription = Subscription(self, job_ids)
+        if subscription.job_ids is None:
+            self._wildcard.add(subscription)
+            with self._latest_lock:
+                replay = list(self._latest.items())
+        else:
+            for job_id in subscription.job_ids:
+                self._subscribers.setdefault(job_id, set()).add(subscription)
+            replay = [(job_id, self.latest(job_id)) for job_id in subscription.job_ids]
+        for job_id, message in replay:
+            if message is not None:
+                subscription._offer(job_id, message)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        if subscription.job_ids is None:
+            self._wildcard.discard(subscription)
+            return
+        for job_id in subscription.job_ids:
+            subscribers = self._subscribers.get(job_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[job_id]
+
+    def close(self, job_id: str):
+        """End every subscription of job_id and forget its state (job removed); safe from any thread"""
+        with self._latest_lock:
+            self._latest.pop(job_id, None)
+            self._versions.pop(job_id, None)
+        self._call_on_loop(self._close, job_id)
+
+    def _close(self, job_id: str):
+        handle = self._scheduled.pop(job_id, None)
+        if handle is not None:
+            handle.cancel()
+        self._last_sent.pop(job_id, None)
+        self._sent_versions.pop(job_id, None)
+        for subscription in self._subscribers_of(job_id):
+            subscription._offer(job_id, _CLOSED)
+
+    def snapshot(self) -> dict:
+        subscriptions = set(self._wildcard).union(*self._subscribers.values())
+        return {
+            **self.stats,
+            "jobs": len(self._latest),
+            "subscribers": len(subscriptions),
+            "max_rate": 1.0 / self.interval if self.interval else 0.0,
+        }
@@ -0,0 +1,173 @@
+"""
+# quantize.py
+Int8 variant of the RealESRGAN networks for CPU serving.
+The residual body of the network (the RRDB blocks, which hold nearly all of its
+convolutions) is quantized with post-training static int8 quantization, calibrated
+on a sample image set, and cached as TorchScript next to the fp32 weights in
+WEIGHTS_DIR. The first convolution, the upsampling and the output layers stay fp32,
+so every resample mode works unchanged on the int8 variant.
+
+    $ python -m backend.quantize --scale 2 4 [--calibration path/to/images] [--force]
+"""
+
+import argparse
+import glob
+import logging
+import os
+
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+PRECISIONS = ("fp32", "int8")
+# images (crops) the observers see before the int8 ranges are fixed
+CALIBRATION_IMAGES = 16
+CALIBRATION_SIZE = 128
+CALIBRATION_FORMATS = ('.png', '.jpg', '.jpeg', '.bmp', '.tiff')
+
+
+def int8_weights_path(fp32_path: str) -> str:
+    """Cache file of the int8 variant for an fp32 weights file"""
+    root, _ = os.path.splitext(fp32_path)
+    return f"{root}_int8.pt"
+
+
+def quantized_engine() -> str:
+    """Best quantized kernel backend of this torch build (x86 > fbgemm > qnnpack on ARM)"""
+    import torch
+    engines = torch.backends.quantized.supported_engines
+    for engine in ("x86", "fbgemm", "qnnpack"):
+        if engine in engines:
+            return engine
+    raise RuntimeError(f"No int8 CPU kernels in this torch build (engines: {engines})")
+
+
+def _synthetic_images(count: int, size: int):
+    """Gradients, flat areas, hard edges and noise, for when no calibration set is configured"""
+    rng = np.random.default_rng(0)
+    yy, xx = np.mgrid[0:size, 0:size]
+    images = []
+    for i in range(count):
+        base = np.dstack([(xx * (i + 1)) % 256, (yy * (i + 2)) % 256, (xx ^ yy) % 256]).astype(np.float32)
+        base[(xx // 16 + yy // 16 + i) % 3 == 0] = rng.integers(0, 256, 3)
+        noisy = base + rng.normal(0, 4 + 2 * i, base.shape)
+        images.append(np.clip(noisy, 0, 255).astype(np.uint8))
+    return images
+
+
+def calibration_images(directory: str = None, count: int = CALIBRATION_IMAGES, size: int = CALIBRATION_SIZE):
+    """
+    Up to count RGB crops of at most size x size from the images in directory.
+    Falls back to synthetic images when no directory (or no image in it) is given.
+    """
+    paths = []
+    if directory:
+        paths = sorted(p for p in glob.glob(os.path.join(directory, "**", "*"), recursive=True)
+                       if p.lower().endswith(CALIBRATION_FORMATS))
+    if not paths:
+        logger.warning("No calibration images configured, calibrating int8 ranges on synthetic images")
+        return _synthetic_images(count, size)
+
+    images = []
+    for path in paths[:count]:
+        with Image.open(path) as img:
+            img.draft('RGB', (size, size))
+            rgb = img.convert('RGB')
+        # centre crop keeps real texture at the model's input resolution
+        left, top = max(0, (rgb.width - size) // 2), max(0, (rgb.height - size) // 2)
+        images.append(np.array(rgb.crop((left, top, min(rgb.width, left + size), min(rgb.height, top + size)))))
+    return images
+
+
+def _to_tensor(image):
+    import torch
+    return torch.from_numpy(np.ascontiguousarray(image)).permute(2, 0, 1).float().div_(255).unsqueeze(0)
+
+
+def quantize_body(network, images):
+    """
+    Replace network.body by a static int8 version calibrated on images (uint8 RGB arrays).
+    Calibration runs the whole network so the observers see the body's real activations.
+    Returns the quantized body.
+    """
+    import torch
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+    body = getattr(network, 'body', None)
+    if body is None:
+        raise ValueError("Network has no residual body to quantize")
+    engine = quantized_engine()
+    torch.backends.quantized.engine = engine
+    network.eval()
+
+    # the body's input (features after the first convolution) is the example for tracing
+    captured = []
+    handle = body.register_forward_pre_hook(lambda module, args: captured.append(args[0]))
+    with torch.no_grad():
+        network(_to_tensor(images[0]))
+    handle.remove()
+
+    prepared = prepare_fx(body, get_default_qconfig_mapping(engine), example_inputs=(captured[0],))
+    network.body = prepared
+    try:
+        with torch.no_grad():
+            for image in images:
+                network(_to_tensor(image))
+    finally:
+        network.body = body
+    quantized = convert_fx(prepared)
+    network.body = quantized
+    return quantized
+
+
+def save_int8(body, path: str):
+    """Save a quantized body as TorchScript, atomically so concurrent loaders never read half a file"""
+    import torch
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    torch.jit.save(torch.jit.script(body), tmp_path)
+    os.replace(tmp_path, path)
+
+
+def load_int8(network, fp32_path: str, calibration_dir: str = None) -> str:
+    """
+    Swap the body of an fp32 network (loaded from fp32_path) for its int8 variant.
+    The variant is read from the cache next to the weights, and built (calibrated) and
+    cached first when it is missing or older than the fp32 weights. Returns the cache path.
+    """
+    import torch
+    path = int8_weights_path(fp32_path)
+    torch.backends.quantized.engine = quantized_engine()
+    if os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(fp32_path):
+        network.body = torch.jit.load(path, map_location='cpu')
+        return path
+
+    logger.info(f"Building int8 weights {path}")
+    body = quantize_body(network, calibration_images(calibration_dir))
+    save_int8(body, path)
+    return path
+
+
+def main():
+    from .upscale import ModelManager
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", nargs="+", default=["2", "4", "8"], choices=["2", "4", "8"])
+    parser.add_argument("--calibration", help="directory of sample images (defaults to synthetic images)")
+    parser.add_argument("--force", action="store_true", help="rebuild int8 weights that are already cached")
+    args = parser.parse_args()
+
+    for scale in args.scale:
+        manager = ModelManager(precision="int8", calibration_dir=args.calibration)
+        if args.force:
+            cached = int8_weights_path(manager._get_weights_path(scale))
+            if os.path.exists(cached):
+                os.unlink(cached)
+        manager.initialize_model(scale=scale)
+        print(f"x{scale}: {int8_weights_path(manager._get_weights_path(scale))}")
+        manager.unload()
+
+
+if __name__ == "__main__":
+    main()
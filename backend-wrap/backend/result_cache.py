@@ -0,0 +1,183 @@
+"""
+# result_cache.py
+Content-addressed cache of finished upscale results on disk.
+Results are keyed on a hash of the decoded pixels plus every setting that changes
+the output (scales, resample mode, alpha strategy, output format, weights version
+and precision).
+A repeat request is completed by hard-linking the cached file to the new job's
+output path, and identical requests still in flight are collapsed onto one job.
+"""
+
+import hashlib
+import logging
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .quantize import int8_weights_path
+from .upscale import WEIGHTS_DIR
+
+logger = logging.getLogger(__name__)
+
+
+def weights_version(factors, precision="fp32", backend="torch") -> str:
+    """
+    Cheap version tag for the weight files (size + mtime), changes when weights are replaced.
+    The backend is part of it, exported ONNX models do not produce bit-identical output.
+    """
+    parts = [backend, precision]
+    for factor in factors:
+        path = os.path.join(WEIGHTS_DIR, f"RealESRGAN_x{factor}.pth")
+        paths = [path, int8_weights_path(path)] if precision == "int8" else [path]
+        for path in paths:
+            try:
+                stat = os.stat(path)
+                parts.append(f"x{factor}:{stat.st_size}:{stat.st_mtime_ns}")
+            except OSError:
+                parts.append(f"x{factor}:missing")
+    return ";".join(parts)
+
+
+def link_or_copy(src, dest):
+    """Hard link src to dest (same filesystem under OUTPUT_DIR), copying as a fallback"""
+    if os.path.abspath(src) == os.path.abspath(dest):
+        return
+    if os.path.exists(dest):
+        os.unlink(dest)
+    try:
+        os.link(src, dest)
+    except OSError:
+        shutil.copyfile(src, dest)
+
+
+class ResultCache:
+    """
+    LRU cache of result files under `directory`, capped at max_bytes (0 disables caching).
+    Files are named <key><ext>; the index is rebuilt from disk on startup in mtime order.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._index: "OrderedDict[str, tuple]" = OrderedDict()
+        self._inflight: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "collapsed": 0, "stores": 0, "evictions": 0}
+        if self.enabled:
+            os.makedirs(directory, exist_ok=True)
+            self._load_index()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def _load_index(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if os.path.isfile(path):
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, os.path.splitext(name)[0], path, stat.st_size))
+        for _, key, path, size in sorted(entries):
+            self._index[key] = (path, size)
+
+    @staticmethod
+    def make_key(image, scale_list, resample_mode, alpha_strategy, extension, weights_tag) -> str:
+        """Hash of the decoded pixels (PIL image or ndarray) plus all output-affecting settings"""
+        digest = hashlib.sha256()
+        if hasattr(image, 'tobytes') and hasattr(image, 'mode'):
+            digest.update(f"{image.mode}:{image.size}".encode())
+            digest.update(image.tobytes())
+        else:
+            digest.update(f"{image.dtype}:{image.shape}".encode())
+            digest.update(np.ascontiguousarray(image))
+        settings = f"|{','.join(map(str, scale_list))}|{resample_mode}|{alpha_strategy}|{extension.lower()}|{weights_tag}"
+        digest.update(settings.encode())
+        return digest.hexdigest()
+
+    def link_cached(self, key, dest) -> bool:
+        """Point dest at the cached result for key. Returns False on a miss."""
+        if not self.enabled:
+            return False
+        with self._lock:
+            entry = self._index.get(key)
+            if entry is None or not os.path.exists(entry[0]):
+                self._index.pop(key, None)
+                self.stats["misses"] += 1
+                return False
+            self._index.move_to_end(key)
+            self.stats["hits"] += 1
+            path = entry[0]
+            # keep on-disk order in sync with LRU order for the next restart
+            os.utime(path)
+            link_or_copy(path, dest)
+        return True
+
+    def store(self, key, src_path):
+        """Add a finished result to the cache"""
+        if not self.enabled or key is None:
+            return
+        ext = os.path.splitext(src_path)[1]
+        path = os.path.join(self.directory, key + ext)
+        try:
+            link_or_copy(src_path, path)
+        except OSError as e:
+            logger.error(f"Unable to cache result {src_path}: {e}")
+            return
+        with self._lock:
+            self._index[key] = (path, os.path.getsize(path))
+            self._index.move_to_end(key)
+            self.stats["stores"] += 1
+        self._evict()
+
+    def _evict(self):
+        with self._lock:
+            total = sum(size for _, size in self._index.values())
+            while total > self.max_bytes and len(self._index) > 1:
+                key, (path, size) = self._index.popitem(last=False)
+                total -= size
+                self.stats["evictions"] += 1
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+
+    # In-flight deduplication
+
+    def join_inflight(self, key, job_id, follower_info=None) -> Optional[str]:
+        """
+        Register job_id for key. Returns the leader job id if an identical job is
+        already running (job_id becomes a follower), otherwise None (job_id leads).
+        """
+        with self._lock:
+            group = self._inflight.get(key)
+            if group is None:
+                self._inflight[key] = {"leader": job_id, "followers": []}
+                return None
+            group["followers"].append((job_id, follower_info))
+            self.stats["collapsed"] += 1
+            return group["leader"]
+
+    def finish_inflight(self, key) -> List[tuple]:
+        """Close the in-flight group for key and return its (job_id, info) followers"""
+        with self._lock:
+            group = self._inflight.pop(key, None)
+        return group["followers"] if group else []
+
+    def has_followers(self, job_id) -> bool:
+        with self._lock:
+            return any(g["leader"] == job_id and g["followers"] for g in self._inflight.values())
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                **self.stats,
+                "entries": len(self._index),
+                "bytes": sum(size for _, size in self._index.values()),
+                "max_bytes": self.max_bytes,
+                "inflight": len(self._inflight),
+            }
@@ -0,0 +1,294 @@
+"""
+# retention.py
+Bounded retention of job records and result files.
+Finished jobs move from their working dict to a compact record, and a background
+reaper deletes jobs (with their files) that were not accessed within a TTL, then
+evicts the least recently used ones while result files exceed a disk quota.
+Files in the output directory that no retained job refers to are removed too.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from typing import Callable, Dict, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+FINISHED_STATUSES = ("completed", "error", "cancelled")
+
+
+def path_bytes(path) -> int:
+    """Size of a file, or of everything below a directory (0 if missing)"""
+    if not path:
+        return 0
+    if os.path.isdir(path):
+        total = 0
+        for root, _, files in os.walk(path):
+            for name in files:
+                try:
+                    total += os.path.getsize(os.path.join(root, name))
+                except OSError:
+                    pass
+        return total
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+class JobRecord:
+    """Compact, read-only form of a finished job; transient fields (tokens, cache keys) are dropped"""
+
+    __slots__ = (
+        "status", "message", "filename", "output_file", "intermediate_files", "plan", "estimate",
+        "precision", "type", "parent", "member", "archive_name", "children", "output_dir", "counts",
+        "finished_at", "last_access", "size_bytes",
+    )
+    _FIELDS = __slots__[:15]
+
+    def __init__(self, job: dict):
+        for field in self._FIELDS:
+            value = job.get(field)
+            setattr(self, field, tuple(value) if isinstance(value, list) else value)
+        self.finished_at = self.last_access = time.time()
+        self.size_bytes = sum(path_bytes(p) for p in self.paths())
+
+    def paths(self):
+        """Files and directories owned by this job"""
+        yield from (p for p in (self.output_file, self.output_dir) if p)
+        yield from self.intermediate_files or ()
+
+    def to_dict(self) -> dict:
+        job = {"progress": 1.0}
+        for field in self._FIELDS:
+            value = getattr(self, field)
+            if value is not None:
+                job[field] = list(value) if isinstance(value, tuple) else value
+        return job
+
+
+class FinishedJob(dict):
+    """Read-only dict of a finished job, so a write to it fails instead of being lost"""
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError("Finished jobs are read-only, use JobStore.update_job")
+
+    __setitem__ = __delitem__ = __ior__ = _read_only
+    update = pop = popitem = setdefault = clear = _read_only
+
+
+class JobStore(MutableMapping):
+    """
+    Job id -> job dict, a drop-in replacement for the plain active_jobs dict.
+    Unfinished jobs are kept as mutable dicts; finished ones are compacted into JobRecords
+    (on assignment, or by compact() for dicts that reached a finished status in place).
+    Reading a finished job returns a read-only FinishedJob and marks it recently used;
+    update_job changes a job whether it is still live or already compacted.
+    """
+
+    def __init__(self):
+        self._live: Dict[str, dict] = {}
+        self._finished: "OrderedDict[str, JobRecord]" = OrderedDict()
+        self._lock = threading.RLock()
+
+    def __getitem__(self, job_id: str) -> dict:
+        with self._lock:
+            if job_id in self._live:
+                return self._live[job_id]
+            record = self._finished[job_id]
+            record.last_access = time.time()
+            self._finished.move_to_end(job_id)
+            return FinishedJob(record.to_dict())
+
+    def __setitem__(self, job_id: str, job: dict):
+        with self._lock:
+            self._finished.pop(job_id, None)
+            self._live.pop(job_id, None)
+            if job.get("status") in FINISHED_STATUSES:
+                self._finished[job_id] = JobRecord(job)
+            else:
+                self._live[job_id] = job
+
+    def update_job(self, job_id: str, **fields) -> Optional[dict]:
+        """Update the fields of a job; returns the job, or None when there is no such job"""
+        with self._lock:
+            job = self._live.get(job_id)
+            if job is not None:
+                job.update(fields)
+                return job
+            if job_id not in self._finished:
+                return None
+            # rebuilt from the record, compacted again if it is still finished
+            self[job_id] = {**self._finished[job_id].to_dict(), **fields}
+            return self[job_id]
+
+    def __delitem__(self, job_id: str):
+        with self._lock:
+            if self._live.pop(job_id, None) is None:
+                del self._finished[job_id]
+
+    def __contains__(self, job_id) -> bool:
+        with self._lock:
+            return job_id in self._live or job_id in self._finished
+
+    def __iter__(self) -> Iterator[str]:
+        with self._lock:
+            return iter(list(self._live) + list(self._finished))
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._live) + len(self._finished)
+
+    def compact(self) -> int:
+        """Move dicts that reached a finished status to compact records, returns how many"""
+        with self._lock:
+            done = [job_id for job_id, job in self._live.items() if job.get("status") in FINISHED_STATUSES]
+            for job_id in done:
+                self._finished[job_id] = JobRecord(self._live.pop(job_id))
+            return len(done)
+
+    def finished_records(self):
+        """(job id, record) pairs from least to most recently used, without touching them"""
+        with self._lock:
+            return list(self._finished.items())
+
+    def live_jobs(self):
+        with self._lock:
+            return list(self._live.items())
+
+
+class RetentionManager:
+    """
+    - ttl: seconds a finished job is kept after its last access (0 keeps jobs until evicted)
+    - max_bytes: disk quota for result files of finished jobs (0 = unlimited)
+    - discard(job_id): removes a job and its files (and the items of a batch)
+    - interval: seconds between sweeps
+    """
+
+    def __init__(self, jobs: JobStore, output_dir: str, discard: Callable[[str], None], ttl=3600,
+                 max_bytes=0, interval=60, exclude=("cache",)):
+        self.jobs = jobs
+        self.output_dir = output_dir
+        self.discard = discard
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.interval = interval
+        self.exclude = set(exclude)
+        self._reaper = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self.stats = {"sweeps": 0, "compacted": 0, "expired": 0, "evicted": 0, "orphans_removed": 0}
+
+    def sweep(self):
+        """Compact finished jobs, expire old ones, enforce the quota and remove orphaned files"""
+        compacted = self.jobs.compact()
+        now = time.time()
+        # items of a batch live and die with their batch
+        records = [(job_id, r) for job_id, r in self.jobs.finished_records() if r.parent not in self.jobs]
+
+        expired = 0
+        if self.ttl:
+            for job_id, record in records:
+                if now - record.last_access > self.ttl:
+                    self.discard(job_id)
+                    expired += 1
+            records = [(job_id, r) for job_id, r in records if job_id in self.jobs]
+
+        evicted = 0
+        if self.max_bytes:
+            total = sum(r.size_bytes for _, r in records)
+            for job_id, record in records:
+                if total <= self.max_bytes:
+                    break
+                self.discard(job_id)
+                total -= record.size_bytes
+                evicted += 1
+
+        orphans = self._remove_orphans(now)
+        with self._lock:
+            self.stats["sweeps"] += 1
+            self.stats["compacted"] += compacted
+            self.stats["expired"] += expired
+            self.stats["evicted"] += evicted
+            self.stats["orphans_removed"] += orphans
+        if expired or evicted or orphans:
+            logger.info(f"Retention sweep: {expired} expired, {evicted} evicted, {orphans} orphaned file(s) removed")
+
+    def _referenced_paths(self):
+        paths = set()
+        for _, record in self.jobs.finished_records():
+            paths.update(os.path.abspath(p) for p in record.paths())
+        for _, job in self.jobs.live_jobs():
+            for key in ("output_file", "output_dir"):
+                if job.get(key):
+                    paths.add(os.path.abspath(job[key]))
+            paths.update(os.path.abspath(p) for p in job.get("intermediate_files", []))
+        return paths
+
+    def _remove_orphans(self, now) -> int:
+        """Delete results no job refers to (e.g. from before a restart) once they are older than ttl"""
+        if not self.ttl or not os.path.isdir(self.output_dir):
+            return 0
+        referenced = self._referenced_paths()
+        removed = 0
+        for entry in os.scandir(self.output_dir):
+            path = os.path.abspath(entry.path)
+            if entry.name in self.exclude or path in referenced:
+                continue
+            try:
+                # files still being written by running jobs are recent
+                if now - entry.stat().st_mtime <= self.ttl:
+                    continue
+                if entry.is_dir():
+                    for root, dirs, files in os.walk(path, topdown=False):
+                        for name in files:
+                            os.unlink(os.path.join(root, name))
+                        for name in dirs:
+                            os.rmdir(os.path.join(root, name))
+                    os.rmdir(path)
+                else:
+                    os.unlink(path)
+                removed += 1
+            except OSError as e:
+                logger.error(f"Unable to remove orphaned result {path}: {e}")
+        return removed
+
+    def start_reaper(self):
+        """Start the background thread that sweeps every interval seconds"""
+        if self._reaper is not None:
+            return
+        self._stop.clear()
+
+        def run():
+            while not self._stop.wait(self.interval):
+                try:
+                    self.sweep()
+                except Exception as e:
+                    logger.error(f"Retention reaper error: {e}")
+
+        self._reaper = threading.Thread(target=run, name="job-retention-reaper", daemon=True)
+        self._reaper.start()
+
+    def stop_reaper(self):
+        self._stop.set()
+        if self._reaper is not None:
+            self._reaper.join(timeout=5)
+            self._reaper = None
+
+    def snapshot(self) -> dict:
+        records = self.jobs.finished_records()
+        live = self.jobs.live_jobs()
+        with self._lock:
+            return {
+                **self.stats,
+                "retained_jobs": len(records) + len(live),
+                "live_jobs": len(live),
+                "finished_jobs": len(records),
+                "result_bytes": sum(r.size_bytes for _, r in records if r.parent is None),
+                "output_dir_bytes": path_bytes(self.output_dir),
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl,
+            }
@@ -0,0 +1,213 @@
+"""
+# scheduler.py
+Bounded priority job queue with a dedicated pool of inference workers.
+Keeps heavy upscales off the shared Starlette threadpool and limits how many
+run at once. When the queue is full, submissions are rejected with QueueFullError
+so the API can answer with backpressure instead of accepting unbounded work.
+"""
+
+import heapq
+import itertools
+import logging
+import math
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(Exception):
+    """Raised when the job queue has no room; retry_after is a hint in seconds"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Job queue is full, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+class JobCancelledError(Exception):
+    """Raised inside a running job once it has been cancelled"""
+
+
+class CancellationToken:
+    """
+    Set from the API, checked by a running job at safe points
+    (between scales, tiles and archive members) so it can stop early.
+    A token with a parent (batch items) is also cancelled with its parent.
+    """
+
+    def __init__(self, parent: "CancellationToken" = None):
+        self._event = threading.Event()
+        self.parent = parent
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set() or (self.parent is not None and self.parent.cancelled)
+
+    def raise_if_cancelled(self):
+        if self.cancelled:
+            raise JobCancelledError("Job was cancelled")
+
+
+class ScheduledJob:
+    def __init__(self, job_id: str, fn: Callable, args: tuple, priority: int):
+        self.job_id = job_id
+        self.fn = fn
+        self.args = args
+        self.priority = priority
+        self.submitted_at = time.time()
+        self.started_at: Optional[float] = None
+
+
+class JobScheduler:
+    """
+    Priority queue + worker threads.
+    - workers: number of jobs allowed to run inference concurrently
+    - max_queue: maximum number of waiting jobs before submissions are rejected
+    - initializer: optional callable(worker index) run on each worker thread before it takes jobs
+    Higher priority values run first; equal priorities run in submission order.
+    """
+
+    def __init__(self, workers=1, max_queue=32, default_job_seconds=10.0, initializer: Callable[[int], None] = None):
+        self.workers = max(1, workers)
+        self.max_queue = max_queue
+        self.initializer = initializer
+        self._heap: List[tuple] = []
+        self._queued: Dict[str, ScheduledJob] = {}
+        self._running: Dict[str, ScheduledJob] = {}
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._threads: List[threading.Thread] = []
+        self._stopping = False
+        # exponential moving average of job run time, used for start estimates
+        self._avg_job_seconds = default_job_seconds
+
+    def start(self):
+        with self._cond:
+            if self._threads:
+                return
+            self._stopping = False
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._worker, args=(i,), name=f"inference-worker-{i}", daemon=True)
+                self._threads.append(thread)
+                thread.start()
+        logger.info(f"Job scheduler started with {self.workers} worker(s), queue size {self.max_queue}")
+
+    def stop(self, timeout=5.0):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout=timeout)
+        self._threads = []
+
+    def submit(self, job_id: str, fn: Callable, *args, priority: int = 0) -> ScheduledJob:
+        """Queue fn(*args) to run on a worker. Raises QueueFullError when full."""
+        job = ScheduledJob(job_id, fn, args, priority)
+        with self._cond:
+            if len(self._queued) >= self.max_queue:
+                raise QueueFullError(self.retry_after())
+            self._queued[job_id] = job
+            heapq.heappush(self._heap, (-priority, next(self._seq), job))
+            self._cond.notify()
+        return job
+
+    def _next_job(self) -> Optional[ScheduledJob]:
+        with self._cond:
+            while True:
+                if self._stopping:
+                    return None
+                while self._heap:
+                    _, _, job = heapq.heappop(self._heap)
+                    # skip entries removed from the queue while waiting
+                    if self._queued.pop(job.job_id, None) is job:
+                        job.started_at = time.time()
+                        self._running[job.job_id] = job
+                        return job
+                self._cond.wait()
+
+    def _worker(self, index: int):
+        if self.initializer is not None:
+            try:
+                self.initializer(index)
+            except Exception as e:
+                logger.error(f"Inference worker {index} initializer failed: {e}")
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+            try:
+                job.fn(*job.args)
+            except Exception as e:
+                logger.error(f"[scheduler:{job.job_id}] job failed: {e}")
+            finally:
+                elapsed = time.time() - job.started_at
+                with self._cond:
+                    self._running.pop(job.job_id, None)
+                    self._avg_job_seconds = 0.8 * self._avg_job_seconds + 0.2 * elapsed
+
+    def remove(self, job_id: str) -> bool:
+        """Drop a job that has not started yet"""
+        with self._cond:
+            return self._queued.pop(job_id, None) is not None
+
+    def _ordered_queue(self) -> List[ScheduledJob]:
+        return [job for _, _, job in sorted(self._heap) if self._queued.get(job.job_id) is job]
+
+    def position(self, job_id: str) -> Optional[int]:
+        """1-based position among waiting jobs, 0 if running, None if unknown"""
+        with self._cond:
+            if job_id in self._running:
+                return 0
+            for pos, job in enumerate(self._ordered_queue(), start=1):
+                if job.job_id == job_id:
+                    return pos
+        return None
+
+    def estimated_start(self, job_id: str) -> Optional[float]:
+        """Estimated unix time the job starts (its start time if already running)"""
+        with self._cond:
+            running = self._running.get(job_id)
+            if running is not None:
+                return running.started_at
+            ordered = self._ordered_queue()
+            ahead = next((i for i, job in enumerate(ordered) if job.job_id == job_id), None)
+            if ahead is None:
+                return None
+            return time.time() + self._wait_seconds(ahead)
+
+    def _wait_seconds(self, jobs_ahead: int) -> float:
+        """Time until a worker frees up for a job with jobs_ahead waiting in front of it"""
+        now = time.time()
+        remaining = sorted(
+            max(0.0, self._avg_job_seconds - (now - job.started_at))
+            for job in self._running.values()
+        )
+        free_workers = self.workers - len(remaining)
+        if jobs_ahead < free_workers:
+            return 0.0
+        first_free = remaining[(jobs_ahead - free_workers) % len(remaining)] if remaining else 0.0
+        rounds = (jobs_ahead - free_workers) // self.workers
+        return first_free + rounds * self._avg_job_seconds
+
+    def expected_wait(self) -> float:
+        """Seconds a job submitted now would wait before a worker picks it up"""
+        with self._cond:
+            return self._wait_seconds(len(self._queued))
+
+    def retry_after(self) -> int:
+        """Seconds until the queue is expected to have room again"""
+        return max(1, math.ceil(self._avg_job_seconds / self.workers))
+
+    def snapshot(self) -> dict:
+        with self._cond:
+            return {
+                "workers": self.workers,
+                "running": len(self._running),
+                "queued": len(self._queued),
+                "max_queue": self.max_queue,
+                "avg_job_seconds": round(self._avg_job_seconds, 2),
+            }
@@ -0,0 +1,308 @@
+"""
+# tar_pipeline.py
+Pipelined tar archive processing.
+Members flow through three overlapping stages:
+    read + decode (thread pool) -> inference (workers) -> encode (thread pool)
+and are appended to the output archive in their original order. Inference takes
+members in groups of `batch_size` so same-sized ones share a forward pass. At most
+`queue_size` members are in flight, which bounds the work queued in every stage.
+With resume, a partly written output archive is continued instead of starting over;
+a sidecar manifest (source hash and model settings) makes sure it came from the same run.
+"""
+
+import hashlib
+import json
+import os
+import tarfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from io import BytesIO
+
+from PIL import Image
+
+from .scheduler import JobCancelledError
+from .upscale import IMAGE_FORMATS, upscale_batch, image_to_tar_format
+
+_BLOCK = tarfile.BLOCKSIZE
+
+# Written next to the output archive while a resumable run is in progress
+MANIFEST_SUFFIX = ".manifest.json"
+
+
+class StageStats:
+    """Item count and busy time of one pipeline stage"""
+
+    def __init__(self, name):
+        self.name = name
+        self.items = 0
+        self.busy = 0.0
+        self._lock = threading.Lock()
+
+    def timed(self, fn, count=None):
+        """count(*args): number of items in one call, 1 by default"""
+        def run(*args):
+            start = time.perf_counter()
+            try:
+                return fn(*args)
+            finally:
+                with self._lock:
+                    self.items += count(*args) if count is not None else 1
+                    self.busy += time.perf_counter() - start
+        return run
+
+    def report(self, wall, workers):
+        return {
+            "stage": self.name,
+            "items": self.items,
+            "busy_seconds": round(self.busy, 3),
+            "items_per_second": round(self.items / wall, 2) if wall else 0.0,
+            # share of the stage's worker capacity that was used
+            "utilisation": round(self.busy / (wall * workers), 2) if wall else 0.0,
+        }
+
+
+def _then(future, pool, fn):
+    """Run fn(result) on pool once future completes; returns the chained future"""
+    chained = Future()
+
+    def resolve(inner):
+        try:
+            chained.set_result(inner.result())
+        except Exception as e:
+            chained.set_exception(e)
+
+    def submit(done):
+        try:
+            value = done.result()
+            pool.submit(fn, value).add_done_callback(resolve)
+        except BaseException as e:
+            # includes cancelled futures and pools shut down by a cancelled run
+            chained.set_exception(e)
+
+    future.add_done_callback(submit)
+    return chained
+
+
+def completed_members(output_path):
+    """
+    Names of the complete members of a partly written archive, and the byte offset
+    right after the last one (where appending has to resume).
+    """
+    done, end = set(), 0
+    if not os.path.exists(output_path):
+        return done, end
+    file_size = os.path.getsize(output_path)
+    try:
+        with tarfile.open(output_path, mode='r') as archive:
+            for member in archive:
+                member_end = member.offset_data + -(-member.size // _BLOCK) * _BLOCK
+                if member_end > file_size:
+                    break
+                done.add(member.name)
+                end = member_end
+    except (tarfile.ReadError, EOFError, OSError):
+        # truncated header, keep what was read up to here
+        pass
+    return done, end
+
+
+def _file_sha256(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def run_manifest(path_to_tar, model):
+    """What an output archive has to come from to be resumed: the source archive and the model settings"""
+    return {
+        "source": os.path.basename(path_to_tar),
+        "size": os.path.getsize(path_to_tar),
+        "sha256": _file_sha256(path_to_tar),
+        "settings": {
+            "scale": getattr(model, "current_scale", None),
+            "resample_mode": getattr(model, "current_resample_mode", None),
+            "precision": getattr(model, "precision", None),
+            "backend": getattr(model, "backend", None),
+        },
+    }
+
+
+def resumable_members(output_path, manifest):
+    """
+    completed_members of output_path if its manifest matches this run, otherwise
+    nothing (the archive is rewritten from the start).
+    """
+    try:
+        with open(output_path + MANIFEST_SUFFIX) as f:
+            previous = json.load(f)
+    except (OSError, ValueError):
+        previous = None
+    if previous != manifest:
+        if os.path.exists(output_path):
+            print(f'Not resuming {output_path}: it was not written from this source with these settings')
+        return set(), 0
+    return completed_members(output_path)
+
+
+def _write_manifest(output_path, manifest):
+    tmp_path = output_path + MANIFEST_SUFFIX + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, output_path + MANIFEST_SUFFIX)
+
+
+def _remove_manifest(output_path):
+    try:
+        os.unlink(output_path + MANIFEST_SUFFIX)
+    except FileNotFoundError:
+        pass
+
+
+def _decode(raw):
+    return Image.open(BytesIO(raw), mode='r').convert('RGB')
+
+
+def _infer_group(group, model):
+    """
+    Upscale a group of (decoded future, result future) members with upscale_batch and
+    resolve each result future with the upscaled image or the member's error.
+    """
+    try:
+        decoded = []
+        for source, result in group:
+            try:
+                decoded.append((source.result(), result))
+            except Exception as e:
+                result.set_exception(e)
+        upscaled = upscale_batch([img for img, _ in decoded], model)
+        for (_, result), img_up in zip(decoded, upscaled):
+            if img_up is None:
+                result.set_exception(RuntimeError("inference failed"))
+            else:
+                result.set_result(img_up)
+    finally:
+        # never leave the writer waiting on a member
+        for _, result in group:
+            if not result.done():
+                result.set_exception(RuntimeError("inference did not run"))
+
+
+def process_tar_pipelined(path_to_tar, model, output_path, decode_workers=2, inference_workers=1,
+                          encode_workers=2, queue_size=8, batch_size=4, resume=False, should_stop=None):
+    """
+    Upscale every image member of path_to_tar into output_path with overlapping stages.
+    batch_size: members handed to inference together; same-sized ones among them run
+    as one model.predict_batch call.
+    resume: continue a partly written output_path left by an interrupted run of the same
+    source and model settings (checked against its manifest); otherwise it is overwritten.
+    should_stop: optional callable checked between members, raises to abort; queued
+    members are dropped and the partial archive is removed.
+    Returns per-stage throughput statistics.
+    """
+    skip, resume_offset = set(), 0
+    if resume:
+        manifest = run_manifest(path_to_tar, model)
+        skip, resume_offset = resumable_members(output_path, manifest)
+    if skip:
+        # drop the partial member, re-terminate the archive and append after the last good one
+        with open(output_path, 'r+b') as f:
+            f.truncate(resume_offset)
+            f.seek(resume_offset)
+            f.write(b'\0' * 2 * _BLOCK)
+        save_tar = tarfile.open(output_path, 'a')
+        print(f'Resuming {output_path}: {len(skip)} member(s) already done')
+    else:
+        save_tar = tarfile.open(output_path, 'w')
+        if resume:
+            _write_manifest(output_path, manifest)
+        else:
+            _remove_manifest(output_path)
+
+    stats = {name: StageStats(name) for name in ("decode", "inference", "encode", "write")}
+    decode = stats["decode"].timed(_decode)
+    infer = stats["inference"].timed(lambda group: _infer_group(group, model), count=len)
+    encode = stats["encode"].timed(lambda pair: image_to_tar_format(pair[1], pair[0]))
+    def add_member(info_fp):
+        info, fp = info_fp
+        with fp:
+            save_tar.addfile(info, fp)
+
+    write = stats["write"].timed(add_member)
+
+    decode_pool = ThreadPoolExecutor(decode_workers, thread_name_prefix="tar-decode")
+    infer_pool = ThreadPoolExecutor(inference_workers, thread_name_prefix="tar-infer")
+    encode_pool = ThreadPoolExecutor(encode_workers, thread_name_prefix="tar-encode")
+    inflight = deque()
+    # decoded members waiting to be handed to inference as one group
+    group = []
+
+    def submit_group():
+        if group:
+            infer_pool.submit(infer, list(group))
+            group.clear()
+
+    def write_next():
+        # the oldest member may still be waiting for its group to fill
+        submit_group()
+        name, future = inflight.popleft()
+        try:
+            write(future.result())
+        except Exception as err:
+            print(f'Unable to process file {name}, skipping ({err})')
+
+    start = time.perf_counter()
+    cancelled = False
+    try:
+        with tarfile.open(path_to_tar, mode='r') as processing_tar:
+            for c, item in enumerate(processing_tar):
+                if should_stop is not None:
+                    should_stop()
+                # iterate through the archive, skip members that cannot be processed or are already done
+                if not item.name.endswith(IMAGE_FORMATS) or item.name in skip:
+                    continue
+                print(f'{c}, processing {item.name}')
+
+                # tarfile is not thread safe, so raw bytes are read here and decoded on the pool
+                raw = processing_tar.extractfile(item).read()
+                decoded = decode_pool.submit(decode, raw)
+                upscaled = Future()
+                group.append((decoded, upscaled))
+                if len(group) >= batch_size:
+                    submit_group()
+                encoded = _then(upscaled, encode_pool, lambda img, name=item.name: encode((name, img)))
+                inflight.append((item.name, encoded))
+
+                # bounded window: wait for the oldest member before reading more
+                while len(inflight) >= queue_size:
+                    write_next()
+
+            while inflight:
+                if should_stop is not None:
+                    should_stop()
+                write_next()
+    except JobCancelledError:
+        cancelled = True
+        raise
+    finally:
+        for pool in (decode_pool, infer_pool, encode_pool):
+            pool.shutdown(wait=True, cancel_futures=cancelled)
+        save_tar.close()
+        if cancelled:
+            os.unlink(output_path)
+            _remove_manifest(output_path)
+            print(f'Cancelled, removed partial archive {output_path}')
+    # complete, nothing left to resume
+    _remove_manifest(output_path)
+
+    wall = time.perf_counter() - start
+    workers = {"decode": decode_workers, "inference": inference_workers, "encode": encode_workers, "write": 1}
+    report = [stats[name].report(wall, workers[name]) for name in stats]
+    for line in report:
+        print(f"  {line['stage']:<10} {line['items']:>5} items  {line['items_per_second']:>7.2f}/s  "
+              f"utilisation {line['utilisation']:.0%}")
+    print(f'Finished! Archive saved to {output_path}')
+    return {"wall_seconds": round(wall, 3), "stages": report}
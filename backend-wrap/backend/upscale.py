@@ -6,15 +6,22 @@ Includes methods for command line usage
 """
 
 import asyncio
+import threading
 from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from PIL import Image
 import numpy as np
-import io
 import tarfile
+import tempfile
 import sys
 import os
 from io import BytesIO
-from .util_file import import_model
+from .scheduler import JobCancelledError
+from .alpha import ALPHA_STRATEGIES, uniform_value, resize_alpha, guided_upscale_alpha
+from .cpu_modes import parse_cpu_modes
+from .quantize import PRECISIONS
+from .backends import BACKENDS, create_backend, select_device
+from .image_array import to_array, to_image
 
 #TODO: ADD UI TOGGLE OPTION FOR RESAMPLING MODE IN OUTPUT FILENAME
 #TODO: Fix special character filename wierdness. 
@@ -26,37 +33,93 @@ WEIGHTS_DIR = "weights"
 # Accepted image formats for the model
 IMAGE_FORMATS = ('.png', '.jpg', '.jpeg', '.tiff', '.bmp', '.gif')
 
-class ModelManager:
+
+class ResampleModeLock:
+    """
+    Shared access to a network in one resample mode at a time.
+    Any number of predictions in the active mode run together; a request for another
+    mode waits until they are done, switches the mode and is then shared the same way.
+    While a switch waits, new requests for the active mode queue behind it so it cannot starve.
+    """
+
     def __init__(self):
+        self._cond = threading.Condition()
+        self._mode = None
+        self._active = 0
+        self._switches_waiting = 0
+
+    def acquire(self, mode, switch):
+        """Wait for mode to be usable; switch(mode) applies it to the model when the lock is free"""
+        with self._cond:
+            waiting = False
+            while not (self._active == 0 or (mode == self._mode and not self._switches_waiting)):
+                if not waiting and mode != self._mode:
+                    waiting = True
+                    self._switches_waiting += 1
+                self._cond.wait()
+            if waiting:
+                self._switches_waiting -= 1
+            if self._active == 0:
+                # the model may have been reloaded since, so let switch compare with it
+                switch(mode)
+                self._mode = mode
+            self._active += 1
+
+    def release(self):
+        with self._cond:
+            self._active -= 1
+            if self._active == 0:
+                self._cond.notify_all()
+
+
+class ModelManager:
+    def __init__(self, cpu_modes=(), precision="fp32", calibration_dir=None, backend="torch", backend_options=None):
+        if precision not in PRECISIONS:
+            raise ValueError(f"Unknown precision '{precision}'. Must be one of {PRECISIONS}")
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown inference backend '{backend}'. Must be one of {BACKENDS}")
+        if backend == "onnx" and precision != "fp32":
+            raise ValueError(f"The onnx backend only runs fp32 weights, not {precision}")
+        # Loaded inference backend (see backends.py), None until initialize_model()
         self.model = None
         self.current_scale = None
         self.current_resample_mode = None
-        self.device = None
+        # Default alpha strategy for RGBA inputs, see alpha.ALPHA_STRATEGIES
+        self.alpha_strategy = 'network'
+        # Guards loading and unloading the network
+        self._lock = threading.RLock()
+        # Lets requests share the network: same-mode predictions run concurrently,
+        # a different resample mode (which lives on the model) waits for exclusive access
+        self._mode_lock = ResampleModeLock()
+        # CPU execution modes requested (see cpu_modes.CPU_MODES), torch backend only
+        self.cpu_modes = parse_cpu_modes(cpu_modes)
+        # fp32 weights, or the int8 variant (CPU only) built from them with calibration_dir images
+        self.precision = precision
+        self.calibration_dir = calibration_dir
+        # "torch" or "onnx"; backend_options are passed on, e.g. the ONNX Runtime thread counts
+        self.backend = backend
+        self.backend_options = backend_options or {}
         #self._executor = ThreadPoolExecutor(max_workers=2)  # Limit concurrent predictions
-        
+
+    @property
+    def device(self):
+        return self.model.device if self.model is not None else None
+
+    @property
+    def active_cpu_modes(self):
+        """CPU modes active on the loaded model"""
+        return self.model.active_cpu_modes if self.model is not None else ()
     
     def initialize_model(self, scale="2", use_attention=False, resample_mode='bicubic'):
-        # Check if we need to reinitialize due to different parameters
-        needs_reinit = (
-            self.model is None or 
-            self.current_scale != scale or 
-            self.current_resample_mode != resample_mode
-        )
+        # Resample mode only changes the upsampling step, so a different mode
+        # on an already loaded scale is switched in place instead of reloading
+        if self.model is not None and self.current_scale == scale:
+            if self.current_resample_mode != resample_mode:
+                self.update_resample_mode(resample_mode)
+            return  # Already initialized with correct weights
         
-        if not needs_reinit:
-            return  # Already initialized with correct parameters
-            
-        import torch
-        import_model()
-        
-        from RealESRGAN import RealESRGAN # type: ignore
-        
-        print(f'Initializing model with scale x{scale}, resample mode: {resample_mode}...')
-        if torch.backends.mps.is_available():
-            self.device = torch.device("mps")
-        else:
-            self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
-        print('Device:', self.device)
+        print(f'Initializing model with scale x{scale}, resample mode: {resample_mode}, '
+              f'precision: {self.precision}, backend: {self.backend}...')
         
         # Ensure weights directory exists
         os.makedirs(WEIGHTS_DIR, mode=0o755, exist_ok=True)
@@ -64,13 +127,32 @@ class ModelManager:
         weights_path = self._get_weights_path(scale)
         
         # Load model
-        self.model = RealESRGAN(self.device, scale=int(scale), use_attention=use_attention, resample_mode=resample_mode)
-        self.model.load_weights(weights_path)
+        model = create_backend(self.backend, cpu_modes=self.cpu_modes, precision=self.precision,
+                               calibration_dir=self.calibration_dir, **self.backend_options)
+        model.load(weights_path, scale, resample_mode, use_attention)
+        self.model = model
         self.current_scale = scale
         self.current_resample_mode = resample_mode
         
         print(f"Model loaded with scale x{scale}, resample mode: {resample_mode}")
     
+    def memory_bytes(self):
+        """Approximate resident size of the loaded weights in bytes"""
+        if self.model is None:
+            return 0
+        return self.model.memory_bytes()
+
+    def unload(self):
+        """Free the weights and any cached device memory"""
+        with self._lock:
+            if self.model is None:
+                return
+            model = self.model
+            self.model = None
+            self.current_scale = None
+            self.current_resample_mode = None
+        model.unload()
+
     def _get_weights_path(self, scale):
         """Get the path where weights should be stored"""
         return os.path.join(WEIGHTS_DIR, f"RealESRGAN_x{scale}.pth")
@@ -78,76 +160,111 @@ class ModelManager:
     def update_resample_mode(self, resample_mode):
         """Update resample mode without reinitializing the entire model"""
         if self.model is not None:
-            self.model.set_resample_mode(resample_mode)
-            self.current_resample_mode = resample_mode
+            with self._lock:
+                self.model.set_resample_mode(resample_mode)
+                self.current_resample_mode = resample_mode
         else:
             print("Model not initialized. Call initialize_model() first.")
+
+    @contextmanager
+    def using_resample_mode(self, resample_mode):
+        """
+        Hold the model with the given resample mode applied.
+        Requests in the same mode share the block; another mode cannot switch the
+        model until every prediction in the block has finished.
+        """
+        self._mode_lock.acquire(resample_mode or self.current_resample_mode, self._switch_resample_mode)
+        try:
+            yield self
+        finally:
+            self._mode_lock.release()
+
+    def _switch_resample_mode(self, resample_mode):
+        if resample_mode != self.current_resample_mode:
+            self.update_resample_mode(resample_mode)
     
     def get_available_resample_modes(self):
         """Get list of available resample modes"""
         return ['nearest', 'linear', 'bilinear', 'bicubic', 'trilinear', 'area', 'nearest-exact']
     
     
-    def predict(self, image_input):
+    def predict(self, image_input, alpha_strategy=None):
+        """Upscale an RGB or RGBA image (PIL or array), returns a uint8 array with the same channels"""
         if self.model is None:
             raise RuntimeError("Model not initialized. Call initialize_model() first.")
         
-        # Convert PIL Image to numpy array if needed
-        if isinstance(image_input, Image.Image):
-            image_array = np.array(image_input)
-        else:
-            image_array = image_input
+        image_array = to_array(image_input)
         
         # Handle different image modes
-        if len(image_array.shape) == 3 and image_array.shape[2] == 4:
+        if image_array.shape[2] == 4:
             # RGBA image - process RGB and Alpha separately
-            return self._predict_rgba(image_array)
+            return self._predict_rgba(image_array, alpha_strategy)
         else:
             # RGB image - process normally
             return self.model.predict(image_array)
     
-    def _predict_rgba(self, rgba_array):
+    def predict_batch(self, images):
+        """
+        Upscale several same-sized RGB uint8 arrays, in one forward pass where the
+        backend supports it. Returns a list of uint8 arrays.
+        """
+        if self.model is None:
+            raise RuntimeError("Model not initialized. Call initialize_model() first.")
+        return self.model.predict_batch(images)
+
+    def _upscale_alpha(self, alpha_array, upscaled_rgb, alpha_strategy=None, out=None):
+        """
+        Upscale the alpha channel to the size of upscaled_rgb (only its first three channels are read).
+        Uniform alpha is filled directly; otherwise alpha_strategy picks between the
+        full network pass and the cheaper classical paths in alpha.py
+        - out: optional HxW uint8 array the alpha is written into, e.g. the alpha plane of the output
+        """
+        strategy = alpha_strategy or self.alpha_strategy
+        if strategy not in ALPHA_STRATEGIES:
+            raise ValueError(f"Unknown alpha strategy '{strategy}'. Must be one of {ALPHA_STRATEGIES}")
+        out_h, out_w = upscaled_rgb.shape[:2]
+        if out is None:
+            out = np.empty((out_h, out_w), dtype=np.uint8)
+
+        constant = uniform_value(alpha_array)
+        if constant is not None:
+            out.fill(constant)
+        elif strategy == 'resize':
+            out[...] = resize_alpha(alpha_array, (out_w, out_h), self.current_resample_mode)
+        elif strategy == 'guided':
+            out[...] = guided_upscale_alpha(alpha_array, upscaled_rgb, self.current_resample_mode)
+        else:
+            # Upscale Alpha (convert to 3-channel temporarily, at input size)
+            alpha_3ch = np.repeat(alpha_array[:, :, None], 3, axis=2)
+            out[...] = self.model.predict(lr_image=alpha_3ch)[:, :, 0]
+        return out
+
+    def _merge_alpha(self, upscaled_rgb, alpha_array, alpha_strategy=None):
+        """Upscaled RGB + input alpha -> RGBA, both written in place into one preallocated array"""
+        rgba = np.empty(upscaled_rgb.shape[:2] + (4,), dtype=np.uint8)
+        rgba[:, :, :3] = upscaled_rgb
+        # the guided strategy reads the RGB back from the output, no separate copy is kept
+        self._upscale_alpha(alpha_array, rgba, alpha_strategy, out=rgba[:, :, 3])
+        return rgba
+
+    def _predict_rgba(self, rgba_array, alpha_strategy=None):
         """Handle RGBA images by processing RGB and Alpha separately"""
-        # Separate channels
-        rgb_array = rgba_array[:, :, :3]
-        alpha_array = rgba_array[:, :, 3]
-        
-        # Upscale RGB
-        upscaled_rgb = self.model.predict(lr_image=rgb_array)
-        upscaled_rgb = np.array(upscaled_rgb)
-        
-        # Upscale Alpha (convert to 3-channel temporarily)
-        alpha_3ch = np.stack([alpha_array, alpha_array, alpha_array], axis=-1)
-        upscaled_alpha_3ch = self.model.predict(lr_image=alpha_3ch)
-        upscaled_alpha = np.array(upscaled_alpha_3ch)[:, :, 0]
-        
-        # Combine results
-        upscaled_rgba = np.dstack([
-            upscaled_rgb[:, :, 0],
-            upscaled_rgb[:, :, 1], 
-            upscaled_rgb[:, :, 2],
-            upscaled_alpha
-        ])
-        
-        return Image.fromarray(upscaled_rgba.astype(np.uint8), 'RGBA')
+        upscaled_rgb = self.model.predict(lr_image=rgba_array[:, :, :3])
+        return self._merge_alpha(upscaled_rgb, rgba_array[:, :, 3], alpha_strategy)
     
-    async def predict_with_progress(self, image_input, progress_callback=None):
+    async def predict_with_progress(self, image_input, progress_callback=None, alpha_strategy=None):
         """Predict with progress tracking"""
         if self.model is None:
             raise RuntimeError("Model not initialized. Call initialize_model() first.")
         
-        # Convert PIL Image to numpy array if needed
-        if isinstance(image_input, Image.Image):
-            image_array = np.array(image_input)
-        else:
-            image_array = image_input
+        image_array = to_array(image_input)
         
         if progress_callback:
             await progress_callback(0.1, "Starting prediction...")
         
         # Check if RGBA
-        if len(image_array.shape) == 3 and image_array.shape[2] == 4:
-            return await self._predict_rgba_with_progress(image_array, progress_callback)
+        if image_array.shape[2] == 4:
+            return await self._predict_rgba_with_progress(image_array, progress_callback, alpha_strategy)
         else:
             # Run heavy computation in thread pool
             """ loop = asyncio.get_event_loop()
@@ -158,12 +275,8 @@ class ModelManager:
             result = await self.model.predict_with_progress(lr_image=image_array, progress_callback=progress_callback)
             return result
         
-    async def _predict_rgba_with_progress(self, rgba_array, progress_callback):
+    async def _predict_rgba_with_progress(self, rgba_array, progress_callback, alpha_strategy=None):
         """Handle RGBA with progress tracking"""
-        # Separate channels
-        rgb_array = rgba_array[:, :, :3]
-        alpha_array = rgba_array[:, :, 3].copy()
-        
         # Update progress
         if progress_callback:
             await progress_callback(0.2, "Processing RGB channels...")
@@ -174,36 +287,18 @@ class ModelManager:
             self._executor,
             self.model.predict_with_progress(lr_image=rgb_array, progress_callback=progress_callback)
         ) """
-        upscaled_rgb = await self.model.predict_with_progress(lr_image=rgb_array, progress_callback=progress_callback)
-        upscaled_rgb = np.array(upscaled_rgb)
+        upscaled_rgb = await self.model.predict_with_progress(lr_image=rgba_array[:, :, :3],
+                                                              progress_callback=progress_callback)
         
         if progress_callback:
             await progress_callback(0.8, "Processing alpha channel...")
         
-        # Upscale Alpha
-        alpha_3ch = np.stack([alpha_array, alpha_array, alpha_array], axis=-1)
-        """ upscaled_alpha_3ch = await loop.run_in_executor(
-            self._executor,
-            self.model.predict(lr_image=alpha_3ch)
-        ) """
-        upscaled_alpha_3ch = self.model.predict(lr_image=alpha_3ch)
-        upscaled_alpha = np.array(upscaled_alpha_3ch)[:, :, 0]
-        
-        if progress_callback:
-            await progress_callback(0.9, "Combining channels...")
-        
-        # Combine results
-        upscaled_rgba = np.dstack([
-            upscaled_rgb[:, :, 0],
-            upscaled_rgb[:, :, 1],
-            upscaled_rgb[:, :, 2],
-            upscaled_alpha
-        ])
+        upscaled_rgba = self._merge_alpha(upscaled_rgb, rgba_array[:, :, 3], alpha_strategy)
         
         if progress_callback:
             await progress_callback(1.0, "RGBA Processing Complete!")
         
-        return Image.fromarray(upscaled_rgba.astype(np.uint8), 'RGBA')
+        return upscaled_rgba
     
 def upscale(img_input, model, output_path=None):
     """
@@ -216,13 +311,10 @@ def upscale(img_input, model, output_path=None):
     Returns:
         PIL Image if output_path is None, otherwise saves to file
     """
-    # TODO: Remove model data from device after afk
     if isinstance(img_input, str):
-        img_base = Image.open(img_input).convert('RGB')
-    else:
-        img_base = img_input.convert('RGB') if img_input.mode != 'RGB' else img_input
+        img_input = Image.open(img_input)
         
-    img_up = model.predict(np.array(img_base))
+    img_up = to_image(model.predict(to_array(img_input, 'RGB')))
     
     if output_path:
         img_up.save(output_path)
@@ -235,7 +327,13 @@ def upscale(img_input, model, output_path=None):
 #######################################################################
 ## Input Processing 
 
-def process_input(filename, model, output_path=None):
+def process_input(filename, model, output_path=None, pipelined=True, resume=False, should_stop=None):
+    """
+    Upscale a single image or every image in a tar archive.
+    pipelined: overlap decode, inference and encode for archives (see tar_pipeline.py)
+    resume: continue the output archive of an interrupted pipelined run of the same archive
+    should_stop: optional callable checked between archive members, raises to abort
+    """
     
     # TODO: Allow user selection of output directory (default to image directory)
     output_folder = os.path.dirname(filename)
@@ -246,7 +344,11 @@ def process_input(filename, model, output_path=None):
         if output_path is None:
             result_image_path = os.path.join(output_folder, 'results', os.path.basename(filename))
             os.makedirs(os.path.join(output_folder, 'results'), mode=0o755, exist_ok=True)
-        process_tar(filename, model, result_image_path)
+        if pipelined:
+            from .tar_pipeline import process_tar_pipelined
+            process_tar_pipelined(filename, model, result_image_path, resume=resume, should_stop=should_stop)
+        else:
+            process_tar(filename, model, result_image_path, should_stop=should_stop)
         
     else:
         os.makedirs(os.path.join(output_folder), mode=0o755, exist_ok=True)
@@ -256,51 +358,114 @@ def process_input(filename, model, output_path=None):
         upscale(filename, model, result_image_path)
 
 
-def process_tar(path_to_tar, model, output_path):
+def process_tar(path_to_tar, model, output_path, batch_size=4, should_stop=None):
     processing_tar = tarfile.open(path_to_tar, mode='r')
     save_tar = tarfile.open(output_path, 'w')
 
-    for c, item in enumerate(processing_tar):
-        
-        print(f'{c}, processing {item.name}')
-        # iterate through the archive, skip memeber that cannot be processed
-        if not item.name.endswith(IMAGE_FORMATS):
+    # decoded members wait here so same-sized ones can share a forward pass
+    pending = []
+
+    def flush():
+        for name, img_up in _upscale_members(pending, model):
+            try:
+                # adding to new tar archive
+                img_tar_info, fp = image_to_tar_format(img_up, name)
+                with fp:
+                    save_tar.addfile(img_tar_info, fp)
+            except Exception as err:
+                print(f'Unable to process file {name}, skipping')
+        pending.clear()
+
+    try:
+        for c, item in enumerate(processing_tar):
+            if should_stop is not None:
+                should_stop()
+            
+            print(f'{c}, processing {item.name}')
+            # iterate through the archive, skip memeber that cannot be processed
+            if not item.name.endswith(IMAGE_FORMATS):
+                continue
+
+            try:
+                # extract current item as bytestream, read bytes then load into memory buff (bytesio)
+                img_bytes = BytesIO(processing_tar.extractfile(item.name).read())
+                img_base = Image.open(img_bytes, mode='r').convert('RGB')
+                pending.append((item.name, img_base))
+            except Exception as err:
+                print(f'Unable to process file {item.name}, skipping')
+                continue
+
+            if len(pending) >= batch_size:
+                flush()
+
+        flush()
+    except JobCancelledError:
+        # a cancelled run leaves no partial archive behind
+        save_tar.close()
+        os.unlink(output_path)
+        print(f'Cancelled, removed partial archive {output_path}')
+        raise
+    finally:
+        processing_tar.close()
+        save_tar.close()
+    print(f'Finished! Archive saved to {output_path}')
+
+def _upscale_members(members, model):
+    """
+    Upscale (name, PIL image) pairs, running same-sized images as one batch.
+    Yields (name, upscaled PIL image) in the original order, None for failures.
+    """
+    results = upscale_batch([img for _, img in members], model)
+    for (name, _), img_up in zip(members, results):
+        if img_up is None:
+            print(f'Unable to process file {name}, skipping')
             continue
+        yield name, img_up
 
+def upscale_batch(images, model):
+    """
+    Upscale PIL images, running same-sized ones through model.predict_batch in one pass.
+    Returns the upscaled PIL images in the original order, None for failures.
+    """
+    results = [None] * len(images)
+    by_size = {}
+    for i, img in enumerate(images):
+        by_size.setdefault(img.size, []).append(i)
+
+    for indices in by_size.values():
         try:
-            # extract current item as bytestream, read bytes then load into memory buff (bytesio)
-            img_bytes = BytesIO(processing_tar.extractfile(item.name).read())
-            img_base = Image.open(img_bytes, mode='r').convert('RGB')
-        
-            img_up = upscale(img_base, model)
-            
-            # adding to new tar archive
-            img_tar_info, fp = image_to_tar_format(img_up, item.name)
-            save_tar.addfile(img_tar_info, fp)
+            if len(indices) > 1 and hasattr(model, 'predict_batch'):
+                outputs = model.predict_batch([to_array(images[i], 'RGB') for i in indices])
+                for i, out in zip(indices, outputs):
+                    results[i] = to_image(out)
+            else:
+                for i in indices:
+                    results[i] = upscale(images[i], model)
         except Exception as err:
-            print(f'Unable to process file {item.name}, skipping')
-            continue
+            print(f'Batch of {len(indices)} image(s) failed ({err}), retrying one by one')
+            for i in indices:
+                try:
+                    results[i] = upscale(images[i], model)
+                except Exception:
+                    results[i] = None
+    return results
 
-    processing_tar.close()
-    save_tar.close()
-    print(f'Finished! Archive saved to {output_path}')
+# Encoded members larger than this are spooled to a temporary file instead of RAM
+TAR_SPOOL_MAX_BYTES = 16 * 1024 * 1024
 
 # Saves the upscaled image to a buffer in a compatible format
-# Rerturns img tar info and buffered file pointer
-def image_to_tar_format(img, image_name):
-    buff = BytesIO()
+# Rerturns img tar info and file pointer, the caller closes fp after adding it
+def image_to_tar_format(img, image_name, spool_max_bytes=TAR_SPOOL_MAX_BYTES):
+    buff = tempfile.SpooledTemporaryFile(max_size=spool_max_bytes)
     if '.png' in image_name.lower():
-        img = img.convert('RGBA')
+        # PNG stores RGB, RGBA and greyscale as they are
         img.save(buff, format='PNG')
     else:
+        if img.mode not in ('RGB', 'L'):
+            img = img.convert('RGB')
         img.save(buff, format='JPEG')
-    buff.seek(0)
-    fp = io.BufferedReader(buff)
+    # the write position is the encoded size, no copy of the buffer needed
     img_tar_info = tarfile.TarInfo(name=image_name)
-    img_tar_info.size = len(buff.getvalue())
-    return img_tar_info, fp
-
-
-    
-    
-    
+    img_tar_info.size = buff.tell()
+    buff.seek(0)
+    return img_tar_info, buff
@@ -1,32 +1,209 @@
 import sys
+import tarfile
+import tempfile
+import zipfile
 import numpy as np
 from PIL import Image
 import os
-from io import BytesIO
 
 # Accepted image formats for the model
 IMAGE_FORMATS = ('.png', '.jpg', '.jpeg', '.tiff', '.bmp', '.gif')
 
 
-async def process_byte_input(uploaded_file):
+# Uploads are read in chunks of this size, and kept in memory up to UPLOAD_SPOOL_BYTES
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+UPLOAD_SPOOL_BYTES = 16 * 1024 * 1024
+
+
+class ImageTooLargeError(ValueError):
+    """Image dimensions exceed the configured pixel limit"""
+
+    def __init__(self, width, height, max_pixels):
+        super().__init__(f"Image is {width}x{height} ({width * height} pixels), the limit is {max_pixels} pixels")
+        self.width = width
+        self.height = height
+        self.max_pixels = max_pixels
+
+
+class BatchTooLargeError(ValueError):
+    """A batch upload has more images, pixels or bytes in total than allowed"""
+
+
+class FileTooLargeError(ValueError):
+    """An uploaded file or archive member is larger than allowed"""
+
+
+def _open_lazy(fp, max_pixels=0, max_decode_pixels=0):
+    """Open an image from its header only, applying the draft size and the pixel limit"""
+    image = Image.open(fp)
+    width, height = image.size
+    if max_decode_pixels and image.format == 'JPEG' and width * height > max_decode_pixels:
+        reduce = 1
+        while reduce < 8 and (width // reduce) * (height // reduce) > max_decode_pixels:
+            reduce *= 2
+        image.draft(None, (width // reduce, height // reduce))
+        width, height = image.size
+    if max_pixels and width * height > max_pixels:
+        raise ImageTooLargeError(width, height, max_pixels)
+    return image
+
+
+def _target_mode(image):
+    """RGBA for images with transparency, RGB for everything else"""
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        return 'RGBA'
+    return 'RGB'
+
+
+def probe_image(fp, max_pixels=0, max_decode_pixels=0):
     """
-    Process an uploaded file (in bytes) and return a PIL Image.
-    Preserves transparency
+    (height, width, channels) that open_image will decode to, read from the header only.
+    fp is rewound afterwards so it can be decoded next.
     """
-    if uploaded_file is not None:
-        # Convert UploadedFile to PIL Image
-        file_content = await uploaded_file.read()
-        image = Image.open(BytesIO(file_content))
-        
-        # Check transparency and convert if necessary
-        if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
-            image = image.convert('RGBA')
-        else:
-            # Convert to RGB for non-transparent images
-            image = image.convert('RGB')
-        return image
+    position = fp.tell()
+    try:
+        image = _open_lazy(fp, max_pixels, max_decode_pixels)
+        return image.height, image.width, len(_target_mode(image))
+    finally:
+        fp.seek(position)
+
+
+def open_image(fp, max_pixels=0, max_decode_pixels=0):
+    """
+    Decode an image from a path or binary file object.
+    Preserves transparency (RGBA), everything else is converted to RGB
+    - max_pixels: reject larger images from the header alone, before decoding (0 = no limit)
+    - max_decode_pixels: JPEGs larger than this are decoded at 1/2, 1/4 or 1/8 size
+      in draft mode when the output does not need the full resolution (0 = full size)
+    """
+    # only reads the header, pixel data is decoded on convert/load
+    image = _open_lazy(fp, max_pixels, max_decode_pixels)
+    target_mode = _target_mode(image)
+    if image.mode == target_mode:
+        # skip the copy convert() would make
+        image.load()
     else:
-        raise ValueError("No file uploaded or file is empty.")
+        image = image.convert(target_mode)
+    return image
+
+
+async def spool_upload(uploaded_file, chunk_size=UPLOAD_CHUNK_SIZE):
+    """
+    Binary file object holding the upload, positioned at its start.
+    Multipart uploads are already spooled to a temp file by the server and used as is,
+    other streams are copied chunk by chunk into a SpooledTemporaryFile.
+    """
+    fp = getattr(uploaded_file, 'file', None)
+    if fp is not None and fp.seekable():
+        fp.seek(0)
+        return fp
+    spool = tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_BYTES)
+    while True:
+        chunk = await uploaded_file.read(chunk_size)
+        if not chunk:
+            break
+        spool.write(chunk)
+    spool.seek(0)
+    return spool
+
+
+def is_archive(fileobj):
+    """True for tar or zip uploads (checked by content, not by name)"""
+    position = fileobj.tell()
+    try:
+        if zipfile.is_zipfile(fileobj):
+            return True
+        fileobj.seek(position)
+        try:
+            with tarfile.open(fileobj=fileobj, mode='r'):
+                return True
+        except tarfile.TarError:
+            return False
+    finally:
+        fileobj.seek(position)
+
+
+def iter_archive_members(fileobj):
+    """
+    Yield (member name, binary file object, size) for every image member of a tar or zip file object,
+    size being the uncompressed size recorded in the archive.
+    Members are read straight from the archive; each file object is only valid until the next one.
+    """
+    if zipfile.is_zipfile(fileobj):
+        fileobj.seek(0)
+        with zipfile.ZipFile(fileobj) as archive:
+            for info in archive.infolist():
+                if info.is_dir() or not info.filename.lower().endswith(IMAGE_FORMATS):
+                    continue
+                with archive.open(info) as member:
+                    yield info.filename, member, info.file_size
+        return
+
+    fileobj.seek(0)
+    with tarfile.open(fileobj=fileobj, mode='r') as archive:
+        for member in archive:
+            if not member.isfile() or not member.name.lower().endswith(IMAGE_FORMATS):
+                continue
+            yield member.name, archive.extractfile(member), member.size
+
+
+def copy_limited(src, dest, max_bytes=0, chunk_size=UPLOAD_CHUNK_SIZE):
+    """
+    Copy src to dest chunk by chunk and return the bytes copied.
+    Raises FileTooLargeError as soon as more than max_bytes (when > 0) were read.
+    """
+    copied = 0
+    while True:
+        chunk = src.read(chunk_size)
+        if not chunk:
+            return copied
+        copied += len(chunk)
+        if max_bytes and copied > max_bytes:
+            raise FileTooLargeError(f"File is larger than {max_bytes} bytes")
+        dest.write(chunk)
+
+
+def unique_name(name, used):
+    """name, or name with a numeric suffix if it is already in the set `used` (which is updated)"""
+    candidate, n = name, 1
+    root, ext = os.path.splitext(name)
+    while candidate in used:
+        candidate = f"{root}_{n}{ext}"
+        n += 1
+    used.add(candidate)
+    return candidate
+
+
+def stream_tar(entries, chunk_size=1024 * 1024):
+    """
+    Generate a tar archive of (archive name, file path) entries chunk by chunk,
+    without building the archive on disk or in memory. Missing files are skipped.
+    """
+    used = set()
+    for arcname, path in entries:
+        try:
+            f = open(path, 'rb')
+        except OSError:
+            continue
+        with f:
+            stat = os.fstat(f.fileno())
+            info = tarfile.TarInfo(name=unique_name(arcname, used))
+            info.size = stat.st_size
+            info.mtime = int(stat.st_mtime)
+            yield info.tobuf(format=tarfile.PAX_FORMAT)
+            remaining = info.size
+            while remaining > 0:
+                chunk = f.read(min(chunk_size, remaining))
+                if not chunk:
+                    raise IOError(f"{path} shrank while it was being archived")
+                remaining -= len(chunk)
+                yield chunk
+            padding = -info.size % tarfile.BLOCKSIZE
+            if padding:
+                yield b'\0' * padding
+    # end of archive marker
+    yield b'\0' * 2 * tarfile.BLOCKSIZE
+
 
 # Generate output filename        
 def generate_filename(filename, scale_list, resample_mode):
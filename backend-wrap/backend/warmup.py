@@ -0,0 +1,98 @@
+"""
+# warmup.py
+Model preloading at server startup.
+The networks for the configured scales are loaded and run once on a small blank image
+in the background, so the first real request does not pay for importing torch,
+loading weights and first-pass kernel setup. New jobs wait until warmup has finished
+and the readiness endpoint reports its progress.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Callable, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ModelWarmup:
+    """
+    - scales: scales to preload, in order (none = ready right away)
+    - warm(scale): blocking call that loads the network for a scale and runs one forward pass
+    A scale that fails to warm up is reported but does not block admission, its jobs load
+    the network on first use as before.
+    """
+
+    def __init__(self, scales: Iterable[str], warm: Callable[[str], None]):
+        self.scales = list(scales)
+        self.warm = warm
+        self.status = "warming" if self.scales else "ready"
+        self.results: Dict[str, dict] = {}
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._done: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        """Start warming up on the running loop; returns at once so the server keeps answering"""
+        self._done = asyncio.Event()
+        if not self.scales:
+            self._done.set()
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        self.started_at = time.time()
+        loop = asyncio.get_running_loop()
+        for scale in self.scales:
+            start = time.perf_counter()
+            try:
+                # the loop keeps serving (liveness, readiness) while weights load
+                await loop.run_in_executor(None, self.warm, scale)
+            except Exception as e:
+                logger.error(f"Warmup of x{scale} failed: {e}")
+                self.results[scale] = {"status": "failed", "error": str(e)}
+                continue
+            seconds = time.perf_counter() - start
+            logger.info(f"Warmed up x{scale} in {seconds:.2f}s")
+            self.results[scale] = {"status": "ready", "seconds": round(seconds, 2)}
+        failed = any(r["status"] == "failed" for r in self.results.values())
+        self.status = "failed" if failed else "ready"
+        self.finished_at = time.time()
+        self._done.set()
+
+    async def stop(self):
+        if self._task is not None and not self._task.done():
+            # a scale already loading finishes in its executor thread
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status != "warming"
+
+    async def wait(self, timeout: float) -> bool:
+        """Wait until warmup has finished (successfully or not); False if it is still running after timeout"""
+        if self.finished or self._done is None:
+            return True
+        try:
+            await asyncio.wait_for(self._done.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    def snapshot(self) -> dict:
+        if self.started_at is None:
+            seconds = None
+        else:
+            seconds = round((self.finished_at or time.time()) - self.started_at, 2)
+        return {
+            "status": self.status,
+            "scales": self.scales,
+            "results": dict(self.results),
+            "seconds": seconds,
+        }
@@ -1,3 +1,7 @@
+import multiprocessing
 import runpy
 
-runpy.run_module("backend.api_server", run_name="__main__")
\ No newline at end of file
+# required for the spawn-based inference process pool in frozen (pyinstaller) builds
+multiprocessing.freeze_support()
+
+runpy.run_module("backend.api_server", run_name="__main__")
@@ -0,0 +1,77 @@
+"""
+Benchmark the alpha channel strategies in backend/alpha.py
+
+The input RGBA image is downscaled by --scale to make a low resolution copy, each
+strategy upscales the alpha back and is scored against the original alpha (PSNR).
+Without an input image a synthetic RGBA image with soft and hard edges is used.
+
+    $ python -m benchmarks.alpha_strategies [image.png] [--scale 4] [--repeat 3]
+"""
+
+import argparse
+import time
+
+import numpy as np
+from PIL import Image
+
+from backend.alpha import ALPHA_STRATEGIES, uniform_value
+from backend.upscale import ModelManager
+
+
+def psnr(reference, test):
+    mse = np.mean((reference.astype(np.float64) - test.astype(np.float64)) ** 2)
+    return float('inf') if mse == 0 else 10 * np.log10(255.0 ** 2 / mse)
+
+
+def synthetic_rgba(size=512):
+    yy, xx = np.mgrid[0:size, 0:size]
+    rgb = np.dstack([xx % 256, yy % 256, (xx + yy) % 256]).astype(np.uint8)
+    radius = np.hypot(xx - size / 2, yy - size / 2)
+    alpha = np.clip((size * 0.4 - radius) * 8, 0, 255)   # soft edged disc
+    alpha[:, : size // 8] = 0                            # hard edge
+    return np.dstack([rgb, alpha.astype(np.uint8)])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("image", nargs="?", help="RGBA image (defaults to a synthetic one)")
+    parser.add_argument("--scale", default="4", choices=["2", "4", "8"])
+    parser.add_argument("--resample-mode", default="bicubic")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.image:
+        hr = np.array(Image.open(args.image).convert('RGBA'))
+    else:
+        hr = synthetic_rgba()
+    scale = int(args.scale)
+    h, w = (hr.shape[0] // scale) * scale, (hr.shape[1] // scale) * scale
+    hr = hr[:h, :w]
+    lr = np.array(Image.fromarray(hr, 'RGBA').resize((w // scale, h // scale), Image.BICUBIC))
+
+    manager = ModelManager()
+    manager.initialize_model(scale=args.scale, resample_mode=args.resample_mode)
+    upscaled_rgb = np.array(manager.model.predict(lr_image=lr[:, :, :3]))
+
+    print(f"input {lr.shape[1]}x{lr.shape[0]} -> {upscaled_rgb.shape[1]}x{upscaled_rgb.shape[0]} (x{scale})")
+    print(f"{'strategy':<10} {'mean ms':>10} {'alpha PSNR':>11}")
+    baseline = None
+    for strategy in ALPHA_STRATEGIES:
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            alpha = manager._upscale_alpha(lr[:, :, 3], upscaled_rgb, strategy)
+            timings.append(time.perf_counter() - start)
+        mean_ms = 1000 * sum(timings) / len(timings)
+        baseline = baseline or mean_ms
+        print(f"{strategy:<10} {mean_ms:>10.1f} {psnr(hr[:, :, 3], alpha):>11.2f}   "
+              f"({baseline / mean_ms:.1f}x vs network)")
+
+    opaque = np.full(lr.shape[:2], 255, dtype=np.uint8)
+    start = time.perf_counter()
+    uniform_value(opaque)
+    print(f"uniform alpha check: {1000 * (time.perf_counter() - start):.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Latency and output quality of the CPU execution modes in backend/cpu_modes.py
+
+Each configuration loads the network with its modes, runs one untimed warmup
+prediction (which includes torch.compile when enabled), then --repeat timed ones.
+Outputs are scored against the plain fp32 eager baseline (PSNR; inf = identical).
+Without an input image a synthetic RGB image is used.
+
+    $ python -m benchmarks.cpu_modes [image.png] [--scale 4] [--size 256] [--repeat 5]
+    $ python -m benchmarks.cpu_modes --configs "" channels_last "channels_last,bf16,compile"
+"""
+
+import argparse
+import time
+
+import numpy as np
+from PIL import Image
+
+from backend.cpu_modes import CPU_MODES, bf16_supported
+from backend.upscale import ModelManager
+
+DEFAULT_CONFIGS = ["", *CPU_MODES, ",".join(CPU_MODES)]
+
+
+def psnr(reference, test):
+    mse = np.mean((reference.astype(np.float64) - test.astype(np.float64)) ** 2)
+    return float('inf') if mse == 0 else 10 * np.log10(255.0 ** 2 / mse)
+
+
+def synthetic_rgb(size):
+    yy, xx = np.mgrid[0:size, 0:size]
+    rgb = np.dstack([xx % 256, yy % 256, (xx ^ yy) % 256]).astype(np.uint8)
+    radius = np.hypot(xx - size / 2, yy - size / 2)
+    rgb[radius < size / 4] = (240, 40, 40)   # flat area with a hard edge
+    return rgb
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("image", nargs="?", help="RGB image (defaults to a synthetic one)")
+    parser.add_argument("--scale", default="4", choices=["2", "4", "8"])
+    parser.add_argument("--size", type=int, default=256, help="edge of the (cropped) input")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--configs", nargs="+", default=DEFAULT_CONFIGS,
+                        help="comma separated mode sets to compare, \"\" is the fp32 baseline")
+    args = parser.parse_args()
+
+    if args.image:
+        image = np.array(Image.open(args.image).convert('RGB'))[:args.size, :args.size]
+    else:
+        image = synthetic_rgb(args.size)
+
+    print(f"input {image.shape[1]}x{image.shape[0]}, x{args.scale}, native bf16: {bf16_supported()}")
+    print(f"{'modes':<44} {'active':<44} {'first s':>8} {'median ms':>10} {'speedup':>8} {'PSNR':>7}")
+    baseline_ms, reference = None, None
+    # the fp32 baseline always runs first, it is the PSNR reference
+    for config in [""] + [c for c in args.configs if c]:
+        manager = ModelManager(cpu_modes=config)
+        manager.initialize_model(scale=args.scale)
+        if manager.device.type != 'cpu':
+            print(f"device is {manager.device}, CPU modes are not applied")
+
+        start = time.perf_counter()
+        output = np.asarray(manager.predict(image))
+        first = time.perf_counter() - start
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            manager.predict(image)
+            timings.append(time.perf_counter() - start)
+        median_ms = 1000 * float(np.median(timings))
+
+        if reference is None:
+            reference, baseline_ms = output, median_ms
+        active = ",".join(manager.active_cpu_modes) or "-"
+        print(f"{config or 'fp32 eager':<44} {active:<44} {first:>8.2f} {median_ms:>10.1f} "
+              f"{baseline_ms / median_ms:>7.2f}x {psnr(reference, output):>7.2f}")
+        manager.unload()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Throughput and latency of the CPU profiles (backend/cpu_resources.py)
+
+--jobs copies of the image are upscaled by inference worker threads configured like the
+server's scheduler threads: "latency" runs them one at a time on every core, "throughput"
+runs --workers at once with cores / workers threads each, and "unmanaged" runs --workers
+at once with default thread counts (the oversubscribed baseline).
+Without an input image a synthetic RGB image with gradients, flat areas and edges is used.
+
+    $ python -m benchmarks.cpu_profiles [image.png] [--scale 2] [--jobs 8] [--workers 4] [--pin]
+"""
+
+import argparse
+import threading
+import time
+
+import numpy as np
+from PIL import Image
+
+from backend.cpu_resources import CpuResourceManager, available_cores
+from backend.upscale import ModelManager
+
+
+def synthetic_rgb(size=128):
+    yy, xx = np.mgrid[0:size, 0:size]
+    rgb = np.dstack([xx % 256, yy % 256, (xx ^ yy) % 256]).astype(np.uint8)
+    radius = np.hypot(xx - size / 2, yy - size / 2)
+    rgb[radius < size / 4] = (240, 40, 40)
+    return rgb
+
+
+def run(manager, image, jobs, workers, configure=None):
+    """Run jobs predictions on workers threads; returns (wall seconds, per-job latencies)"""
+    remaining = list(range(jobs))
+    lock = threading.Lock()
+    latencies = []
+
+    def worker(index):
+        if configure is not None:
+            configure(index)
+        while True:
+            with lock:
+                if not remaining:
+                    return
+                remaining.pop()
+            start = time.perf_counter()
+            manager.predict(image)
+            with lock:
+                latencies.append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(workers)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("image", nargs="?", help="RGB image (defaults to a synthetic one)")
+    parser.add_argument("--scale", default="2", choices=["2", "4", "8"])
+    parser.add_argument("--jobs", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--pin", action="store_true", help="pin each worker to its cores")
+    args = parser.parse_args()
+
+    image = np.array(Image.open(args.image).convert('RGB')) if args.image else synthetic_rgb()
+    manager = ModelManager()
+    manager.initialize_model(scale=args.scale)
+    # untimed warmup
+    manager.predict(image)
+
+    print(f"{args.jobs} jobs of {image.shape[1]}x{image.shape[0]} (x{args.scale}) on {len(available_cores())} cores")
+    print(f"{'profile':<11} {'workers':>8} {'threads':>8} {'wall s':>8} {'jobs/s':>8} {'median job ms':>14}")
+    configs = [("unmanaged", args.workers, None, None)]
+    for profile in ("latency", "throughput"):
+        cpu = CpuResourceManager(profile, args.workers, pin=args.pin)
+        configs.append((profile, cpu.workers, cpu.threads_per_worker, cpu.configure_worker))
+    for profile, workers, threads, configure in configs:
+        wall, latencies = run(manager, image, args.jobs, workers, configure)
+        print(f"{profile:<11} {workers:>8} {threads or '-':>8} {wall:>8.2f} {args.jobs / wall:>8.2f} "
+              f"{1000 * float(np.median(latencies)):>14.1f}")
+    manager.unload()
+
+
+if __name__ == "__main__":
+    main()
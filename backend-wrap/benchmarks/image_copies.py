@@ -0,0 +1,207 @@
+"""
+Full-size buffer copies made by the pre/post-processing around the network, legacy vs current.
+
+One RGBA upscale step of upscale_job is replayed stage by stage: handing the decoded
+upload to the pipeline, reading the network output, recombining the alpha channel and
+handing the result to the next scale. The legacy stages are the original np.array /
+np.dstack / astype / Image.fromarray round-trips; the current ones go through
+image_array.py and write RGB and alpha in place into one preallocated RGBA array.
+For every stage the memory it allocates (tracemalloc peak above what was held before)
+is reported in MB and in full-size copies, i.e. RGBA buffers of the size the stage
+works at. Being a peak, a temporary freed before the next buffer is allocated is not
+counted twice. The network is a nearest-neighbour stand-in returning a PIL image like
+the RealESRGAN wrapper, so no weights are needed. PIL's internal image memory is not
+visible to tracemalloc; numpy arrays and bytes are.
+
+    $ python -m benchmarks.image_copies [--size 1024] [--scale 4] [--alpha-strategy resize] [--repeat 5]
+"""
+
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+from PIL import Image
+
+from backend.alpha import ALPHA_STRATEGIES, resize_alpha, guided_upscale_alpha
+from backend.image_array import to_array
+from backend.upscale import ModelManager
+
+
+def synthetic_rgba(size):
+    yy, xx = np.mgrid[0:size, 0:size]
+    rgb = np.dstack([xx % 256, yy % 256, (xx ^ yy) % 256]).astype(np.uint8)
+    radius = np.hypot(xx - size / 2, yy - size / 2)
+    alpha = np.clip(255 - radius * 512 / size, 0, 255).astype(np.uint8)
+    return Image.fromarray(np.dstack([rgb, alpha]), 'RGBA')
+
+
+class StandInNetwork:
+    """
+    Nearest-neighbour upscaler with the RealESRGAN wrapper's interface (PIL output).
+    The output is computed once per input shape and then reused, so the stand-in itself
+    allocates nothing while stages are measured.
+    """
+
+    def __init__(self, scale):
+        self.scale = scale
+        self._outputs = {}
+
+    def predict(self, lr_image):
+        if lr_image.shape not in self._outputs:
+            upscaled = np.ascontiguousarray(lr_image).repeat(self.scale, 0).repeat(self.scale, 1)
+            self._outputs[lr_image.shape] = Image.fromarray(upscaled)
+        return self._outputs[lr_image.shape]
+
+
+class StandInBackend:
+    """The torch backend's handling of the wrapper output, around the stand-in network"""
+
+    def __init__(self, network):
+        self.network = network
+
+    def predict(self, lr_image):
+        return np.asarray(self.network.predict(lr_image))
+
+
+def legacy_upscale_alpha(alpha_array, upscaled_rgb, strategy, network, resample_mode):
+    out_h, out_w = upscaled_rgb.shape[:2]
+    if strategy == 'resize':
+        return resize_alpha(alpha_array, (out_w, out_h), resample_mode)
+    if strategy == 'guided':
+        return guided_upscale_alpha(alpha_array, upscaled_rgb, resample_mode)
+    alpha_3ch = np.stack([alpha_array, alpha_array, alpha_array], axis=-1)
+    return np.array(network.predict(alpha_3ch))[:, :, 0]
+
+
+def legacy_stages(upload, network, strategy, resample_mode):
+    """(name, stage(state), works at output size) of the original code paths"""
+
+    def decode(s):
+        s["img"] = np.array(upload)
+
+    def infer(s):
+        s["rgb"] = network.predict(s["img"][:, :, :3])
+
+    def read(s):
+        s["rgb"] = np.array(s["rgb"])
+
+    def alpha(s):
+        s["alpha"] = legacy_upscale_alpha(s["img"][:, :, 3], s["rgb"], strategy, network, resample_mode)
+
+    def merge(s):
+        rgb = s.pop("rgb")
+        s["rgba"] = np.dstack([rgb[:, :, 0], rgb[:, :, 1], rgb[:, :, 2], s.pop("alpha")])
+
+    def cast(s):
+        s["rgba"] = s["rgba"].astype(np.uint8)
+
+    def wrap(s):
+        s["result"] = Image.fromarray(s.pop("rgba"), 'RGBA')
+
+    def handoff(s):
+        s["next"] = np.array(s.pop("result"))
+
+    return [
+        ("decoded upload -> array", decode, False),
+        ("network (RGB)", infer, True),
+        ("network output -> array", read, True),
+        ("alpha upscale", alpha, True),
+        ("np.dstack recombination", merge, True),
+        (".astype(np.uint8)", cast, True),
+        ("Image.fromarray", wrap, True),
+        ("next scale: np.array", handoff, True),
+    ]
+
+
+def current_stages(upload, network, strategy, resample_mode):
+    """(name, stage(state), works at output size) of the current code paths"""
+    manager = ModelManager()
+    manager.model = StandInBackend(network)
+    manager.current_resample_mode = resample_mode
+
+    def decode(s):
+        s["img"] = to_array(upload)
+
+    def infer(s):
+        s["rgb"] = manager.model.predict(s["img"][:, :, :3])
+
+    def merge(s):
+        s["result"] = manager._merge_alpha(s.pop("rgb"), s["img"][:, :, 3], strategy)
+
+    def handoff(s):
+        # the array is the next scale's input as it is
+        s["next"] = s.pop("result")
+
+    return [
+        ("decoded upload -> array", decode, False),
+        ("network (RGB) -> array", infer, True),
+        ("alpha into preallocated RGBA", merge, True),
+        ("next scale: as is", handoff, True),
+    ]
+
+
+def measure(stages):
+    """Bytes allocated by each stage on top of what the earlier stages hold"""
+    state, allocated = {}, []
+    tracemalloc.start()
+    for _, stage, _ in stages:
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        stage(state)
+        allocated.append(max(0, tracemalloc.get_traced_memory()[1] - before))
+    tracemalloc.stop()
+    return allocated
+
+
+def timed(stages, repeat):
+    timings = []
+    for _ in range(repeat):
+        state = {}
+        start = time.perf_counter()
+        for _, stage, _ in stages:
+            stage(state)
+        timings.append(time.perf_counter() - start)
+    return 1000 * float(np.median(timings))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=1024, help="edge of the RGBA input")
+    parser.add_argument("--scale", type=int, default=4, choices=[2, 4, 8])
+    parser.add_argument("--alpha-strategy", default="resize", choices=ALPHA_STRATEGIES)
+    parser.add_argument("--resample-mode", default="bicubic")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    upload = synthetic_rgba(args.size)
+    network = StandInNetwork(args.scale)
+    # precompute the stand-in outputs (RGB, and the alpha pass of the network strategy)
+    network.predict(np.zeros((args.size, args.size, 3), dtype=np.uint8))
+    in_bytes = args.size * args.size * 4
+    out_bytes = in_bytes * args.scale ** 2
+    print(f"RGBA {args.size}x{args.size} -> {args.size * args.scale}x{args.size * args.scale} "
+          f"(x{args.scale}, alpha: {args.alpha_strategy}), full size RGBA = {out_bytes / 2**20:.1f} MB")
+
+    totals = {}
+    for label, build in (("legacy", legacy_stages), ("current", current_stages)):
+        stages = build(upload, network, args.alpha_strategy, args.resample_mode)
+        allocated = measure(stages)
+        print(f"\n{label} ({timed(stages, args.repeat):.1f} ms median)")
+        print(f"  {'stage':<30} {'MB':>8} {'full-size copies':>17}")
+        copies = 0.0
+        for (name, _, at_output), size in zip(stages, allocated):
+            count = size / (out_bytes if at_output else in_bytes)
+            if at_output:
+                copies += count
+            print(f"  {name:<30} {size / 2**20:>8.1f} {count:>17.2f}")
+        totals[label] = (sum(allocated), copies)
+        print(f"  {'total':<30} {sum(allocated) / 2**20:>8.1f} {copies:>17.2f} at output size")
+
+    saved_bytes = totals["legacy"][0] - totals["current"][0]
+    saved_copies = totals["legacy"][1] - totals["current"][1]
+    print(f"\nsaved per RGBA step: {saved_bytes / 2**20:.1f} MB, {saved_copies:.2f} full-size copies")
+
+
+if __name__ == "__main__":
+    main()
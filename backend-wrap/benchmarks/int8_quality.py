@@ -0,0 +1,85 @@
+"""
+Quality and speed report of the int8 quantized weights against fp32 (backend/quantize.py)
+
+The input image is downscaled by --scale to make a low resolution copy, both variants
+upscale it back and are scored against the original (PSNR), and the int8 output is
+also compared to the fp32 output. Latency is the median of --repeat runs after one
+untimed warmup. The int8 weights are built on first use, calibrated on --calibration
+images (synthetic images without it).
+Without an input image a synthetic RGB image with gradients, flat areas and edges is used.
+
+    $ python -m benchmarks.int8_quality [image.png] [--scale 4] [--repeat 5] [--calibration dir]
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+from PIL import Image
+
+from backend.quantize import int8_weights_path
+from backend.upscale import ModelManager
+
+
+def psnr(reference, test):
+    mse = np.mean((reference.astype(np.float64) - test.astype(np.float64)) ** 2)
+    return float('inf') if mse == 0 else 10 * np.log10(255.0 ** 2 / mse)
+
+
+def synthetic_rgb(size=512):
+    yy, xx = np.mgrid[0:size, 0:size]
+    rgb = np.dstack([xx % 256, yy % 256, (xx ^ yy) % 256]).astype(np.uint8)
+    radius = np.hypot(xx - size / 2, yy - size / 2)
+    rgb[radius < size / 4] = (240, 40, 40)
+    return rgb
+
+
+def run(manager, image, repeat):
+    output = np.asarray(manager.predict(image))
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        manager.predict(image)
+        timings.append(time.perf_counter() - start)
+    return output, 1000 * float(np.median(timings))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("image", nargs="?", help="RGB image (defaults to a synthetic one)")
+    parser.add_argument("--scale", default="4", choices=["2", "4", "8"])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--calibration", help="directory of sample images for building the int8 weights")
+    args = parser.parse_args()
+
+    hr = np.array(Image.open(args.image).convert('RGB')) if args.image else synthetic_rgb()
+    scale = int(args.scale)
+    h, w = (hr.shape[0] // scale) * scale, (hr.shape[1] // scale) * scale
+    hr = hr[:h, :w]
+    lr = np.array(Image.fromarray(hr).resize((w // scale, h // scale), Image.BICUBIC))
+
+    results = {}
+    for precision in ("fp32", "int8"):
+        manager = ModelManager(precision=precision, calibration_dir=args.calibration)
+        start = time.perf_counter()
+        manager.initialize_model(scale=args.scale)
+        load_seconds = time.perf_counter() - start
+        output, median_ms = run(manager, lr, args.repeat)
+        weights = manager._get_weights_path(args.scale)
+        if precision == "int8":
+            weights = int8_weights_path(weights)
+        results[precision] = (output, median_ms, load_seconds, os.path.getsize(weights), str(manager.device))
+        manager.unload()
+
+    print(f"input {lr.shape[1]}x{lr.shape[0]} -> {w}x{h} (x{scale})")
+    print(f"{'precision':<10} {'device':<7} {'load s':>7} {'median ms':>10} {'speedup':>8} "
+          f"{'weights MB':>11} {'PSNR vs HR':>11} {'PSNR vs fp32':>13}")
+    reference, baseline_ms = results["fp32"][0], results["fp32"][1]
+    for precision, (output, median_ms, load_seconds, size, device) in results.items():
+        print(f"{precision:<10} {device:<7} {load_seconds:>7.2f} {median_ms:>10.1f} {baseline_ms / median_ms:>7.2f}x "
+              f"{size / 2**20:>11.1f} {psnr(hr, output):>11.2f} {psnr(reference, output):>13.2f}")
+
+
+if __name__ == "__main__":
+    main()
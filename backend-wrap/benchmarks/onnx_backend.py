@@ -0,0 +1,76 @@
+"""
+Latency of the ONNX Runtime backend against the PyTorch backend (backend/backends.py)
+
+The torch backend runs with --cpu-modes on whatever device it selects; the onnx backend
+runs once per --threads setting (intra-op threads, 0 = ONNX Runtime default). Latency is
+the median of --repeat runs after one untimed warmup, and every output is compared to
+the torch output (PSNR). The ONNX model is exported on first use.
+Without an input image a synthetic RGB image with gradients, flat areas and edges is used.
+
+    $ python -m benchmarks.onnx_backend [image.png] [--scale 4] [--repeat 5] [--threads 0 4 8]
+"""
+
+import argparse
+import time
+
+import numpy as np
+from PIL import Image
+
+from backend.upscale import ModelManager
+
+
+def psnr(reference, test):
+    mse = np.mean((reference.astype(np.float64) - test.astype(np.float64)) ** 2)
+    return float('inf') if mse == 0 else 10 * np.log10(255.0 ** 2 / mse)
+
+
+def synthetic_rgb(size=256):
+    yy, xx = np.mgrid[0:size, 0:size]
+    rgb = np.dstack([xx % 256, yy % 256, (xx ^ yy) % 256]).astype(np.uint8)
+    radius = np.hypot(xx - size / 2, yy - size / 2)
+    rgb[radius < size / 4] = (240, 40, 40)
+    return rgb
+
+
+def run(manager, image, repeat):
+    output = np.asarray(manager.predict(image))
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        manager.predict(image)
+        timings.append(time.perf_counter() - start)
+    return output, 1000 * float(np.median(timings))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("image", nargs="?", help="RGB image (defaults to a synthetic one)")
+    parser.add_argument("--scale", default="4", choices=["2", "4", "8"])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--threads", type=int, nargs="+", default=[0], help="ONNX Runtime intra-op thread counts")
+    parser.add_argument("--cpu-modes", default="channels_last,inference_mode", help="CPU modes of the torch backend")
+    args = parser.parse_args()
+
+    image = np.array(Image.open(args.image).convert('RGB')) if args.image else synthetic_rgb()
+
+    configs = [("torch", ModelManager(cpu_modes=args.cpu_modes))]
+    configs += [(f"onnx threads={threads or 'default'}",
+                 ModelManager(backend="onnx", backend_options={"intra_op_threads": threads})) for threads in args.threads]
+
+    print(f"input {image.shape[1]}x{image.shape[0]} (x{args.scale})")
+    print(f"{'backend':<22} {'device':<7} {'load s':>7} {'median ms':>10} {'speedup':>8} {'PSNR vs torch':>14}")
+    reference = baseline_ms = None
+    for name, manager in configs:
+        start = time.perf_counter()
+        manager.initialize_model(scale=args.scale)
+        load_seconds = time.perf_counter() - start
+        output, median_ms = run(manager, image, args.repeat)
+        if reference is None:
+            reference, baseline_ms = output, median_ms
+        print(f"{name:<22} {str(manager.device):<7} {load_seconds:>7.2f} {median_ms:>10.1f} "
+              f"{baseline_ms / median_ms:>7.2f}x {psnr(reference, output):>14.2f}")
+        manager.unload()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Peak memory per archive member for image_to_tar_format, legacy vs current.
+
+Writes a --members archive (default 500) of synthetic upscaled images with both
+encoders and reports the tracemalloc peak allocated while encoding and adding
+each member. The legacy encoder is the original BytesIO + BufferedReader +
+getvalue() version that also forced PNG members to RGBA.
+
+    $ python -m benchmarks.tar_member_memory [--members 500] [--size 1024]
+"""
+
+import argparse
+import io
+import os
+import tarfile
+import tempfile
+import time
+import tracemalloc
+from io import BytesIO
+
+import numpy as np
+from PIL import Image
+
+from backend.upscale import image_to_tar_format
+
+
+def legacy_image_to_tar_format(img, image_name):
+    buff = BytesIO()
+    if '.png' in image_name.lower():
+        img = img.convert('RGBA')
+        img.save(buff, format='PNG')
+    else:
+        img.save(buff, format='JPEG')
+    buff.seek(0)
+    fp = io.BufferedReader(buff)
+    img_tar_info = tarfile.TarInfo(name=image_name)
+    img_tar_info.size = len(buff.getvalue())
+    return img_tar_info, fp
+
+
+def run(encoder, images, path):
+    peaks = []
+    start = time.perf_counter()
+    with tarfile.open(path, 'w') as archive:
+        for name, img in images:
+            tracemalloc.start()
+            info, fp = encoder(img, name)
+            archive.addfile(info, fp)
+            fp.close()
+            peaks.append(tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+    return np.array(peaks), time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--members", type=int, default=500)
+    parser.add_argument("--size", type=int, default=1024, help="edge of each (upscaled) member image")
+    parser.add_argument("--variants", type=int, default=8, help="distinct images cycled through")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    yy, xx = np.mgrid[0:args.size, 0:args.size]
+    base = np.dstack([xx % 256, yy % 256, (xx ^ yy) % 256]).astype(np.uint8)
+    variants = [Image.fromarray(np.clip(base + rng.integers(0, 16, base.shape), 0, 255).astype(np.uint8))
+                for _ in range(args.variants)]
+    images = [(f"member_{i:04d}.png", variants[i % args.variants]) for i in range(args.members)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{args.members} RGB PNG members of {args.size}x{args.size}")
+        print(f"{'encoder':<8} {'mean peak MB':>13} {'max peak MB':>12} {'archive MB':>11} {'seconds':>8}")
+        for label, encoder in (("legacy", legacy_image_to_tar_format), ("current", image_to_tar_format)):
+            path = os.path.join(tmp, f"{label}.tar")
+            peaks, seconds = run(encoder, images, path)
+            print(f"{label:<8} {peaks.mean() / 2**20:>13.2f} {peaks.max() / 2**20:>12.2f} "
+                  f"{os.path.getsize(path) / 2**20:>11.1f} {seconds:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
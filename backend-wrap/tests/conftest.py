@@ -0,0 +1,131 @@
+import io
+import os
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+import pytest
+from PIL import Image
+
+# make the backend package importable however pytest is started
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# results (and the result cache) of the test server go to a fresh directory
+os.environ["OUTPUT_DIR"] = tempfile.mkdtemp(prefix="upscaler-test-results-")
+
+
+class FakeModel:
+    """Nearest-neighbour stand-in for a model handle; `gate` holds predictions until it is set"""
+
+    def __init__(self, scale, gate=None, error=None):
+        self.scale = int(scale)
+        self.gate = gate
+        self.error = error
+        self.started = threading.Event()
+
+    def predict(self, image):
+        self.started.set()
+        if self.gate is not None:
+            self.gate.wait(5)
+        if self.error is not None:
+            raise self.error
+        return np.ascontiguousarray(np.asarray(image).repeat(self.scale, 0).repeat(self.scale, 1))
+
+    async def predict_with_progress(self, image, progress_callback=None, alpha_strategy=None):
+        return self.predict(image)
+
+
+class FakeManager:
+    """ModelManager stand-in (10 MB of weights) recording which scales are loaded and its batch sizes"""
+
+    loaded = []
+    batches = []
+
+    def __init__(self, precision="fp32", **kwargs):
+        self.precision = precision
+        self.model = None
+        self.current_resample_mode = None
+        self.active_cpu_modes = ()
+
+    def initialize_model(self, scale="2", use_attention=False, resample_mode="bicubic"):
+        self.scale = scale
+        self.model = FakeModel(scale)
+        self.current_resample_mode = resample_mode
+        FakeManager.loaded.append(scale)
+
+    def memory_bytes(self):
+        return 10 * 2**20
+
+    def unload(self):
+        FakeManager.loaded.remove(self.scale)
+
+    @contextmanager
+    def using_resample_mode(self, resample_mode):
+        self.current_resample_mode = resample_mode
+        yield self
+
+    def predict(self, image, alpha_strategy=None):
+        return self.model.predict(image)
+
+    def predict_batch(self, images):
+        self.batches.append(len(images))
+        return [self.model.predict(image) for image in images]
+
+
+def png_bytes(size=16, seed=None, mode="RGB"):
+    """A random PNG, different for every seed so the result cache does not interfere"""
+    rng = np.random.default_rng(seed)
+    channels = len(mode)
+    pixels = rng.integers(0, 256, (size, size, channels), dtype=np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels, mode).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+@pytest.fixture(scope="session")
+def api():
+    from backend import api_server
+    return api_server
+
+
+@pytest.fixture(scope="session")
+def client(api):
+    from fastapi.testclient import TestClient
+    with TestClient(api.app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def fake_models(api, monkeypatch):
+    """Serve every scale from FakeModel; returns a dict the test can set 'gate' / 'error' in"""
+    options = {"gate": None, "error": None, "models": []}
+
+    def get_model(scale, resample_mode, alpha_strategy=None, precision="fp32"):
+        model = FakeModel(scale, options["gate"], options["error"])
+        options["models"].append(model)
+        return model
+
+    monkeypatch.setattr(api.state, "get_model", get_model)
+    return options
+
+
+@pytest.fixture
+def fake_managers(monkeypatch):
+    """Make ModelCache load FakeManagers on the CPU; returns the FakeManager class"""
+    from backend import model_cache
+    FakeManager.loaded = []
+    FakeManager.batches = []
+    monkeypatch.setattr(model_cache, "ModelManager", FakeManager)
+    monkeypatch.setattr(model_cache, "backend_device", lambda backend: "cpu")
+    return FakeManager
@@ -0,0 +1,57 @@
+import pytest
+
+from backend.admission import AdmissionController, CostModel, JobTooLargeError, estimate_cost
+from backend.planner import plan_scales
+from backend.scheduler import QueueFullError
+from conftest import png_bytes, wait_for
+
+
+def test_first_sample_is_blended_with_the_guess():
+    costs = CostModel(100e9)
+    # a cold start measured at a tenth of the real speed
+    costs.observe(10e9, 1.0)
+    assert costs.macs_per_second == pytest.approx(55e9)
+    costs.observe(100e9, 1.0)
+    assert costs.macs_per_second == pytest.approx(64e9)
+    costs.observe(0, 1.0)
+    assert costs.snapshot()["samples"] == 2
+
+
+def test_limits_and_wait():
+    plan = plan_scales(["4"], ["2", "4", "8"], (100, 100))
+    estimate = estimate_cost(plan, (100, 100), 3, None, CostModel(1e9))
+    controller = AdmissionController(CostModel(1e9), max_output_pixels=400 * 400, max_wait_seconds=10)
+    controller.check_limits(estimate)
+    assert controller.check_wait(0) == "accepted"
+    assert controller.check_wait(5) == "queued"
+    with pytest.raises(QueueFullError):
+        controller.check_wait(60)
+    controller.max_output_pixels = 100
+    with pytest.raises(JobTooLargeError):
+        controller.check_limits(estimate)
+    assert controller.snapshot()["rejected"] == 2
+
+
+def finish(client, content):
+    job_id = client.post("/upscale", files={"file": ("a.png", content, "image/png")},
+                         data={"show_progress": "false"}).json()["job_id"]
+    assert wait_for(lambda: client.get(f"/job/{job_id}").json()["status"] == "completed")
+
+
+def test_jobs_that_load_a_model_are_not_calibration_samples(api, client, fake_models, monkeypatch):
+    costs = CostModel(100e9)
+    monkeypatch.setattr(api.state, "costs", costs)
+    fake_get_model = api.state.get_model
+
+    def cold_get_model(*args):
+        # as if the network had to be loaded for this job
+        monkeypatch.setitem(api.state.models.stats, "loads", api.state.models.stats["loads"] + 1)
+        return fake_get_model(*args)
+
+    monkeypatch.setattr(api.state, "get_model", cold_get_model)
+    finish(client, png_bytes(seed=330))
+    assert costs.samples == 0
+
+    monkeypatch.setattr(api.state, "get_model", fake_get_model)
+    finish(client, png_bytes(seed=331))
+    assert costs.samples == 1
@@ -0,0 +1,53 @@
+from conftest import png_bytes, wait_for
+
+
+def upscale(client, content):
+    return client.post("/upscale", files={"file": ("a.png", content, "image/png")},
+                       data={"show_progress": "false"})
+
+
+def finish(client, content):
+    job_id = upscale(client, content).json()["job_id"]
+    assert wait_for(lambda: client.get(f"/job/{job_id}").json()["status"] == "completed")
+
+
+def test_cached_results_skip_the_queue_check(api, client, fake_models, monkeypatch):
+    content = png_bytes(seed=300)
+    finish(client, content)
+    monkeypatch.setattr(api.state.admission, "max_wait_seconds", 1)
+    monkeypatch.setattr(api.state.scheduler, "expected_wait", lambda: 3600)
+    counts = api.state.admission.snapshot()
+
+    cached = upscale(client, content)
+    assert cached.status_code == 202
+    assert cached.json()["cached"] is True
+    assert api.state.admission.snapshot()["rejected"] == counts["rejected"]
+    assert api.state.admission.snapshot()["accepted"] == counts["accepted"]
+
+    fresh = upscale(client, png_bytes(seed=301))
+    assert fresh.status_code == 503
+    assert "Retry-After" in fresh.headers
+
+
+def test_cached_results_are_served_during_warmup(api, client, fake_models, monkeypatch):
+    content = png_bytes(seed=310)
+    finish(client, content)
+
+    async def still_warming_up(timeout):
+        return False
+
+    monkeypatch.setattr(api.state.warmup, "wait", still_warming_up)
+    assert upscale(client, content).json()["cached"] is True
+    assert upscale(client, png_bytes(seed=311)).status_code == 503
+
+
+def test_rejected_job_releases_its_identical_followers(api, client, fake_models, monkeypatch):
+    content = png_bytes(seed=320)
+    monkeypatch.setattr(api.state.admission, "max_wait_seconds", 1)
+    monkeypatch.setattr(api.state.scheduler, "expected_wait", lambda: 3600)
+    assert upscale(client, content).status_code == 503
+    # the in-flight group of the rejected job is closed, so a retry leads a job of its own
+    monkeypatch.setattr(api.state.scheduler, "expected_wait", lambda: 0)
+    retry = upscale(client, content)
+    assert retry.status_code == 202
+    assert "deduplicated_with" not in retry.json()
@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+
+from backend.alpha import guided_upscale_alpha, resize_alpha, uniform_value
+from backend.upscale import ModelManager
+
+
+class CountingBackend:
+    """Nearest-neighbour x2 backend counting its forward passes"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def predict(self, lr_image):
+        self.calls += 1
+        return lr_image.repeat(2, 0).repeat(2, 1)
+
+
+def make_manager():
+    manager = ModelManager()
+    manager.model = CountingBackend()
+    manager.current_resample_mode = "nearest"
+    return manager
+
+
+def rgba_with_alpha(alpha):
+    rgb = np.random.default_rng(12).integers(0, 256, alpha.shape + (3,), dtype=np.uint8)
+    return np.dstack([rgb, alpha])
+
+
+@pytest.fixture
+def soft_alpha():
+    return np.tile(np.linspace(0, 255, 8).astype(np.uint8), (8, 1))
+
+
+def test_uniform_value():
+    assert uniform_value(np.full((3, 3), 255, dtype=np.uint8)) == 255
+    assert uniform_value(np.arange(9, dtype=np.uint8).reshape(3, 3)) is None
+    assert uniform_value(np.zeros((0, 0), dtype=np.uint8)) is None
+
+
+@pytest.mark.parametrize("strategy", ["network", "guided", "resize"])
+def test_uniform_alpha_is_filled_without_upscaling(strategy):
+    manager = make_manager()
+    result = manager.predict(rgba_with_alpha(np.full((8, 8), 200, dtype=np.uint8)), alpha_strategy=strategy)
+    assert manager.model.calls == 1
+    assert result.shape == (16, 16, 4)
+    assert (result[:, :, 3] == 200).all()
+
+
+@pytest.mark.parametrize("strategy, passes", [("network", 2), ("guided", 1), ("resize", 1)])
+def test_only_the_network_strategy_runs_a_second_pass(soft_alpha, strategy, passes):
+    manager = make_manager()
+    image = rgba_with_alpha(soft_alpha)
+    result = manager.predict(image, alpha_strategy=strategy)
+    assert manager.model.calls == passes
+    assert np.array_equal(result[:, :, :3], image[:, :, :3].repeat(2, 0).repeat(2, 1))
+
+
+def test_resize_uses_the_resample_mode(soft_alpha):
+    manager = make_manager()
+    result = manager.predict(rgba_with_alpha(soft_alpha), alpha_strategy="resize")
+    assert np.array_equal(result[:, :, 3], soft_alpha.repeat(2, 0).repeat(2, 1))
+    assert resize_alpha(soft_alpha, (16, 16), "bicubic").shape == (16, 16)
+
+
+def test_unknown_strategy_is_rejected(soft_alpha):
+    with pytest.raises(ValueError):
+        make_manager().predict(rgba_with_alpha(soft_alpha), alpha_strategy="magic")
+
+
+def test_guided_alpha_follows_the_edges_of_the_rgb():
+    # a hard edge in both the alpha and the upscaled RGB
+    alpha = np.zeros((16, 16), dtype=np.uint8)
+    alpha[:, 8:] = 255
+    guide = np.zeros((64, 64, 3), dtype=np.uint8)
+    guide[:, 32:] = 255
+    guided = guided_upscale_alpha(alpha, guide, "bilinear").astype(int)
+    resized = resize_alpha(alpha, (64, 64), "bilinear").astype(int)
+    assert guided.shape == (64, 64)
+    # the jump across the RGB edge is sharper than a plain resize makes it
+    assert guided[0, 32] - guided[0, 31] > 128
+    assert guided[0, 32] - guided[0, 31] > resized[0, 32] - resized[0, 31]
@@ -0,0 +1,72 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from backend.backends import OnnxBackend, TorchBackend, input_multiple, pad_to_multiple
+
+
+def nearest(image, scale):
+    return image.repeat(scale, 0).repeat(scale, 1)
+
+
+def test_only_the_x2_network_needs_even_input():
+    assert [input_multiple(scale) for scale in ("2", "4", "8")] == [2, 1, 1]
+
+
+def test_padding_extends_the_bottom_right_edge():
+    image = np.arange(3 * 5 * 3, dtype=np.uint8).reshape(3, 5, 3)
+    padded = pad_to_multiple(image, 2)
+    assert padded.shape == (4, 6, 3)
+    assert np.array_equal(padded[:3, :5], image)
+    assert np.array_equal(padded[3, :5], image[2])
+    assert pad_to_multiple(padded, 2) is padded
+
+
+def test_odd_sized_x2_batch_runs_in_one_pass():
+    torch = pytest.importorskip("torch")
+
+    class EvenOnly(torch.nn.Module):
+        """x2 stand-in that, like RRDBNet, pixel-unshuffles its input"""
+
+        def forward(self, x):
+            torch.nn.functional.pixel_unshuffle(x, 2)
+            return torch.nn.functional.interpolate(x, scale_factor=2, mode='nearest')
+
+    backend = TorchBackend()
+    backend.model = SimpleNamespace(model=EvenOnly())
+    backend.scale = 2
+    backend.device = torch.device('cpu')
+    rng = np.random.default_rng(8)
+    images = [rng.integers(0, 256, (33, 47, 3), dtype=np.uint8) for _ in range(3)]
+    results = backend.predict_batch(images)
+    for image, result in zip(images, results):
+        assert np.array_equal(result, nearest(image, 2))
+
+
+class EvenOnlySession:
+    """ONNX Runtime session stand-in for an exported x2 graph, which rejects odd input sizes"""
+
+    def __init__(self):
+        self.shapes = []
+
+    def get_inputs(self):
+        return [SimpleNamespace(name="input")]
+
+    def run(self, outputs, feeds):
+        tensor = feeds["input"]
+        self.shapes.append(tensor.shape)
+        if tensor.shape[2] % 2 or tensor.shape[3] % 2:
+            raise ValueError("pixel_unshuffle needs even height and width")
+        return [tensor.repeat(2, 2).repeat(2, 3)]
+
+
+@pytest.mark.parametrize("shape", [(37, 51, 3), (301, 203, 3)])
+def test_onnx_backend_upscales_odd_sized_images(shape):
+    backend = OnnxBackend()
+    backend.scale = 2
+    backend.session = EvenOnlySession()
+    image = np.random.default_rng(9).integers(0, 256, shape, dtype=np.uint8)
+    result = backend.predict(image)
+    assert result.shape == (shape[0] * 2, shape[1] * 2, 3)
+    assert np.abs(result.astype(int) - nearest(image, 2).astype(int)).max() <= 1
@@ -0,0 +1,143 @@
+import io
+import os
+import tarfile
+import threading
+import zipfile
+
+import pytest
+
+from backend.util_file import FileTooLargeError, copy_limited
+from conftest import png_bytes, wait_for
+
+
+def tar_of(members):
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w") as archive:
+        for name, content in members:
+            info = tarfile.TarInfo(name)
+            info.size = len(content)
+            archive.addfile(info, io.BytesIO(content))
+    return buffer.getvalue()
+
+
+def post_batch(client, files, **data):
+    return client.post("/upscale/batch", files=[("files", f) for f in files],
+                       data={"show_progress": "false", **data})
+
+
+def batch_dirs(api):
+    return {name for name in os.listdir(api.RESULTS_DIR) if name.startswith("batch-")}
+
+
+def test_batch_of_images_and_archives(client, fake_models):
+    archive = tar_of([("dir/a.png", png_bytes(seed=200)), ("dir/b.png", png_bytes(seed=201))])
+    files = [("x.png", png_bytes(seed=202), "image/png"), ("set.tar", archive, "application/x-tar")]
+    response = post_batch(client, files)
+    assert response.status_code == 202, response.text
+    job_id = response.json()["job_id"]
+    assert response.json()["items"] == 3
+    assert wait_for(lambda: client.get(f"/batch/{job_id}").json()["status"] == "completed")
+    download = client.get(f"/batch/{job_id}/download")
+    with tarfile.open(fileobj=io.BytesIO(download.content)) as result:
+        assert len(result.getnames()) == 3
+
+
+def test_items_are_decoded_by_the_batch_job(api, client, fake_models, monkeypatch):
+    decoded_on = []
+    open_image = api.open_image
+
+    def recording_open_image(*args, **kwargs):
+        decoded_on.append(threading.current_thread().name)
+        return open_image(*args, **kwargs)
+
+    monkeypatch.setattr(api, "open_image", recording_open_image)
+    files = [(f"{i}.png", png_bytes(seed=210 + i), "image/png") for i in range(3)]
+    job_id = post_batch(client, files).json()["job_id"]
+    assert wait_for(lambda: client.get(f"/batch/{job_id}").json()["status"] == "completed")
+    assert len(decoded_on) == 3
+    assert all(name.startswith(f"batch-{job_id}") for name in decoded_on)
+
+
+def test_too_many_items_are_rejected_before_decoding(api, client, fake_models, monkeypatch):
+    monkeypatch.setattr(api, "BATCH_MAX_ITEMS", 2)
+    before = batch_dirs(api)
+    archive = tar_of([(f"{i}.png", png_bytes(seed=220 + i)) for i in range(3)])
+    response = post_batch(client, [("set.tar", archive, "application/x-tar")])
+    assert response.status_code == 413
+    assert batch_dirs(api) == before
+    assert not fake_models["models"]
+
+
+def test_too_many_pixels_are_rejected(api, client, fake_models, monkeypatch):
+    monkeypatch.setattr(api, "BATCH_MAX_TOTAL_PIXELS", 16 * 16 + 1)
+    files = [(f"{i}.png", png_bytes(seed=230 + i), "image/png") for i in range(2)]
+    response = post_batch(client, files)
+    assert response.status_code == 413
+    assert "pixels" in response.json()["detail"]
+
+
+def zip_of(members):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, content in members:
+            archive.writestr(name, content)
+    return buffer.getvalue()
+
+
+def test_oversized_archive_members_are_not_extracted(api, client, fake_models, monkeypatch):
+    monkeypatch.setattr(api, "BATCH_MAX_MEMBER_MB", 1)
+    written = []
+
+    def copy(src, dest, limit):
+        dest_start = dest.tell()
+        try:
+            return copy_limited(src, dest, limit)
+        finally:
+            written.append(dest.tell() - dest_start)
+
+    monkeypatch.setattr(api, "copy_limited", copy)
+    # a few KB compressed, 64 MB once extracted
+    bomb = b"\0" * (64 * 2**20)
+    archive = zip_of([("bomb.png", bomb), ("ok.png", png_bytes(seed=270))])
+    response = post_batch(client, [("set.zip", archive, "application/zip")])
+    assert response.status_code == 202
+    assert response.json()["items"] == 1
+    # rejected from its recorded size, only the valid image was extracted
+    assert written == [len(png_bytes(seed=270))]
+
+
+def test_archives_past_the_byte_budget_are_rejected(api, client, fake_models, monkeypatch):
+    monkeypatch.setattr(api, "BATCH_MAX_TOTAL_MB", 1)
+    before = batch_dirs(api)
+    # random pixels barely compress, each image is about 600 KB
+    archive = zip_of([(f"{i}.png", png_bytes(size=450, seed=260 + i)) for i in range(2)])
+    response = post_batch(client, [("set.zip", archive, "application/zip")])
+    assert response.status_code == 413
+    assert batch_dirs(api) == before
+
+
+def test_copies_stop_at_the_limit():
+    dest = io.BytesIO()
+    with pytest.raises(FileTooLargeError):
+        copy_limited(io.BytesIO(b"x" * 5000), dest, 3000, chunk_size=1024)
+    assert len(dest.getvalue()) <= 3000
+    assert copy_limited(io.BytesIO(b"x" * 5000), io.BytesIO(), 0) == 5000
+
+
+def test_unreadable_archive_members_are_skipped(client, fake_models):
+    archive = tar_of([("ok.png", png_bytes(seed=240)), ("broken.png", b"not an image")])
+    response = post_batch(client, [("set.tar", archive, "application/x-tar")])
+    assert response.status_code == 202
+    assert response.json()["items"] == 1
+
+
+def test_cancelled_batch_drops_waiting_items(client, fake_models):
+    fake_models["gate"] = gate = threading.Event()
+    files = [(f"{i}.png", png_bytes(seed=250 + i), "image/png") for i in range(8)]
+    job_id = post_batch(client, files).json()["job_id"]
+    assert wait_for(lambda: fake_models["models"] and fake_models["models"][0].started.is_set())
+    assert client.post(f"/job/{job_id}/cancel").status_code == 200
+    gate.set()
+    assert wait_for(lambda: client.get(f"/batch/{job_id}").json()["status"] == "cancelled")
+    counts = client.get(f"/batch/{job_id}").json()["counts"]
+    assert counts.get("cancelled", 0) >= 4
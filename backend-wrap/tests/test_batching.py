@@ -0,0 +1,97 @@
+import threading
+
+import numpy as np
+
+from backend.batching import MicroBatcher
+from backend.model_cache import ModelCache
+
+
+def run_concurrently(batcher, calls, runner):
+    """calls: (key, image) pairs run at the same time; returns their results in order"""
+    results = [None] * len(calls)
+
+    def call(i, key, image):
+        results[i] = batcher.run(key, image, runner)
+
+    threads = [threading.Thread(target=call, args=(i, *c)) for i, c in enumerate(calls)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    return results
+
+
+def recording_runner(batches):
+    def runner(images):
+        batches.append(len(images))
+        return [image * 2 for image in images]
+    return runner
+
+
+def test_concurrent_callers_share_one_pass():
+    batcher = MicroBatcher(max_batch=4, max_wait_ms=2000)
+    images = [np.full((4, 4, 3), i, dtype=np.uint8) for i in range(4)]
+    batches = []
+    results = run_concurrently(batcher, [("x2", image) for image in images], recording_runner(batches))
+    # the group is full, so it runs without waiting out max_wait_ms
+    assert batches == [4]
+    assert [int(r[0, 0, 0]) for r in results] == [0, 2, 4, 6]
+    assert batcher.snapshot()["avg_batch_size"] == 4
+
+
+def test_different_models_and_shapes_are_not_mixed():
+    batcher = MicroBatcher(max_batch=4, max_wait_ms=50)
+    calls = [("x2", np.zeros((4, 4, 3), dtype=np.uint8)), ("x4", np.zeros((4, 4, 3), dtype=np.uint8)),
+             ("x2", np.zeros((8, 4, 3), dtype=np.uint8))]
+    batches = []
+    run_concurrently(batcher, calls, recording_runner(batches))
+    assert batches == [1, 1, 1]
+
+
+def test_errors_reach_every_caller():
+    batcher = MicroBatcher(max_batch=2, max_wait_ms=2000)
+    errors = []
+
+    def runner(images):
+        raise RuntimeError("forward pass failed")
+
+    def call():
+        try:
+            batcher.run("x2", np.zeros((4, 4, 3), dtype=np.uint8), runner)
+        except RuntimeError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    assert len(errors) == 2
+
+
+def test_large_inputs_and_disabled_batching_run_alone():
+    batcher = MicroBatcher(max_batch=4, max_pixels=100)
+    assert batcher.accepts(np.zeros((10, 10, 3)))
+    assert not batcher.accepts(np.zeros((11, 10, 3)))
+    assert not MicroBatcher(max_batch=1).enabled
+
+
+def test_model_handles_batch_small_rgb_inputs(fake_managers):
+    cache = ModelCache(batcher=MicroBatcher(max_batch=3, max_wait_ms=2000))
+    handle = cache.get("2")
+    images = [np.full((4, 4, 3), i, dtype=np.uint8) for i in range(3)]
+    results = [None] * 3
+
+    def call(i):
+        results[i] = handle.predict(images[i])
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    assert fake_managers.batches == [3]
+    assert all(np.array_equal(r, i.repeat(2, 0).repeat(2, 1)) for r, i in zip(results, images))
+    # RGBA inputs need the per-image alpha path
+    assert handle.predict(np.zeros((4, 4, 4), dtype=np.uint8)).shape == (8, 8, 4)
+    assert fake_managers.batches == [3]
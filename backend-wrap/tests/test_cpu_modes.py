@@ -0,0 +1,56 @@
+import pytest
+
+from backend.backends import TorchBackend
+from backend.cpu_modes import CPU_MODES, execution_context, parse_cpu_modes
+
+
+def test_parse_cpu_modes_canonical_order():
+    assert parse_cpu_modes("compile, Channels_Last,,") == ("channels_last", "compile")
+    assert parse_cpu_modes(["inference_mode", "bf16"]) == ("bf16", "inference_mode")
+    assert parse_cpu_modes(",".join(reversed(CPU_MODES))) == CPU_MODES
+    assert parse_cpu_modes("") == parse_cpu_modes(None) == ()
+
+
+def test_parse_cpu_modes_rejects_unknown_modes():
+    with pytest.raises(ValueError, match="fp16"):
+        parse_cpu_modes("channels_last,fp16")
+    with pytest.raises(ValueError):
+        TorchBackend(cpu_modes="turbo")
+
+
+def test_no_inference_mode_runs_predictions_as_is():
+    with execution_context(("channels_last",)):
+        pass
+
+
+@pytest.fixture
+def network():
+    torch = pytest.importorskip("torch")
+    torch.manual_seed(0)
+    return torch.nn.Sequential(torch.nn.Conv2d(3, 8, 3, padding=1), torch.nn.ReLU(), torch.nn.Conv2d(8, 3, 3, padding=1))
+
+
+def test_channels_last_output_matches_fp32(network):
+    import torch
+    from backend.cpu_modes import accelerate_network
+
+    x = torch.rand(1, 3, 17, 23)
+    with torch.no_grad():
+        expected = network(x)
+        assert accelerate_network(network, ("channels_last",)) == ("channels_last",)
+        out = network(x)
+    assert out.is_contiguous() and out.dtype == torch.float32
+    assert torch.allclose(out, expected, atol=1e-5)
+
+
+def test_bf16_is_dropped_without_native_support(network, monkeypatch):
+    import torch
+    from backend import cpu_modes
+
+    monkeypatch.setattr(cpu_modes, "bf16_supported", lambda: False)
+    forward = network.forward
+    assert cpu_modes.accelerate_network(network, ("bf16", "inference_mode")) == ("inference_mode",)
+    # nothing to wrap, the network keeps its own forward
+    assert network.forward == forward
+    with cpu_modes.execution_context(("inference_mode",)):
+        assert torch.is_inference_mode_enabled()
@@ -0,0 +1,91 @@
+import os
+import sys
+import threading
+import types
+
+import pytest
+
+from backend.cpu_resources import THREAD_ENV_VARS, CpuAssignment, CpuResourceManager, split_cores
+from conftest import png_bytes, wait_for
+
+
+@pytest.fixture
+def fake_torch(monkeypatch):
+    """torch stand-in recording set_num_threads per calling thread"""
+    torch = types.ModuleType("torch")
+    torch.threads = {}
+    torch.set_num_threads = lambda n: torch.threads.__setitem__(threading.current_thread().name, n)
+    monkeypatch.setitem(sys.modules, "torch", torch)
+    return torch
+
+
+@pytest.fixture
+def clean_env(monkeypatch):
+    for var in THREAD_ENV_VARS:
+        monkeypatch.delenv(var, raising=False)
+
+
+def test_split_cores():
+    assert split_cores(range(8), 3) == [[0, 1, 2], [3, 4, 5], [6, 7]]
+    assert split_cores(range(2), 3) == [[0], [1], [0]]
+    assert split_cores(range(4), 1) == [[0, 1, 2, 3]]
+
+
+def test_latency_profile_runs_one_worker():
+    cpu = CpuResourceManager("latency", workers=4)
+    assert cpu.workers == 1
+    assert cpu.threads_per_worker == len(cpu.cores)
+
+
+def test_process_assignment_sets_the_environment(clean_env):
+    CpuAssignment(0, [0, 1]).apply()
+    assert all(os.environ[var] == "2" for var in THREAD_ENV_VARS)
+
+
+def test_worker_threads_leave_the_environment_alone(clean_env, fake_torch):
+    cpu = CpuResourceManager("throughput", workers=2)
+    threads = [threading.Thread(target=cpu.configure_worker, args=(i,), name=f"worker-{i}") for i in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not any(var in os.environ for var in THREAD_ENV_VARS)
+    assert fake_torch.threads == {f"worker-{i}": cpu.assignment(i).threads for i in range(2)}
+
+
+def test_torch_threads_can_be_left_out(fake_torch):
+    CpuResourceManager("throughput", workers=1, torch_threads=False).configure_worker(0)
+    assert fake_torch.threads == {}
+
+
+def test_helpers_inherit_the_worker_share(fake_torch):
+    cpu = CpuResourceManager("throughput", workers=2)
+    seen = {}
+
+    def worker():
+        cpu.configure_worker(1)
+        parent = cpu.current()
+        helper = threading.Thread(target=lambda: (cpu.configure_helper(parent), seen.update(helper=cpu.current())))
+        helper.start()
+        helper.join()
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    thread.join()
+    assert seen["helper"] is cpu.assignment(1)
+    assert cpu.current() is None
+
+
+def test_batch_item_threads_run_the_worker_initializer(api, client, fake_models, monkeypatch):
+    configured = []
+    helper = api.state.cpu.configure_helper
+
+    def recording_helper(assignment):
+        configured.append(assignment)
+        helper(assignment)
+
+    monkeypatch.setattr(api.state.cpu, "configure_helper", recording_helper)
+    files = [("files", (f"{i}.png", png_bytes(seed=400 + i), "image/png")) for i in range(2)]
+    job_id = client.post("/upscale/batch", files=files, data={"show_progress": "false"}).json()["job_id"]
+    assert wait_for(lambda: client.get(f"/batch/{job_id}").json()["status"] == "completed")
+    assert configured and all(a is api.state.cpu.assignment(0) for a in configured)
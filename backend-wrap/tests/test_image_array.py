@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+from backend.image_array import mode_of, to_array, to_image
+from backend.upscale import ModelManager
+
+
+@pytest.fixture
+def rgba():
+    return np.random.default_rng(11).integers(0, 256, (6, 5, 4), dtype=np.uint8)
+
+
+def test_qualifying_arrays_are_passed_through(rgba):
+    assert to_array(rgba) is rgba
+    rgb = np.ascontiguousarray(rgba[:, :, :3])
+    assert to_array(rgb) is rgb
+
+
+def test_pil_images_are_read_without_converting_rgba(rgba):
+    assert np.array_equal(to_array(Image.fromarray(rgba, "RGBA")), rgba)
+    assert to_array(Image.fromarray(rgba, "RGBA"), "RGB").shape == (6, 5, 3)
+    assert to_array(Image.fromarray(rgba[:, :, 0], "L")).shape == (6, 5, 3)
+
+
+@pytest.mark.parametrize("shape", [(6, 5), (6, 5, 1)])
+def test_grayscale_arrays_become_rgb(shape):
+    gray = np.arange(30, dtype=np.uint8).reshape(shape)
+    array = to_array(gray)
+    assert array.shape == (6, 5, 3)
+    assert all(np.array_equal(array[:, :, c], gray.reshape(6, 5)) for c in range(3))
+
+
+def test_grayscale_with_alpha_becomes_rgba(rgba):
+    array = to_array(rgba[:, :, 2:])
+    assert array.shape == (6, 5, 4)
+    assert np.array_equal(array[:, :, 0], rgba[:, :, 2])
+    assert np.array_equal(array[:, :, 3], rgba[:, :, 3])
+
+
+def test_mode_conversion_and_dtype(rgba):
+    assert to_array(rgba, "RGB").shape == (6, 5, 3)
+    assert to_array(rgba[:, :, :3], "RGBA")[:, :, 3].min() == 255
+    assert to_array(rgba.astype(np.int64)).dtype == np.uint8
+
+
+def test_to_image_keeps_the_channels(rgba):
+    assert to_image(rgba).mode == "RGBA"
+    assert to_image(rgba[:, :, :3]).mode == "RGB"
+    with pytest.raises(ValueError):
+        mode_of(np.zeros((2, 2, 5), dtype=np.uint8))
+
+
+class NearestBackend:
+    def predict(self, lr_image):
+        return lr_image.repeat(2, 0).repeat(2, 1)
+
+
+def test_model_manager_upscales_grayscale_arrays():
+    manager = ModelManager()
+    manager.model = NearestBackend()
+    assert manager.predict(np.zeros((4, 3), dtype=np.uint8)).shape == (8, 6, 3)
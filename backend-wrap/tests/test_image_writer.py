@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+from backend.image_writer import StreamingPNGWriter, save_array_streaming
+
+
+@pytest.mark.parametrize("shape", [(37, 53), (37, 53, 3), (37, 53, 4)])
+def test_strips_decode_to_the_original_pixels(tmp_path, shape):
+    array = np.random.default_rng(5).integers(0, 256, shape, dtype=np.uint8)
+    path = tmp_path / "out.png"
+    with StreamingPNGWriter(path, shape[1], shape[0], shape[2] if len(shape) == 3 else 1, idat_size=512) as writer:
+        for start in range(0, shape[0], 10):
+            writer.write_rows(array[start:start + 10])
+    assert np.array_equal(np.asarray(Image.open(path)), array)
+
+
+def test_save_array_streaming(tmp_path):
+    array = np.random.default_rng(6).integers(0, 256, (300, 20, 3), dtype=np.uint8)
+    save_array_streaming(array, tmp_path / "out.png", strip_rows=64)
+    assert np.array_equal(np.asarray(Image.open(tmp_path / "out.png")), array)
+
+
+def test_incomplete_images_are_removed(tmp_path):
+    path = tmp_path / "out.png"
+    writer = StreamingPNGWriter(path, 4, 4)
+    writer.write_rows(np.zeros((2, 4, 3), dtype=np.uint8))
+    writer.close()
+    assert not path.exists()
+
+
+def test_failure_inside_the_writer_removes_the_file(tmp_path):
+    path = tmp_path / "out.png"
+    with pytest.raises(ValueError):
+        with StreamingPNGWriter(path, 4, 2) as writer:
+            writer.write_rows(np.zeros((3, 4, 3), dtype=np.uint8))
+    assert not path.exists()
+
+
+def test_unsupported_channel_count(tmp_path):
+    with pytest.raises(ValueError):
+        StreamingPNGWriter(tmp_path / "out.png", 4, 4, channels=5)
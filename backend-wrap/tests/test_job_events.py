@@ -0,0 +1,64 @@
+import asyncio
+import json
+import threading
+
+from conftest import png_bytes, wait_for
+
+
+def submit(client, seed):
+    response = client.post(
+        "/upscale",
+        files={"file": (f"{seed}.png", png_bytes(seed=seed), "image/png")},
+        data={"show_progress": "false"},
+    )
+    assert response.status_code == 202, response.text
+    return response.json()["job_id"]
+
+
+def test_long_poll_returns_once_the_job_changes(client, fake_models):
+    fake_models["gate"] = gate = threading.Event()
+    job_id = submit(client, 340)
+    assert wait_for(lambda: fake_models["models"] and fake_models["models"][0].started.is_set())
+    before = client.get(f"/job/{job_id}").json()
+
+    unchanged = client.get(f"/job/{job_id}", params={"version": before["version"], "timeout": 0.1}).json()
+    assert unchanged["version"] == before["version"]
+
+    threading.Timer(0.2, gate.set).start()
+    while True:
+        polled = client.get(f"/job/{job_id}", params={"version": before["version"], "timeout": 5}).json()
+        assert polled["version"] > before["version"]
+        if polled["status"] == "completed":
+            break
+        before = polled
+
+
+def test_long_poll_unknown_job(client):
+    assert client.get("/job/missing", params={"version": 0}).status_code == 404
+
+
+class ConnectedRequest:
+    async def is_disconnected(self):
+        return False
+
+
+def test_event_stream_replays_followed_jobs(api, client, fake_models):
+    job_id = submit(client, 341)
+    assert wait_for(lambda: client.get(f"/job/{job_id}").json()["status"] == "completed")
+    version = client.get(f"/job/{job_id}").json()["version"]
+
+    # the stream never ends on its own, so read its first events straight from the endpoint
+    async def first_events(count):
+        response = await api.job_events(ConnectedRequest(), job_ids=f"{job_id},")
+        assert response.media_type == "text/event-stream"
+        events = [await response.body_iterator.__anext__() for _ in range(count)]
+        await response.body_iterator.aclose()
+        return events
+
+    retry, event = asyncio.run(first_events(2))
+    assert retry == "retry: 3000\n\n"
+    lines = event.strip().split("\n")
+    assert lines[:2] == [f"id: {job_id}:{version}", "event: progress"]
+    data = json.loads(lines[2][len("data: "):])
+    assert data["job_id"] == job_id and data["version"] == version
+    assert api.state.progress.snapshot()["subscribers"] == 0
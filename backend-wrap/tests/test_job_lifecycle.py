@@ -0,0 +1,66 @@
+import threading
+
+from conftest import png_bytes, wait_for
+
+
+def submit(client, seed, **data):
+    response = client.post(
+        "/upscale",
+        files={"file": (f"{seed}.png", png_bytes(seed=seed), "image/png")},
+        data={"show_progress": "false", **data},
+    )
+    assert response.status_code == 202, response.text
+    return response.json()["job_id"]
+
+
+def status(client, job_id):
+    return client.get(f"/job/{job_id}")
+
+
+def test_job_completes(client, fake_models):
+    job_id = submit(client, 1)
+    assert wait_for(lambda: status(client, job_id).json()["status"] == "completed")
+    assert client.get(f"/download/{job_id}").status_code == 200
+
+
+def test_cancelled_running_job_reports_cancelled(client, fake_models):
+    fake_models["gate"] = gate = threading.Event()
+    # a job stops between steps, so give it two
+    job_id = submit(client, 2, scales='["2", "2"]', keep_chain="true")
+    assert wait_for(lambda: fake_models["models"] and fake_models["models"][0].started.is_set())
+    assert client.post(f"/job/{job_id}/cancel").status_code == 200
+    gate.set()
+    assert wait_for(lambda: status(client, job_id).json()["status"] == "cancelled")
+    assert client.post(f"/job/{job_id}/cancel").status_code == 409
+
+
+def test_deleted_running_job_is_not_recreated(client, fake_models):
+    fake_models["gate"] = gate = threading.Event()
+    job_id = submit(client, 3)
+    assert wait_for(lambda: fake_models["models"] and fake_models["models"][0].started.is_set())
+    assert client.delete(f"/job/{job_id}").status_code == 200
+    gate.set()
+    assert wait_for(lambda: client.get("/queue").json()["running"] == 0)
+    assert status(client, job_id).status_code == 404
+
+
+def test_deleted_failing_job_is_not_recreated(client, fake_models):
+    fake_models["gate"] = gate = threading.Event()
+    fake_models["error"] = RuntimeError("network failed")
+    job_id = submit(client, 4)
+    assert wait_for(lambda: fake_models["models"] and fake_models["models"][0].started.is_set())
+    assert client.delete(f"/job/{job_id}").status_code == 200
+    gate.set()
+    assert wait_for(lambda: client.get("/queue").json()["running"] == 0)
+    assert status(client, job_id).status_code == 404
+
+
+def test_failing_job_reports_error(client, fake_models):
+    fake_models["error"] = RuntimeError("network failed")
+    job_id = submit(client, 5)
+    assert wait_for(lambda: status(client, job_id).json()["status"] == "error")
+    assert status(client, job_id).json()["message"] == "network failed"
+
+
+def test_delete_unknown_job(client):
+    assert client.delete("/job/missing").status_code == 404
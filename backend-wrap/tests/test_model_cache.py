@@ -0,0 +1,66 @@
+import threading
+
+import numpy as np
+import pytest
+
+from backend.model_cache import ModelCache
+
+
+def test_models_are_loaded_once_and_reused(fake_managers):
+    cache = ModelCache()
+    first = cache.get("2", "bicubic")
+    cache.get("2", "nearest")
+    assert fake_managers.loaded == ["2"]
+    assert cache.snapshot()["hits"] == 1
+    assert first.predict(np.zeros((2, 2, 3), dtype=np.uint8)).shape == (4, 4, 3)
+
+
+def test_least_recently_used_model_is_evicted_past_max_models(fake_managers):
+    cache = ModelCache(max_models=2)
+    for scale in ("2", "4", "2", "8"):
+        cache.get(scale)
+    assert sorted(fake_managers.loaded) == ["2", "8"]
+    assert cache.snapshot()["evictions"] == 1
+
+
+def test_memory_budget_bounds_resident_models(fake_managers):
+    cache = ModelCache(max_bytes=25 * 2**20)
+    for scale in ("2", "4", "8"):
+        cache.get(scale)
+    assert fake_managers.loaded == ["4", "8"]
+
+
+def test_leased_models_are_not_evicted(fake_managers):
+    cache = ModelCache(max_models=1)
+    with cache.lease("2"):
+        cache.get("4")
+        # x2 is busy, so the idle x4 goes even though it was used last
+        assert fake_managers.loaded == ["2"]
+        assert "2" in cache and "4" not in cache
+
+
+def test_idle_models_expire(fake_managers, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("backend.model_cache.time.monotonic", lambda: now[0])
+    cache = ModelCache(idle_ttl=10)
+    cache.get("2")
+    with cache.lease("4"):
+        now[0] += 60
+        cache.expire_idle()
+        assert fake_managers.loaded == ["4"]
+    assert cache.snapshot()["expirations"] == 1
+
+
+def test_concurrent_first_use_loads_once(fake_managers):
+    cache = ModelCache()
+    threads = [threading.Thread(target=cache.get, args=("2",)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert fake_managers.loaded == ["2"]
+
+
+def test_unknown_backend_is_rejected():
+    with pytest.raises(ValueError):
+        ModelCache(backend="tensorrt")
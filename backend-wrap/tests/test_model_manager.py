@@ -0,0 +1,106 @@
+import threading
+import time
+
+import numpy as np
+
+from backend.upscale import ModelManager
+
+
+class SlowBackend:
+    """Backend stand-in recording how many predictions overlap and in which mode"""
+
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.mode = "bicubic"
+        self.running = 0
+        self.peak = 0
+        self.modes_seen = []
+        self.switches_while_running = 0
+        self._lock = threading.Lock()
+
+    def set_resample_mode(self, mode):
+        with self._lock:
+            if self.running:
+                self.switches_while_running += 1
+            self.mode = mode
+
+    def predict(self, lr_image):
+        with self._lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        mode = self.mode
+        time.sleep(self.delay)
+        with self._lock:
+            self.running -= 1
+            self.modes_seen.append((mode, self.mode))
+        return lr_image.repeat(2, 0).repeat(2, 1)
+
+
+def make_manager(backend):
+    manager = ModelManager()
+    manager.model = backend
+    manager.current_resample_mode = backend.mode
+    return manager
+
+
+def predict_in(manager, mode, results):
+    with manager.using_resample_mode(mode) as model:
+        results.append((mode, model.predict(np.zeros((4, 4, 3), dtype=np.uint8)).shape))
+
+
+def run_threads(targets):
+    threads = [threading.Thread(target=target) for target in targets]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    assert not any(thread.is_alive() for thread in threads)
+
+
+def test_same_mode_predictions_run_concurrently():
+    backend = SlowBackend()
+    manager = make_manager(backend)
+    results = []
+    run_threads([lambda: predict_in(manager, "bicubic", results)] * 4)
+    assert backend.peak > 1
+    assert results == [("bicubic", (8, 8, 3))] * 4
+
+
+def test_mode_switch_waits_for_exclusive_access():
+    backend = SlowBackend()
+    manager = make_manager(backend)
+    results = []
+    modes = ["bicubic", "nearest", "bicubic", "nearest", "area", "bicubic"]
+    run_threads([lambda mode=mode: predict_in(manager, mode, results) for mode in modes])
+    assert backend.switches_while_running == 0
+    # every prediction ran start to end in the mode it asked for
+    assert all(start == end for start, end in backend.modes_seen)
+    assert sorted(mode for mode, _ in results) == sorted(modes)
+
+
+def test_waiting_switch_is_not_starved():
+    backend = SlowBackend(delay=0.1)
+    manager = make_manager(backend)
+    results = []
+    first = threading.Thread(target=predict_in, args=(manager, "bicubic", results))
+    first.start()
+    time.sleep(0.02)
+    switch = threading.Thread(target=predict_in, args=(manager, "nearest", results))
+    switch.start()
+    time.sleep(0.02)
+    late = threading.Thread(target=predict_in, args=(manager, "bicubic", results))
+    late.start()
+    for thread in (first, switch, late):
+        thread.join(5)
+    # the late same-mode request queued behind the waiting switch
+    assert [mode for mode, _ in results] == ["bicubic", "nearest", "bicubic"]
+
+
+def test_manager_follows_a_reloaded_model():
+    backend = SlowBackend(delay=0)
+    manager = make_manager(backend)
+    predict_in(manager, "nearest", [])
+    # a reload puts the model back in its own mode behind the lock's back
+    manager.update_resample_mode("bicubic")
+    predict_in(manager, "nearest", [])
+    assert backend.modes_seen[-1] == ("nearest", "nearest")
@@ -0,0 +1,24 @@
+import pytest
+
+from backend.planner import plan_cost, plan_scales, total_factor
+
+FACTORS = ["2", "4", "8"]
+
+
+def test_total_factor():
+    assert total_factor(["2", "4"]) == 8
+    assert total_factor([]) == 1
+
+
+@pytest.mark.parametrize("requested", [["2", "2"], ["2", "4"], ["4", "4"], ["2", "2", "2"], ["8"]])
+def test_plan_reaches_the_requested_factor_at_no_higher_cost(requested):
+    plan = plan_scales(requested, FACTORS, (64, 64))
+    assert plan.factor == total_factor(requested)
+    assert plan.cost <= plan_cost(requested, 64 * 64)
+    assert set(plan.steps) <= set(FACTORS)
+
+
+def test_keep_chain_runs_the_request_as_listed():
+    plan = plan_scales(["2", "2"], FACTORS, (64, 64), keep_chain=True)
+    assert plan.steps == ["2", "2"]
+    assert plan.describe()["requested"] == ["2", "2"]
@@ -0,0 +1,53 @@
+import multiprocessing as mp
+import threading
+from multiprocessing import shared_memory
+
+import numpy as np
+import pytest
+
+from backend import process_pool
+from conftest import FakeManager
+
+
+@pytest.fixture
+def worker(fake_managers, monkeypatch):
+    """A _worker_main loop on a thread, with at most two resident models"""
+    # in the same process the blocks are already tracked by this test
+    monkeypatch.setattr(process_pool, "_attach_shared_memory", lambda name: shared_memory.SharedMemory(name=name))
+    parent, child = mp.Pipe()
+    thread = threading.Thread(
+        target=process_pool._worker_main, args=(child, False),
+        kwargs={"cache_options": {"max_models": 2, "max_bytes": 0, "idle_ttl": 0}}, daemon=True
+    )
+    thread.start()
+    yield parent
+    parent.send(None)
+    thread.join(5)
+
+
+def upscale(conn, scale, image):
+    in_shm = shared_memory.SharedMemory(create=True, size=image.nbytes)
+    out_shape = (image.shape[0] * int(scale), image.shape[1] * int(scale), image.shape[2])
+    out_shm = shared_memory.SharedMemory(create=True, size=int(np.prod(out_shape)))
+    try:
+        np.ndarray(image.shape, dtype=np.uint8, buffer=in_shm.buf)[...] = image
+        conn.send({"scale": scale, "resample_mode": "bicubic", "in_name": in_shm.name, "in_shape": image.shape,
+                   "out_name": out_shm.name, "out_shape": out_shape})
+        assert conn.poll(5), "worker did not reply"
+        reply = conn.recv()
+        assert reply["ok"], reply
+        return np.ndarray(out_shape, dtype=np.uint8, buffer=out_shm.buf).copy()
+    finally:
+        for shm in (in_shm, out_shm):
+            shm.close()
+            shm.unlink()
+
+
+def test_worker_keeps_its_models_within_the_cache_limits(worker):
+    image = np.arange(4 * 4 * 3, dtype=np.uint8).reshape(4, 4, 3)
+    for scale in ("2", "4", "8", "2"):
+        result = upscale(worker, scale, image)
+        assert result.shape == (4 * int(scale), 4 * int(scale), 3)
+        assert len(FakeManager.loaded) <= 2
+    # least recently used first: x2 made room for x8, then x4 for x2 again
+    assert sorted(FakeManager.loaded) == ["2", "8"]
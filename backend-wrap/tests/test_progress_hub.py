@@ -0,0 +1,146 @@
+import asyncio
+import threading
+
+from backend.progress_hub import ProgressHub
+from conftest import png_bytes, wait_for
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_late_subscriber_gets_the_latest_message():
+    async def scenario():
+        hub = ProgressHub(max_rate=0)
+        await hub.start()
+        hub.publish("a", {"progress": 0.1})
+        hub.publish("a", {"progress": 0.5})
+        async with hub.subscribe("a") as subscription:
+            message = await asyncio.wait_for(subscription.get(), 1)
+        await hub.stop()
+        return message
+
+    assert run(scenario()) == {"progress": 0.5, "job_id": "a", "version": 2}
+
+
+def test_updates_are_throttled_and_final_messages_sent_at_once():
+    async def scenario():
+        hub = ProgressHub(max_rate=2)
+        await hub.start()
+        async with hub.subscribe("a") as subscription:
+            hub.publish("a", {"progress": 0.1})
+            first = await asyncio.wait_for(subscription.get(), 1)
+            for step in range(2, 6):
+                hub.publish("a", {"progress": step / 10})
+            # within the interval nothing else goes out, the burst collapses into one send
+            assert await subscription.next(0.2) is None
+            coalesced = await asyncio.wait_for(subscription.get(), 1)
+            hub.publish("a", {"progress": 0.7})
+            hub.publish("a", {"progress": 1.0}, final=True)
+            final = await asyncio.wait_for(subscription.get(), 0.2)
+        await hub.stop()
+        return first, coalesced, final, hub.stats
+
+    first, coalesced, final, stats = run(scenario())
+    assert first["version"] == 1
+    assert coalesced["progress"] == 0.5 and coalesced["version"] == 5
+    assert final["progress"] == 1.0 and final["version"] == 7
+    assert stats["published"] == 7 and stats["sent"] == 3
+
+
+def test_publish_from_worker_threads():
+    async def scenario():
+        hub = ProgressHub(max_rate=0)
+        await hub.start()
+        async with hub.subscribe("a") as subscription:
+            worker = threading.Thread(target=hub.publish, args=("a", {"progress": 1.0}, True))
+            worker.start()
+            message = await asyncio.wait_for(subscription.get(), 1)
+            worker.join()
+        await hub.stop()
+        return message
+
+    assert run(scenario())["progress"] == 1.0
+
+
+def test_subscribe_many_follows_selected_or_all_jobs():
+    async def scenario():
+        hub = ProgressHub(max_rate=0)
+        await hub.start()
+        selected = hub.subscribe_many(["a", "b"])
+        everything = hub.subscribe_many()
+        for job_id in ("a", "b", "c"):
+            hub.publish(job_id, {"progress": 1.0}, final=True)
+        await asyncio.sleep(0.05)
+        seen = {"selected": [], "everything": []}
+        for name, subscription in (("selected", selected), ("everything", everything)):
+            while (item := await subscription.next(0.05)) is not None:
+                seen[name].append(item[0])
+            hub.unsubscribe(subscription)
+        snapshot = hub.snapshot()
+        await hub.stop()
+        return seen, snapshot
+
+    seen, snapshot = run(scenario())
+    assert seen == {"selected": ["a", "b"], "everything": ["a", "b", "c"]}
+    assert snapshot["subscribers"] == 0
+
+
+def test_closing_a_job_ends_its_subscriptions():
+    async def scenario():
+        hub = ProgressHub(max_rate=0)
+        await hub.start()
+        hub.publish("a", {"progress": 0.2})
+        async with hub.subscribe("a") as subscription:
+            await subscription.get()
+            hub.close("a")
+            removed = await asyncio.wait_for(subscription.next(), 1)
+        version = hub.version("a")
+        await hub.stop()
+        return removed, version
+
+    assert run(scenario()) == (("a", None), 0)
+
+
+def test_wait_for_change():
+    async def scenario():
+        hub = ProgressHub(max_rate=0)
+        await hub.start()
+        hub.publish("a", {"progress": 0.1})
+        current = await hub.wait_for_change("a", 0, timeout=1)
+        timed_out = await hub.wait_for_change("a", 1, timeout=0.05)
+        waiter = asyncio.create_task(hub.wait_for_change("a", 1, timeout=1))
+        await asyncio.sleep(0.05)
+        hub.publish("a", {"progress": 0.6})
+        changed = await waiter
+        await hub.stop()
+        return current, timed_out, changed
+
+    current, timed_out, changed = run(scenario())
+    assert current["version"] == 1
+    assert timed_out is None
+    assert changed["version"] == 2 and changed["progress"] == 0.6
+
+
+def test_publish_without_a_loop_only_keeps_the_latest():
+    hub = ProgressHub()
+    assert hub.publish("a", {"progress": 0.3}) == 1
+    assert hub.latest("a")["progress"] == 0.3
+
+
+def test_websocket_replays_and_pushes_progress(client, fake_models):
+    fake_models["gate"] = gate = threading.Event()
+    response = client.post(
+        "/upscale",
+        files={"file": ("342.png", png_bytes(seed=342), "image/png")},
+        data={"show_progress": "false"},
+    )
+    job_id = response.json()["job_id"]
+    assert wait_for(lambda: fake_models["models"] and fake_models["models"][0].started.is_set())
+    with client.websocket_connect(f"/ws/{job_id}") as websocket:
+        message = websocket.receive_json()
+        assert message["job_id"] == job_id and message["status"] == "processing"
+        gate.set()
+        while message["status"] != "completed":
+            message = websocket.receive_json()
+    assert message["version"] == client.get(f"/job/{job_id}").json()["version"]
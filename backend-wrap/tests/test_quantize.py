@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+from backend.backends import TorchBackend
+from backend.quantize import PRECISIONS, calibration_images, int8_weights_path
+
+
+def test_int8_weights_sit_next_to_the_fp32_weights():
+    assert int8_weights_path("/weights/RealESRGAN_x4.pth") == "/weights/RealESRGAN_x4_int8.pt"
+
+
+def test_unknown_precision_is_rejected():
+    assert PRECISIONS == ("fp32", "int8")
+    with pytest.raises(ValueError, match="fp16"):
+        TorchBackend(precision="fp16")
+
+
+def test_synthetic_calibration_images():
+    images = calibration_images(None, count=3, size=32)
+    assert len(images) == 3
+    assert all(image.shape == (32, 32, 3) and image.dtype == np.uint8 for image in images)
+    # the fallback is deterministic, so rebuilt int8 weights come out the same
+    assert all(np.array_equal(a, b) for a, b in zip(images, calibration_images(None, count=3, size=32)))
+
+
+def test_calibration_images_are_centre_crops(tmp_path):
+    for i, size in enumerate([(300, 200), (40, 20), (100, 100)]):
+        Image.new("L", size, 40 * i).save(tmp_path / f"{i}.png")
+    (tmp_path / "notes.txt").write_text("not an image")
+
+    images = calibration_images(str(tmp_path), count=2, size=64)
+    assert [image.shape for image in images] == [(64, 64, 3), (20, 40, 3)]
+
+
+def test_requests_fall_back_from_unknown_precisions(api):
+    assert api.normalise_precision("int8") in api.BACKEND_PRECISIONS
+    assert api.normalise_precision("fp16") == api.normalise_precision(api.DEFAULT_PRECISION)
+
+
+def test_network_without_a_body_cannot_be_quantized():
+    torch = pytest.importorskip("torch")
+    from backend.quantize import quantize_body
+
+    with pytest.raises(ValueError, match="body"):
+        quantize_body(torch.nn.Conv2d(3, 3, 3), calibration_images(None, count=1, size=16))
@@ -0,0 +1,72 @@
+import os
+
+import numpy as np
+import pytest
+
+from backend.result_cache import ResultCache
+
+SETTINGS = (["2"], "bicubic", None, ".png", "weights")
+
+
+@pytest.fixture
+def image():
+    return np.random.default_rng(7).integers(0, 256, (8, 8, 3), dtype=np.uint8)
+
+
+def result_file(tmp_path, name, size):
+    path = tmp_path / name
+    path.write_bytes(b"x" * size)
+    return str(path)
+
+
+def test_key_covers_pixels_and_settings(image):
+    key = ResultCache.make_key(image, *SETTINGS)
+    assert key == ResultCache.make_key(image.copy(), *SETTINGS)
+    assert key != ResultCache.make_key(image, ["4"], *SETTINGS[1:])
+    assert key != ResultCache.make_key(image, ["2"], "nearest", *SETTINGS[2:])
+    assert key != ResultCache.make_key(image, *SETTINGS[:4], "other weights")
+    assert key != ResultCache.make_key(255 - image, *SETTINGS)
+
+
+def test_stored_results_are_linked_to_new_jobs(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache"), 1 << 20)
+    cache.store("key", result_file(tmp_path, "job1.png", 10))
+    dest = str(tmp_path / "job2.png")
+    assert cache.link_cached("key", dest)
+    assert os.path.getsize(dest) == 10
+    assert not cache.link_cached("other", str(tmp_path / "job3.png"))
+    assert cache.snapshot()["hits"] == 1 and cache.snapshot()["misses"] == 1
+
+
+def test_least_recently_used_results_are_evicted(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache"), 25)
+    cache.store("a", result_file(tmp_path, "a.png", 10))
+    cache.store("b", result_file(tmp_path, "b.png", 10))
+    cache.link_cached("a", str(tmp_path / "a2.png"))
+    cache.store("c", result_file(tmp_path, "c.png", 10))
+    assert not cache.link_cached("b", str(tmp_path / "b2.png"))
+    assert cache.link_cached("a", str(tmp_path / "a3.png"))
+    assert sorted(os.listdir(tmp_path / "cache")) == ["a.png", "c.png"]
+
+
+def test_index_survives_a_restart(tmp_path):
+    ResultCache(str(tmp_path / "cache"), 1 << 20).store("key", result_file(tmp_path, "job.png", 10))
+    assert ResultCache(str(tmp_path / "cache"), 1 << 20).link_cached("key", str(tmp_path / "again.png"))
+
+
+def test_disabled_cache_stores_nothing(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache"), 0)
+    cache.store("key", result_file(tmp_path, "job.png", 10))
+    assert not cache.link_cached("key", str(tmp_path / "again.png"))
+    assert not (tmp_path / "cache").exists()
+
+
+def test_identical_jobs_in_flight_follow_the_first(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache"), 0)
+    assert cache.join_inflight("key", "leader") is None
+    assert not cache.has_followers("leader")
+    assert cache.join_inflight("key", "follower", {"output": "x"}) == "leader"
+    assert cache.has_followers("leader")
+    assert cache.finish_inflight("key") == [("follower", {"output": "x"})]
+    assert cache.finish_inflight("key") == []
+    assert cache.join_inflight("key", "next") is None
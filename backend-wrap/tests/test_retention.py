@@ -0,0 +1,101 @@
+import os
+import time
+
+import pytest
+
+from backend.retention import JobRecord, JobStore, RetentionManager
+
+
+def finished_job(tmp_path, name, size=10, **fields):
+    path = tmp_path / name
+    path.write_bytes(b"x" * size)
+    return {"status": "completed", "output_file": str(path), "cancel_token": object(), **fields}
+
+
+@pytest.fixture
+def jobs():
+    return JobStore()
+
+
+@pytest.fixture
+def retention(jobs, tmp_path):
+    def discard(job_id):
+        job = jobs.pop(job_id)
+        if job.get("output_file"):
+            os.unlink(job["output_file"])
+
+    return RetentionManager(jobs, str(tmp_path), discard, ttl=60, max_bytes=0)
+
+
+def test_finished_jobs_are_compacted(jobs, tmp_path):
+    jobs["a"] = {"status": "processing", "progress": 0.5}
+    jobs["a"]["status"] = "completed"
+    jobs["a"]["output_file"] = finished_job(tmp_path, "a.png")["output_file"]
+    assert jobs.compact() == 1
+    assert jobs.compact() == 0
+    job = jobs["a"]
+    assert job["status"] == "completed" and job["progress"] == 1.0
+    # writes to a finished job fail instead of being lost
+    with pytest.raises(TypeError):
+        job["status"] = "error"
+    with pytest.raises(TypeError):
+        job.update({"status": "error"})
+
+
+def test_finished_jobs_are_updated_through_the_store(jobs, tmp_path):
+    jobs["a"] = finished_job(tmp_path, "a.png")
+    assert jobs.update_job("a", message="relinked")["message"] == "relinked"
+    assert jobs["a"]["message"] == "relinked"
+    assert dict(jobs.finished_records())["a"].message == "relinked"
+    # leaving the finished statuses makes it a live dict again
+    jobs.update_job("a", status="processing")["progress"] = 0.5
+    assert jobs["a"]["progress"] == 0.5
+    assert jobs.update_job("missing", status="error") is None
+
+
+def test_records_drop_transient_fields(tmp_path):
+    record = JobRecord(finished_job(tmp_path, "a.png", intermediate_files=[]))
+    assert "cancel_token" not in record.to_dict()
+    assert record.size_bytes == 10
+
+
+def test_jobs_not_accessed_within_the_ttl_expire(jobs, retention, tmp_path):
+    jobs["old"] = finished_job(tmp_path, "old.png")
+    jobs["new"] = finished_job(tmp_path, "new.png")
+    dict(jobs.finished_records())["old"].last_access = time.time() - 120
+    retention.sweep()
+    assert list(jobs) == ["new"]
+    assert not (tmp_path / "old.png").exists()
+    assert retention.snapshot()["expired"] == 1
+
+
+def test_quota_evicts_least_recently_used_first(jobs, retention, tmp_path):
+    retention.max_bytes = 25
+    for name in ("a", "b", "c"):
+        jobs[name] = finished_job(tmp_path, f"{name}.png")
+    jobs["a"]
+    retention.sweep()
+    assert sorted(jobs) == ["a", "c"]
+
+
+def test_batch_items_stay_with_their_batch(jobs, retention, tmp_path):
+    jobs["batch"] = {"status": "processing"}
+    jobs["item"] = finished_job(tmp_path, "item.png", parent="batch")
+    dict(jobs.finished_records())["item"].last_access = time.time() - 120
+    retention.sweep()
+    assert "item" in jobs
+
+
+def test_old_unreferenced_files_are_removed(jobs, retention, tmp_path):
+    jobs["a"] = finished_job(tmp_path, "a.png")
+    orphan = tmp_path / "orphan.png"
+    orphan.write_bytes(b"x")
+    recent = tmp_path / "recent.png"
+    recent.write_bytes(b"x")
+    old = time.time() - 120
+    for path in (orphan, tmp_path / "a.png"):
+        os.utime(path, (old, old))
+    (tmp_path / "cache").mkdir()
+    os.utime(tmp_path / "cache", (old, old))
+    retention.sweep()
+    assert sorted(os.listdir(tmp_path)) == ["a.png", "cache", "recent.png"]
@@ -0,0 +1,53 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from conftest import png_bytes, wait_for
+
+
+@pytest.mark.parametrize("scales, expected", [
+    ('["2", "4"]', ["2", "4"]),
+    ("2", ["2"]),
+    ('"8"', ["8"]),
+    ([2, "4"], ["2", "4"]),
+    ("x2", ["x2"]),
+])
+def test_parse_scales(api, scales, expected):
+    assert api.parse_scales(scales) == expected
+
+
+def test_supported_scales_drops_unknown_factors(api):
+    assert api.supported_scales('["0", "2", "3", "4"]') == ["2", "4"]
+    assert api.supported_scales('["0"]') == []
+
+
+def upscale(client, content, name, **data):
+    content_type = "image/jpeg" if name.endswith(".jpg") else "image/png"
+    return client.post("/upscale", files={"file": (name, content, content_type)},
+                       data={"show_progress": "false", **data})
+
+
+@pytest.mark.parametrize("seed, scales", [(100, '["0"]'), (101, '["3"]'), (102, '"abc"')])
+def test_invalid_scales_with_draft_decode_fail_the_job(client, fake_models, seed, scales):
+    response = upscale(client, png_bytes(seed=seed), "bad.png",
+                       scales=scales, max_output_pixels="4096")
+    assert response.status_code == 202, response.text
+    job_id = response.json()["job_id"]
+    assert wait_for(lambda: client.get(f"/job/{job_id}").json()["status"] == "error")
+    assert "No valid scales" in client.get(f"/job/{job_id}").json()["message"]
+
+
+def test_draft_decode_ignores_unsupported_scales(client, fake_models):
+    pixels = np.random.default_rng(7).integers(0, 256, (256, 256, 3), dtype=np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, "JPEG")
+    # x3 is not run, so the x2 result may be 256x256 and the input decodes at 128x128
+    response = upscale(client, buffer.getvalue(), "draft.jpg",
+                       scales='["2", "3"]', max_output_pixels=str(256 * 256))
+    assert response.status_code == 202, response.text
+    job_id = response.json()["job_id"]
+    assert wait_for(lambda: client.get(f"/job/{job_id}").json()["status"] == "completed")
+    result = Image.open(io.BytesIO(client.get(f"/download/{job_id}").content))
+    assert result.size == (256, 256)
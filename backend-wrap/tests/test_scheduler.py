@@ -0,0 +1,91 @@
+import threading
+
+import pytest
+
+from backend.scheduler import CancellationToken, JobCancelledError, JobScheduler, QueueFullError
+from conftest import wait_for
+
+
+@pytest.fixture
+def scheduler():
+    scheduler = JobScheduler(workers=1, max_queue=4)
+    yield scheduler
+    scheduler.stop()
+
+
+def blocker():
+    """A job that runs until the returned event is set"""
+    release = threading.Event()
+    started = threading.Event()
+
+    def job():
+        started.set()
+        release.wait(5)
+
+    return job, started, release
+
+
+def test_higher_priority_runs_first(scheduler):
+    job, started, release = blocker()
+    order = []
+    scheduler.submit("blocker", job)
+    scheduler.start()
+    assert started.wait(5)
+    scheduler.submit("low", order.append, "low")
+    scheduler.submit("high", order.append, "high", priority=5)
+    scheduler.submit("low2", order.append, "low2")
+    assert [scheduler.position(j) for j in ("blocker", "high", "low", "low2")] == [0, 1, 2, 3]
+    release.set()
+    assert wait_for(lambda: len(order) == 3)
+    assert order == ["high", "low", "low2"]
+
+
+def test_full_queue_is_rejected_with_retry_after(scheduler):
+    for i in range(4):
+        scheduler.submit(f"job{i}", lambda: None)
+    with pytest.raises(QueueFullError) as error:
+        scheduler.submit("one too many", lambda: None)
+    assert error.value.retry_after >= 1
+
+
+def test_removed_jobs_never_run(scheduler):
+    ran = []
+    scheduler.submit("a", ran.append, "a")
+    scheduler.submit("b", ran.append, "b")
+    assert scheduler.remove("a")
+    assert not scheduler.remove("a")
+    scheduler.start()
+    assert wait_for(lambda: ran == ["b"])
+    assert scheduler.position("a") is None
+
+
+def test_initializer_runs_on_every_worker():
+    seen = []
+    scheduler = JobScheduler(workers=3, initializer=seen.append)
+    scheduler.start()
+    try:
+        assert wait_for(lambda: sorted(seen) == [0, 1, 2])
+    finally:
+        scheduler.stop()
+
+
+def test_failing_job_does_not_stop_the_worker(scheduler):
+    ran = []
+
+    def fail():
+        raise RuntimeError("boom")
+
+    scheduler.submit("fail", fail)
+    scheduler.submit("next", ran.append, "next")
+    scheduler.start()
+    assert wait_for(lambda: ran == ["next"])
+
+
+def test_cancellation_token_follows_its_parent():
+    parent = CancellationToken()
+    child = CancellationToken(parent=parent)
+    child.raise_if_cancelled()
+    parent.cancel()
+    assert child.cancelled
+    with pytest.raises(JobCancelledError):
+        child.raise_if_cancelled()
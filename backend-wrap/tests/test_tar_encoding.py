@@ -0,0 +1,60 @@
+import io
+import tarfile
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from backend.upscale import image_to_tar_format
+
+
+@pytest.fixture
+def image():
+    pixels = np.random.default_rng(13).integers(0, 256, (40, 30, 4), dtype=np.uint8)
+    return Image.fromarray(pixels, "RGBA")
+
+
+def add(archive, image, name, **kwargs):
+    info, fp = image_to_tar_format(image, name, **kwargs)
+    with fp:
+        archive.addfile(info, fp)
+    return info, fp
+
+
+def read_back(buffer, name):
+    buffer.seek(0)
+    with tarfile.open(fileobj=buffer) as archive:
+        return Image.open(io.BytesIO(archive.extractfile(name).read()))
+
+
+def test_png_members_keep_their_pixels(image):
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w") as archive:
+        info, _ = add(archive, image, "a.png")
+    decoded = read_back(buffer, "a.png")
+    assert decoded.mode == "RGBA"
+    assert np.array_equal(np.asarray(decoded), np.asarray(image))
+    assert info.size > 0
+
+
+def test_jpeg_members_drop_the_alpha(image):
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w") as archive:
+        add(archive, image, "a.jpg")
+    decoded = read_back(buffer, "a.jpg")
+    assert decoded.format == "JPEG" and decoded.mode == "RGB"
+    assert decoded.size == image.size
+
+
+@pytest.mark.parametrize("spool_max_bytes, on_disk", [(16 * 2**20, False), (16, True)])
+def test_large_members_spool_to_disk(image, spool_max_bytes, on_disk):
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w") as archive:
+        info, fp = image_to_tar_format(image, "a.png", spool_max_bytes=spool_max_bytes)
+        assert fp._rolled == on_disk
+        # the recorded size is the whole encoded image, read from the start
+        assert len(fp.read()) == info.size
+        fp.seek(0)
+        with fp:
+            archive.addfile(info, fp)
+    assert np.array_equal(np.asarray(read_back(buffer, "a.png")), np.asarray(image))
@@ -0,0 +1,156 @@
+import io
+import os
+import tarfile
+
+import pytest
+from PIL import Image
+
+from backend.tar_pipeline import (
+    MANIFEST_SUFFIX, _write_manifest, completed_members, process_tar_pipelined, run_manifest
+)
+from conftest import FakeModel, png_bytes
+
+
+class CountingModel(FakeModel):
+    current_scale = "2"
+    current_resample_mode = "bicubic"
+    precision = "fp32"
+    backend = "torch"
+
+    def __init__(self):
+        super().__init__(2)
+        self.calls = 0
+
+    def predict(self, image):
+        self.calls += 1
+        return super().predict(image)
+
+
+def make_tar(path, count=3, seed=0):
+    with tarfile.open(path, "w") as archive:
+        for i in range(count):
+            content = png_bytes(size=16, seed=seed + i)
+            info = tarfile.TarInfo(f"img{i}.png")
+            info.size = len(content)
+            archive.addfile(info, io.BytesIO(content))
+
+
+def member_sizes(path):
+    with tarfile.open(path) as archive:
+        return {m.name: Image.open(archive.extractfile(m)).size for m in archive}
+
+
+def interrupt_after_first_member(output_path, manifest):
+    """Leave output_path as a run killed while writing its second member would"""
+    with tarfile.open(output_path) as archive:
+        second = archive.getmembers()[1]
+    with open(output_path, "r+b") as f:
+        f.truncate(second.offset_data + 10)
+    _write_manifest(output_path, manifest)
+
+
+@pytest.fixture
+def archives(tmp_path):
+    source, output = str(tmp_path / "in.tar"), str(tmp_path / "out.tar")
+    make_tar(source)
+    return source, output
+
+
+def test_every_member_is_upscaled(archives):
+    source, output = archives
+    model = CountingModel()
+    process_tar_pipelined(source, model, output)
+    assert member_sizes(output) == {f"img{i}.png": (32, 32) for i in range(3)}
+    assert not os.path.exists(output + MANIFEST_SUFFIX)
+
+
+def test_resume_continues_an_interrupted_run(archives):
+    source, output = archives
+    model = CountingModel()
+    process_tar_pipelined(source, model, output)
+    interrupt_after_first_member(output, run_manifest(source, model))
+    assert completed_members(output)[0] == {"img0.png"}
+
+    resumed = CountingModel()
+    process_tar_pipelined(source, resumed, output, resume=True)
+    assert resumed.calls == 2
+    assert member_sizes(output) == {f"img{i}.png": (32, 32) for i in range(3)}
+    assert not os.path.exists(output + MANIFEST_SUFFIX)
+
+
+def test_resume_is_opt_in(archives):
+    source, output = archives
+    model = CountingModel()
+    process_tar_pipelined(source, model, output)
+    interrupt_after_first_member(output, run_manifest(source, model))
+
+    rerun = CountingModel()
+    process_tar_pipelined(source, rerun, output)
+    assert rerun.calls == 3
+    assert len(member_sizes(output)) == 3
+
+
+def test_resume_rejects_another_source(archives, tmp_path):
+    source, output = archives
+    model = CountingModel()
+    process_tar_pipelined(source, model, output)
+    interrupt_after_first_member(output, run_manifest(source, model))
+    # same member names, different pixels
+    make_tar(source, seed=10)
+
+    rerun = CountingModel()
+    process_tar_pipelined(source, rerun, output, resume=True)
+    assert rerun.calls == 3
+
+
+def test_resume_rejects_other_settings(archives):
+    source, output = archives
+    model = CountingModel()
+    process_tar_pipelined(source, model, output)
+    interrupt_after_first_member(output, run_manifest(source, model))
+
+    rerun = CountingModel()
+    rerun.current_resample_mode = "nearest"
+    process_tar_pipelined(source, rerun, output, resume=True)
+    assert rerun.calls == 3
+
+
+def test_resume_without_manifest_starts_over(archives):
+    source, output = archives
+    model = CountingModel()
+    process_tar_pipelined(source, model, output)
+    interrupt_after_first_member(output, run_manifest(source, model))
+    os.unlink(output + MANIFEST_SUFFIX)
+
+    rerun = CountingModel()
+    process_tar_pipelined(source, rerun, output, resume=True)
+    assert rerun.calls == 3
+
+
+class BatchingModel(CountingModel):
+    def __init__(self):
+        super().__init__()
+        self.batches = []
+
+    def predict_batch(self, images):
+        self.batches.append(len(images))
+        return [super(CountingModel, self).predict(image) for image in images]
+
+
+def test_same_sized_members_share_a_forward_pass(tmp_path):
+    source, output = str(tmp_path / "in.tar"), str(tmp_path / "out.tar")
+    make_tar(source, count=6)
+    model = BatchingModel()
+    report = process_tar_pipelined(source, model, output, batch_size=4)
+    assert model.batches == [4, 2]
+    assert model.calls == 0
+    assert list(member_sizes(output)) == [f"img{i}.png" for i in range(6)]
+    assert report["stages"][1]["items"] == 6
+
+
+def test_small_window_does_not_wait_for_a_full_group(tmp_path):
+    source, output = str(tmp_path / "in.tar"), str(tmp_path / "out.tar")
+    make_tar(source, count=5)
+    model = BatchingModel()
+    process_tar_pipelined(source, model, output, queue_size=2, batch_size=4)
+    assert len(member_sizes(output)) == 5
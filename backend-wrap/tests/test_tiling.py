@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+
+from backend.tiling import allocate_output, auto_tile_size, tiled_predict, tiles_per_pass
+
+
+def nearest(scale):
+    return lambda tile: tile.repeat(scale, 0).repeat(scale, 1)
+
+
+@pytest.fixture
+def image():
+    return np.random.default_rng(3).integers(0, 256, (50, 70, 3), dtype=np.uint8)
+
+
+@pytest.mark.parametrize("tile_size", [16, 32, 100])
+def test_tiles_blend_back_into_the_direct_result(image, tile_size):
+    out = tiled_predict(nearest(2), image, 2, tile_size, overlap=8)
+    assert out.shape == (100, 140, 3)
+    assert np.abs(out.astype(int) - nearest(2)(image).astype(int)).max() <= 1
+
+
+def test_batched_tiles_match_single_tiles(image):
+    single = tiled_predict(nearest(2), image, 2, 16, overlap=4)
+    batches = []
+
+    def predict_batch(tiles):
+        batches.append(len(tiles))
+        return [nearest(2)(t) for t in tiles]
+
+    batched = tiled_predict(nearest(2), image, 2, 16, overlap=4, predict_batch_fn=predict_batch, batch_size=4)
+    assert np.array_equal(single, batched)
+    assert max(batches) > 1
+
+
+def test_rows_are_reported_final_in_order(image):
+    ranges, progress = [], []
+
+    def on_rows_ready(out, start, end):
+        ranges.append((start, end))
+
+    tiled_predict(nearest(2), image, 2, 16, overlap=4, on_rows_ready=on_rows_ready,
+                  progress_callback=lambda done, total: progress.append((done, total)))
+    assert ranges[0][0] == 0 and ranges[-1][1] == 100
+    assert all(a[1] == b[0] for a, b in zip(ranges, ranges[1:]))
+    assert progress[-1] == (20, 20)
+
+
+def test_should_stop_aborts_between_tiles(image):
+    calls = []
+
+    def should_stop():
+        calls.append(1)
+        if len(calls) > 2:
+            raise RuntimeError("cancelled")
+
+    with pytest.raises(RuntimeError):
+        tiled_predict(nearest(2), image, 2, 16, should_stop=should_stop)
+    assert len(calls) == 3
+
+
+def test_large_outputs_are_memory_mapped(tmp_path):
+    assert isinstance(allocate_output((64, 64, 3), memmap_threshold=1024, directory=tmp_path), np.memmap)
+    assert not isinstance(allocate_output((8, 8, 3), memmap_threshold=1024), np.memmap)
+    assert not isinstance(allocate_output((64, 64, 3)), np.memmap)
+
+
+def test_typical_uploads_run_in_one_pass(api):
+    for scale in ("2", "4"):
+        assert api.tile_size_for((600, 600, 3), scale) is None
+    assert api.tile_size_for((4000, 3000, 3), "4")
+
+
+def test_batched_tiles_stay_within_the_budget():
+    budget = 2**30
+    tile = auto_tile_size(budget, 4, overlap=16)
+    # a tile sized for the whole budget runs alone, smaller ones are batched
+    assert tiles_per_pass(budget, tile, 4, 16, max_batch=4) == 1
+    assert tiles_per_pass(budget, tile // 2, 4, 16, max_batch=4) > 1
+    assert tiles_per_pass(budget, 64, 4, 16, max_batch=4) == 4
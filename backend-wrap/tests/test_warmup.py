@@ -0,0 +1,113 @@
+import asyncio
+import threading
+
+from backend.warmup import ModelWarmup
+from conftest import png_bytes
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_warms_every_scale_in_order():
+    warmed = []
+
+    async def scenario():
+        warmup = ModelWarmup(["2", "4"], warm=warmed.append)
+        await warmup.start()
+        assert await warmup.wait(5)
+        return warmup.snapshot()
+
+    snapshot = run(scenario())
+    assert warmed == ["2", "4"]
+    assert snapshot["status"] == "ready"
+    assert [r["status"] for r in snapshot["results"].values()] == ["ready", "ready"]
+    assert snapshot["seconds"] is not None
+
+
+def test_failed_scale_does_not_stop_the_others():
+    warmed = []
+
+    def warm(scale):
+        if scale == "2":
+            raise RuntimeError("no weights")
+        warmed.append(scale)
+
+    async def scenario():
+        warmup = ModelWarmup(["2", "4"], warm=warm)
+        await warmup.start()
+        assert await warmup.wait(5)
+        return warmup
+
+    warmup = run(scenario())
+    assert warmed == ["4"]
+    assert warmup.status == "failed" and warmup.finished
+    assert warmup.results["2"] == {"status": "failed", "error": "no weights"}
+    assert warmup.results["4"]["status"] == "ready"
+
+
+def test_wait_times_out_while_a_scale_loads():
+    release = threading.Event()
+
+    async def scenario():
+        warmup = ModelWarmup(["2"], warm=lambda scale: release.wait(5))
+        await warmup.start()
+        timed_out = not await warmup.wait(0.05)
+        status = warmup.status
+        release.set()
+        finished = await warmup.wait(5)
+        await warmup.stop()
+        return timed_out, status, finished
+
+    assert run(scenario()) == (True, "warming", True)
+
+
+def test_nothing_to_preload_is_ready_at_once():
+    async def scenario():
+        warmup = ModelWarmup([], warm=lambda scale: None)
+        await warmup.start()
+        return await warmup.wait(0), warmup.snapshot()
+
+    finished, snapshot = run(scenario())
+    assert finished
+    assert snapshot == {"status": "ready", "scales": [], "results": {}, "seconds": None}
+
+
+class StillWarming:
+    """Warmup stand-in that never finishes"""
+
+    async def wait(self, timeout):
+        return False
+
+    def snapshot(self):
+        return {"status": "warming", "scales": ["2"], "results": {}, "seconds": 1.0}
+
+
+def test_liveness(client):
+    response = client.get("/health/live")
+    assert response.status_code == 200
+    assert response.json()["status"] == "alive"
+
+
+def test_readiness_follows_the_warmup(api, client, monkeypatch):
+    monkeypatch.setattr(api.state, "warmup", StillWarming())
+    response = client.get("/health/ready")
+    assert response.status_code == 503
+    assert response.json()["warmup"]["status"] == "warming"
+
+    monkeypatch.setattr(api.state, "warmup", ModelWarmup([], warm=lambda scale: None))
+    response = client.get("/health/ready")
+    assert response.status_code == 200
+    assert response.json()["status"] == "ready"
+
+
+def test_jobs_wait_for_the_warmup(api, client, fake_models, monkeypatch):
+    monkeypatch.setattr(api.state, "warmup", StillWarming())
+    response = client.post(
+        "/upscale",
+        files={"file": ("350.png", png_bytes(seed=350), "image/png")},
+        data={"show_progress": "false"},
+    )
+    assert response.status_code == 503
+    assert int(response.headers["Retry-After"]) >= 1
+    assert not fake_models["models"]